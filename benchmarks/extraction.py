@@ -0,0 +1,366 @@
+"""
+End-to-end extraction benchmarks on synthetic videos generated locally,
+so that the throughput of the capture, the pose predictions and the
+skeleton extraction can be measured reproducibly and compared to a
+baseline saved on the same machine.
+
+    python benchmarks/extraction.py --quick --output baseline.json
+    python benchmarks/extraction.py --quick --baseline baseline.json
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Sequence
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from tactus_data.datasets.dataset import _extract_skeletons_video
+from tactus_data.utils.pipeline import StageStats
+from tactus_data.utils.thread_videocapture import VideoCapture
+from tactus_data.utils.yolov8 import PosePredictionYolov8, Yolov8
+
+EXTRACTION_FPS = 10
+
+
+class Scenario(NamedTuple):
+    """a synthetic video."""
+    width: int
+    height: int
+    n_frames: int
+    fps: int
+
+    @property
+    def name(self) -> str:
+        return f"{self.width}x{self.height}-{self.n_frames}f-{self.fps}fps"
+
+
+QUICK_SCENARIOS = [
+    Scenario(320, 240, 30, 30),
+    Scenario(640, 480, 30, 30),
+]
+
+SCENARIOS = [
+    Scenario(320, 240, 90, 30),
+    Scenario(640, 480, 90, 30),
+    Scenario(640, 480, 250, 25),
+    Scenario(1280, 720, 60, 30),
+    Scenario(1920, 1080, 60, 30),
+]
+
+
+def make_video(path: Path, scenario: Scenario, seed: int = 0) -> Path:
+    """
+    write a synthetic video of a few bright figures moving over a
+    static textured background.
+
+    Parameters
+    ----------
+    path : Path
+        path of the .avi video.
+    scenario : Scenario
+        size, length and frame rate of the video.
+    seed : int, optional
+        seed of the background and of the trajectories, by default 0.
+
+    Returns
+    -------
+    Path
+        the path of the video.
+    """
+    rng = np.random.default_rng(seed)
+    size = (scenario.width, scenario.height)
+    background = rng.integers(0, 255, (scenario.height // 8, scenario.width // 8, 3), dtype=np.uint8)
+    background = cv2.resize(background, size, interpolation=cv2.INTER_LINEAR)
+
+    figure_height = scenario.height // 3
+    starts = rng.uniform(0, 1, (4, 2)) * (scenario.width, scenario.height - figure_height)
+    speeds = rng.uniform(-4, 4, (4, 2)) * scenario.width / 640
+
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), scenario.fps, size)
+    try:
+        for frame_id in range(scenario.n_frames):
+            frame = background.copy()
+            for x, y in starts + frame_id * speeds:
+                x = int(x) % scenario.width
+                y = int(y) % (scenario.height - figure_height)
+                _draw_figure(frame, x, y, figure_height)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+    return path
+
+
+def _draw_figure(frame: np.ndarray, x: int, y: int, height: int):
+    head = max(2, height // 8)
+    color = (230, 230, 230)
+    thickness = max(1, height // 20)
+    cv2.circle(frame, (x, y + head), head, color, -1)
+    hip = (x, y + height * 3 // 5)
+    cv2.line(frame, (x, y + 2 * head), hip, color, thickness)
+    cv2.line(frame, (x - height // 4, y + height // 3), (x + height // 4, y + height // 3), color, thickness)
+    cv2.line(frame, hip, (x - height // 6, y + height), color, thickness)
+    cv2.line(frame, hip, (x + height // 6, y + height), color, thickness)
+
+
+def _record(benchmark: str, scenario: Scenario, stage: str, latencies: Sequence[float], wall_time: float) -> Dict:
+    """a result line: throughput and latency percentiles of a stage."""
+    latencies_ms = np.asarray(latencies) * 1000 if len(latencies) > 0 else np.zeros(1)
+
+    return {"benchmark": benchmark,
+            "scenario": scenario.name,
+            "stage": stage,
+            "frames": len(latencies),
+            "fps": len(latencies) / wall_time if wall_time > 0 else 0.,
+            "p50_ms": float(np.percentile(latencies_ms, 50)),
+            "p90_ms": float(np.percentile(latencies_ms, 90)),
+            "p99_ms": float(np.percentile(latencies_ms, 99))}
+
+
+def bench_capture(video_path: Path, scenario: Scenario, target_fps: int = None) -> Dict:
+    """read every subsampled frame of a video with VideoCapture."""
+    latencies = []
+    start = time.perf_counter()
+    cap = VideoCapture(video_path, target_fps=target_fps, drop_warning_enable=False)
+    read_start = time.perf_counter()
+    while cap.read() is not None:
+        now = time.perf_counter()
+        latencies.append(now - read_start)
+        read_start = now
+    cap.release()
+
+    stage = "read" if target_fps is None else f"read@{target_fps}fps"
+    return _record("capture", scenario, stage, latencies, time.perf_counter() - start)
+
+
+def bench_predict(model: PosePredictionYolov8, frames: List[np.ndarray], scenario: Scenario) -> List[Dict]:
+    """preprocess and infer each frame of a video, one at a time."""
+    preprocess_latencies, infer_latencies = [], []
+    start = time.perf_counter()
+    for frame in frames:
+        preprocess_start = time.perf_counter()
+        imgs, img0_size, img_size = model.preprocess(frame)
+        infer_start = time.perf_counter()
+        model.predict_tensor(imgs, [img0_size], img_size, as_arrays=True)
+        preprocess_latencies.append(infer_start - preprocess_start)
+        infer_latencies.append(time.perf_counter() - infer_start)
+    wall_time = time.perf_counter() - start
+
+    total_latencies = np.add(preprocess_latencies, infer_latencies)
+    return [_record("predict", scenario, "preprocess", preprocess_latencies, wall_time),
+            _record("predict", scenario, "infer", infer_latencies, wall_time),
+            _record("predict", scenario, "total", total_latencies, wall_time)]
+
+
+class _TimingWriter:
+    """skeleton writer keeping nothing but the time between two frames."""
+    def __init__(self) -> None:
+        self.latencies = []
+        self._last = time.perf_counter()
+
+    def add_frame(self, frame_id, skeletons, resolution):
+        now = time.perf_counter()
+        self.latencies.append(now - self._last)
+        self._last = now
+
+
+def bench_extract(
+    model: PosePredictionYolov8,
+    video_path: Path,
+    scenario: Scenario,
+    pipelined: bool = False,
+    batch_size: int = 1,
+) -> List[Dict]:
+    """extract the skeletons of a video at EXTRACTION_FPS, the latency
+    of a frame being the time between two extracted frames."""
+    benchmark = "extract-pipelined" if pipelined else "extract"
+    stage_stats: Dict[str, StageStats] = {}
+    writer = _TimingWriter()
+
+    start = time.perf_counter()
+    _extract_skeletons_video(model, video_path, EXTRACTION_FPS, batch_size, pipelined, stage_stats, writer)
+    wall_time = time.perf_counter() - start
+
+    records = [_record(benchmark, scenario, "total", writer.latencies, wall_time)]
+    for name, stats in stage_stats.items():
+        # no per-item latencies for the pipeline stages, only their
+        # throughput when they never wait
+        record = _record(benchmark, scenario, name, [], 1.)
+        record.update(frames=stats.items, fps=stats.throughput, p50_ms=None, p90_ms=None, p99_ms=None)
+        records.append(record)
+
+    return records
+
+
+def run(
+    model: PosePredictionYolov8,
+    scenarios: Iterable[Scenario],
+    video_dir: Path,
+    n_warmup: int = 2,
+    repeat: int = 1,
+) -> List[Dict]:
+    """
+    run every benchmark on the video of each scenario, generating the
+    missing videos.
+
+    Parameters
+    ----------
+    model : PosePredictionYolov8
+        the pose model.
+    scenarios : Iterable[Scenario]
+        the synthetic videos.
+    video_dir : Path
+        directory of the synthetic videos.
+    n_warmup : int, optional
+        number of untimed predictions on the first frame of each video,
+        by default 2.
+    repeat : int, optional
+        number of runs of each benchmark, by default 1. The line of the
+        fastest run is kept.
+
+    Returns
+    -------
+    List[Dict]
+        a result line per benchmark, scenario and stage.
+    """
+    results: Dict[tuple, Dict] = {}
+    for scenario in scenarios:
+        video_path = video_dir / f"{scenario.name}.avi"
+        if not video_path.exists():
+            make_video(video_path, scenario)
+
+        frames = _read_frames(video_path)
+        for _ in range(n_warmup):
+            model.predict_batch(frames[:1])
+
+        for _ in range(repeat):
+            lines = [bench_capture(video_path, scenario),
+                     bench_capture(video_path, scenario, EXTRACTION_FPS),
+                     *bench_predict(model, frames, scenario),
+                     *bench_extract(model, video_path, scenario),
+                     *bench_extract(model, video_path, scenario, pipelined=True)]
+            for line in lines:
+                if _key(line) not in results or results[_key(line)]["fps"] < line["fps"]:
+                    results[_key(line)] = line
+
+    return list(results.values())
+
+
+def _read_frames(video_path: Path) -> List[np.ndarray]:
+    cap = cv2.VideoCapture(str(video_path))
+    frames = []
+    while True:
+        grabbed, frame = cap.read()
+        if not grabbed:
+            break
+        frames.append(frame)
+    cap.release()
+
+    return frames
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float = 0.2) -> List[Dict]:
+    """
+    compare the throughput of each result line to the baseline line of
+    the same benchmark, scenario and stage.
+
+    Parameters
+    ----------
+    results : List[Dict]
+        the result lines of `run`.
+    baseline : List[Dict]
+        the result lines of a previous run on the same machine.
+    tolerance : float, optional
+        relative throughput drop above which a line is a regression, by
+        default 0.2. The throughput of the stages of the pipelined
+        extraction, measured on few items, is only given for
+        information.
+
+    Returns
+    -------
+    List[Dict]
+        the result lines found in the baseline, with the `baseline_fps`,
+        the `ratio` of the throughputs and whether it is a `regression`.
+    """
+    baseline_fps = {_key(line): line["fps"] for line in baseline}
+
+    comparison = []
+    for line in results:
+        reference = baseline_fps.get(_key(line))
+        if not reference:
+            continue
+        ratio = line["fps"] / reference
+        comparison.append({**line, "baseline_fps": reference, "ratio": ratio,
+                           "regression": line["p50_ms"] is not None and ratio < 1 - tolerance})
+
+    return comparison
+
+
+def _key(line: Dict) -> tuple:
+    return line["benchmark"], line["scenario"], line["stage"]
+
+
+def format_results(results: List[Dict]) -> str:
+    """format result lines, compared or not, as a text table."""
+    def format_ms(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    lines = [f"{'benchmark':<18} {'scenario':<22} {'stage':<12} {'frames':>6} {'fps':>8} "
+             f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}"]
+    for line in results:
+        text = (f"{line['benchmark']:<18} {line['scenario']:<22} {line['stage']:<12} {line['frames']:>6} "
+                f"{line['fps']:>8.1f} {format_ms(line['p50_ms']):>8} {format_ms(line['p90_ms']):>8} "
+                f"{format_ms(line['p99_ms']):>8}")
+        if "ratio" in line:
+            text += f"  {line['ratio']:>5.2f}x baseline" + ("  REGRESSION" if line["regression"] else "")
+        lines.append(text)
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", type=Path, default=Path("data/models"))
+    parser.add_argument("--model-name", default="yolov8n-pose.pt")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--quick", action="store_true", help="only run the small scenarios")
+    parser.add_argument("--video-dir", type=Path, help="keep the synthetic videos in this directory")
+    parser.add_argument("--output", type=Path, help="save the results to a json file")
+    parser.add_argument("--baseline", type=Path, help="compare the results to a saved json file")
+    parser.add_argument("--repeat", type=int, default=3, help="keep the fastest of several runs")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative throughput drop reported as a regression")
+    args = parser.parse_args()
+
+    if not (args.model_dir / args.model_name).exists():
+        Yolov8.download_weights(args.model_dir, args.model_name)
+    model = PosePredictionYolov8(args.model_dir, args.model_name, args.device)
+    scenarios = QUICK_SCENARIOS if args.quick else SCENARIOS
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_dir = args.video_dir or Path(tmp_dir)
+        video_dir.mkdir(parents=True, exist_ok=True)
+        results = run(model, scenarios, video_dir, repeat=args.repeat)
+
+    if args.output is not None:
+        with args.output.open("w", encoding="utf-8") as fp:
+            json.dump(results, fp, indent=1)
+
+    if args.baseline is None:
+        print(format_results(results))
+        return
+
+    with args.baseline.open(encoding="utf-8") as fp:
+        comparison = compare(results, json.load(fp), args.tolerance)
+    print(format_results(comparison))
+
+    if any(line["regression"] for line in comparison):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Cold-start cost of importing tactus_data: every statement is timed in
+fresh interpreters, with the peak resident memory they reach.
+
+    python benchmarks/import_time.py --repeat 5 --output import_time.json
+"""
+from pathlib import Path
+from typing import Dict, List, Sequence
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = [
+    "import tactus_data",
+    "from tactus_data import Skeleton",
+    "from tactus_data import SkeletonRollingWindow",
+    "from tactus_data import VideoCapture",
+    "from tactus_data import PosePredictionYolov8",
+]
+
+HEAVY_MODULES = ["cv2", "torch", "ultralytics", "requests", "sklearn", "deep_sort_realtime"]
+
+_CHILD_CODE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+duration = time.perf_counter() - start
+try:
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    max_rss_mb = max_rss / 1024 ** (2 if sys.platform == "darwin" else 1)
+except ImportError:
+    max_rss_mb = None
+print(json.dumps({{"duration": duration, "max_rss_mb": max_rss_mb,
+                  "heavy_modules": [m for m in {heavy_modules!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(statement: str, repeat: int = 5) -> Dict:
+    """
+    run an import statement in `repeat` fresh interpreters.
+
+    Parameters
+    ----------
+    statement : str
+        the python statement to time.
+    repeat : int, optional
+        number of interpreters, by default 5.
+
+    Returns
+    -------
+    Dict
+        the `statement`, the median and minimum `duration` in seconds,
+        the median `max_rss_mb` and the `heavy_modules` it imported.
+    """
+    code = _CHILD_CODE.format(statement=statement, heavy_modules=HEAVY_MODULES)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=Path(__file__).parents[1])
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    max_rss = [run["max_rss_mb"] for run in runs if run["max_rss_mb"] is not None]
+
+    return {"statement": statement,
+            "duration": statistics.median(run["duration"] for run in runs),
+            "min_duration": min(run["duration"] for run in runs),
+            "max_rss_mb": statistics.median(max_rss) if max_rss else None,
+            "heavy_modules": runs[0]["heavy_modules"]}
+
+
+def run(statements: Sequence[str] = STATEMENTS, repeat: int = 5) -> List[Dict]:
+    """measure every statement, see `measure_import`."""
+    return [measure_import(statement, repeat) for statement in statements]
+
+
+def format_results(results: List[Dict]) -> str:
+    """format the measures as a text table."""
+    lines = [f"{'statement':<46} {'median':>8} {'min':>8} {'max rss':>9}  heavy modules"]
+    for result in results:
+        max_rss = "-" if result["max_rss_mb"] is None else f"{result['max_rss_mb']:.0f}MB"
+        lines.append(f"{result['statement']:<46} {result['duration']:>7.3f}s {result['min_duration']:>7.3f}s "
+                     f"{max_rss:>9}  {', '.join(result['heavy_modules']) or '-'}")
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="number of fresh interpreters per statement")
+    parser.add_argument("--output", type=Path, help="save the measures to a json file")
+    args = parser.parse_args()
+
+    results = run(repeat=args.repeat)
+    print(format_results(results))
+
+    if args.output is not None:
+        with args.output.open("w", encoding="utf-8") as fp:
+            json.dump(results, fp, indent=1)
+
+
+if __name__ == "__main__":
+    main()
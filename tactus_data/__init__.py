@@ -1,8 +1,48 @@
-from tactus_data.datasets import ut_interaction
+from typing import TYPE_CHECKING
+import importlib
+
 from tactus_data.utils.skeleton import *
 from tactus_data.utils.skeletonrollingwindow import SkeletonRollingWindow
-from tactus_data.utils.thread_videocapture import VideoCapture
-from tactus_data.utils.yolov8 import Yolov8, BboxPredictionYolov8, PosePredictionYolov8
-from tactus_data.utils import visualisation
-from tactus_data.utils import data_augment
-from tactus_data.utils import retracker
+
+# the other submodules import torch, ultralytics, opencv, sklearn or
+# deep_sort_realtime: they are only imported on first access (PEP 562),
+# so that the lightweight processes only handling skeletons start fast.
+_LAZY_ATTRIBUTES = {
+    "ut_interaction": ("tactus_data.datasets.ut_interaction", None),
+    "VideoCapture": ("tactus_data.utils.thread_videocapture", "VideoCapture"),
+    "MultiStreamCapture": ("tactus_data.utils.multi_capture", "MultiStreamCapture"),
+    "Yolov8": ("tactus_data.utils.yolov8", "Yolov8"),
+    "BboxPredictionYolov8": ("tactus_data.utils.yolov8", "BboxPredictionYolov8"),
+    "PosePredictionYolov8": ("tactus_data.utils.yolov8", "PosePredictionYolov8"),
+    "visualisation": ("tactus_data.utils.visualisation", None),
+    "data_augment": ("tactus_data.utils.data_augment", None),
+    "retracker": ("tactus_data.utils.retracker", None),
+}
+
+if TYPE_CHECKING:
+    from tactus_data.datasets import ut_interaction
+    from tactus_data.utils.thread_videocapture import VideoCapture
+    from tactus_data.utils.multi_capture import MultiStreamCapture
+    from tactus_data.utils.yolov8 import Yolov8, BboxPredictionYolov8, PosePredictionYolov8
+    from tactus_data.utils import visualisation
+    from tactus_data.utils import data_augment
+    from tactus_data.utils import retracker
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    value = importlib.import_module(module_name)
+    if attribute is not None:
+        value = getattr(value, attribute)
+
+    # the next accesses do not go through __getattr__
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -1,58 +1,315 @@
+from typing import Callable, Dict, Generator, List, Sequence, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from pathlib import Path
 from enum import Enum
+import multiprocessing
+import queue
+import threading
+import os
 import random
 import json
+import math
+from time import perf_counter
+import numpy as np
+import torch
+import cv2
 from tqdm import tqdm
 
-from tactus_data.utils.yolov8 import Yolov8
+from tactus_data.utils.yolov8 import PosePredictionYolov8, DEFAULT_IMGSIZE
+from tactus_data.utils.skeleton import Skeleton
 from tactus_data.utils.thread_videocapture import VideoCapture
 from tactus_data.utils.retracker import stupid_reid
+from tactus_data.utils.files import atomic_write
+from tactus_data.utils.ndjson import NDJSONSkeletonWriter
+from tactus_data.utils.skeleton_store import SkeletonStoreWriter
+from tactus_data.utils.motion_gate import MotionGate, MotionGateStats, SkeletonInterpolator
+from tactus_data.utils.roi_pose import RoiPoseEstimator
+from tactus_data.utils.profiling import Profile, MEMORY_SAMPLE_PERIOD
+from tactus_data.utils.pipeline import (StageStats, StageThread, END_OF_STREAM, iter_queue,
+                                        put_until_stopped, merge_stage_stats, format_stage_stats)
+from tactus_data.datasets.manifest import Manifest, source_fingerprint
 from tactus_data.utils.data_augment import grid_augment, DEFAULT_GRID
 
 RAW_DIR = Path("data/raw/")
 PROCESSED_DIR = Path("data/processed/")
+MODEL_DIR = Path("data/models")
+MODEL_NAME = "yolov8x-pose-p6.pt"
 NAMES = Enum('NAMES', ['ut_interaction'])
+OUTPUT_FORMATS = ("json", "ndjson", "store")
+RUN_STATS_NAME = "extraction_stats.json"
 
 
 def extract_skeletons(
     dataset: NAMES,
-    fps: int,
+    fps: Union[int, Sequence[int]],
     video_extension: str,
-    device: str
+    device: str,
+    batch_size: int = 1,
+    n_workers: int = 1,
+    force: bool = False,
+    pipelined: bool = False,
+    output_format: str = "json",
+    motion_gate: Dict = None,
+    roi_crops: Dict = None,
+    imgsize: int = DEFAULT_IMGSIZE,
 ):
     """
     Extract skeletons from a folder containing video frames using
     yolov7.
 
+    The time spent in each stage of the extraction, a few counters and
+    the peak memory are written to a `.stats.json` file next to each
+    output (`yolov8.stats.json` for `yolov8.json`), and aggregated over
+    the run in `extraction_stats.json` in the dataset output folder.
+
     Parameters
     ----------
     dataset : NAMES
         the Enum name of the dataset. Accessible through
         `NAMES.dataset_name`
-    fps : int
-        the fps for the skeleton extraction
+    fps : Union[int, Sequence[int]]
+        the fps for the skeleton extraction. If several fps are given,
+        each video is decoded and each frame is inferred only once,
+        and an output is written in the folder of each fps.
     video_extension : int
         the video extensions (avi, mp4, etc.)
     device : str
         the computing device to use with yolov7.
         Can be 'cpu', 'cuda:0' etc.
+    batch_size : int, optional
+        the number of frames given to the model at once, by default 1.
+    n_workers : int, optional
+        the number of processes extracting videos in parallel. Each
+        process loads its own model and gets an equal share of the
+        cpu cores. By default 1, which extracts the videos one after
+        the other in the current process.
+    force : bool, optional
+        extract every video again, even those whose output is up to
+        date in the manifest. By default False.
+    pipelined : bool, optional
+        decode, preprocess, infer and write each video in concurrent
+        stages, and print the throughput of each stage at the end. By
+        default False.
+    output_format : str, optional
+        "json" to write a `yolov8.json` file per video, or "ndjson" to
+        stream the frames to a `yolov8.ndjson` file as they are
+        extracted, which keeps the memory usage constant whatever the
+        video length. See `tactus_data.utils.ndjson`. "store" writes a
+        `yolov8.store` directory of numpy arrays that can be
+        memory-mapped, see `tactus_data.utils.skeleton_store`. By
+        default "json".
+    motion_gate : Dict, optional
+        skip the inference of the frames that barely changed since the
+        last inferred frame, and interpolate their skeletons instead.
+        The dict holds the keyword arguments of
+        `tactus_data.utils.motion_gate.MotionGate`, an empty dict using
+        the default ones. The skip rate and the time saved are printed
+        at the end. By default None, which infers every frame.
+    roi_crops : Dict, optional
+        only infer the full frames periodically, and crops around the
+        people of the previous frame in between. The dict holds the
+        keyword arguments of `tactus_data.utils.roi_pose.RoiPoseEstimator`
+        other than the model, an empty dict using the default ones.
+        Each frame depends on the previous one, so it cannot be
+        combined with `pipelined` and `batch_size` is ignored. By
+        default None, which infers the full frames.
+    imgsize : int, optional
+        size of the longest side of the model input, by default 640.
+        The p6 models were trained on 1280 images, see
+        `tactus_data.utils.yolov8.native_imgsize`.
     """
-    input_dir = RAW_DIR / dataset.name
-    output_dir = PROCESSED_DIR / dataset.name
-    fps_folder_name = _fps_folder_name(fps)
-
-    model_skeleton = Yolov8(Path("data/models"), "yolov8x-pose-p6.pt", device)
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"unknown output format {output_format}. Must be one of "
+                         + ", ".join(OUTPUT_FORMATS))
 
-    nbr_of_videos = _count_files_in_dir(input_dir, f"*.{video_extension}")
-    progress_bar = tqdm(iterable=input_dir.rglob(f"*.{video_extension}"), total=nbr_of_videos)
-    for video_path in progress_bar:
-        output_path: Path = (output_dir / video_path.stem / fps_folder_name / "yolov8.json")
+    if roi_crops is not None and pipelined:
+        raise ValueError("the crop inference depends on the previous frame and cannot be pipelined.")
 
-        video_dict = _extract_skeletons_video(model_skeleton, video_path, fps)
-
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with output_path.open(encoding="utf-8", mode="w") as fp:
-            json.dump(video_dict, fp)
+    input_dir = RAW_DIR / dataset.name
+    output_dir = PROCESSED_DIR / dataset.name
+    fps_list = [fps] if isinstance(fps, int) else sorted(set(fps))
+
+    manifest = Manifest(input_dir, output_dir)
+
+    options = {"batch_size": batch_size, "pipelined": pipelined, "motion_gate": motion_gate,
+               "roi_crops": roi_crops}
+
+    tasks = []
+    for video_path in sorted(input_dir.rglob(f"*.{video_extension}")):
+        outputs = []
+        for target_fps in fps_list:
+            output_path = output_dir / video_path.stem / _fps_folder_name(target_fps) / f"yolov8.{output_format}"
+            params = _extraction_params(target_fps, motion_gate, roi_crops, imgsize)
+            if force or not manifest.is_current(video_path, output_path, params):
+                outputs.append((target_fps, output_path))
+
+        if len(outputs) > 0:
+            tasks.append((video_path, outputs, options))
+
+    if len(tasks) == 0:
+        return
+
+    stage_stats: Dict[str, StageStats] = {}
+    gate_stats = MotionGateStats()
+    run_profile = Profile()
+    videos_stats = []
+    run_start = perf_counter()
+    if n_workers > 1:
+        # spawn rather than fork: torch and cv2 thread pools do not
+        # survive a fork
+        context = multiprocessing.get_context("spawn")
+        n_workers = min(n_workers, len(tasks))
+        n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+        with context.Pool(n_workers,
+                          initializer=_init_worker,
+                          initargs=(MODEL_DIR, MODEL_NAME, device, n_threads, imgsize)) as pool:
+            progress_bar = tqdm(iterable=pool.imap_unordered(_extract_video_worker, tasks), total=len(tasks))
+            for video_path, outputs, fingerprint, video_stage_stats, video_gate_stats, profile in progress_bar:
+                _record_outputs(manifest, video_path, outputs, fingerprint, options, imgsize)
+                merge_stage_stats(stage_stats, video_stage_stats)
+                gate_stats.merge(video_gate_stats)
+                run_profile.merge(profile)
+                videos_stats.append(_video_stats(input_dir, video_path, profile))
+    else:
+        model_skeleton = PosePredictionYolov8(MODEL_DIR, MODEL_NAME, device, imgsize=imgsize)
+
+        progress_bar = tqdm(iterable=tasks, total=len(tasks))
+        for video_path, outputs, options in progress_bar:
+            profile = Profile()
+            fingerprint = _extract_video_to_files(model_skeleton, video_path, outputs, options,
+                                                  stage_stats, gate_stats, profile)
+            _record_outputs(manifest, video_path, outputs, fingerprint, options, imgsize)
+            run_profile.merge(profile)
+            videos_stats.append(_video_stats(input_dir, video_path, profile))
+
+    # the wall time of the profile adds up the extraction time of each
+    # video, which exceeds the run time with several workers
+    run_profile.save(output_dir / RUN_STATS_NAME, run_time=perf_counter() - run_start,
+                     n_workers=n_workers, videos=videos_stats)
+    tqdm.write(str(run_profile))
+    if pipelined:
+        tqdm.write(format_stage_stats(stage_stats))
+    if motion_gate is not None:
+        tqdm.write(str(gate_stats))
+
+
+def _extraction_params(
+    fps: int,
+    motion_gate: Dict = None,
+    roi_crops: Dict = None,
+    imgsize: int = DEFAULT_IMGSIZE,
+) -> Dict:
+    """return the parameters an output depends on, as recorded in
+    the manifest."""
+    params = {"model_name": MODEL_NAME,
+              "fps": fps,
+              "conf_thres": PosePredictionYolov8.conf_thres,
+              "iou_thres": PosePredictionYolov8.iou_thres}
+    if motion_gate is not None:
+        params["motion_gate"] = MotionGate(**motion_gate).params()
+    if roi_crops is not None:
+        params["roi_crops"] = RoiPoseEstimator(None, **roi_crops).params()
+    # only recorded when changed, so that the outputs extracted before
+    # it could be changed stay current
+    if imgsize != DEFAULT_IMGSIZE:
+        params["imgsize"] = imgsize
+
+    return params
+
+
+def _video_stats(input_dir: Path, video_path: Path, profile: Profile) -> Dict:
+    """the summary of the extraction of a video in the run stats."""
+    return {"source": video_path.relative_to(input_dir).as_posix(),
+            "wall_time": profile.wall_time,
+            "frames": profile.counters.get("frames", 0)}
+
+
+def _stats_path(output_path: Path) -> Path:
+    """path of the stats file of an extraction output, e.g.
+    `yolov8.stats.json` for `yolov8.json`."""
+    return output_path.with_name(f"{output_path.stem}.stats.json")
+
+
+def _record_outputs(
+    manifest: Manifest,
+    video_path: Path,
+    outputs: List[Tuple[int, Path]],
+    fingerprint: Dict,
+    options: Dict,
+    imgsize: int = DEFAULT_IMGSIZE,
+):
+    """record the outputs extracted from a video with the extraction
+    `options` and the input size `imgsize` in the manifest."""
+    for target_fps, output_path in outputs:
+        params = _extraction_params(target_fps, options["motion_gate"], options["roi_crops"], imgsize)
+        manifest.update(video_path, output_path, params, fingerprint)
+
+
+_worker_model: PosePredictionYolov8 = None
+
+
+def _init_worker(model_dir: Path, model_name: str, device: str, n_threads: int, imgsize: int):
+    """load the model of a worker process and limit its number of
+    threads so that the workers do not oversubscribe the cores."""
+    global _worker_model
+
+    torch.set_num_threads(n_threads)
+    cv2.setNumThreads(n_threads)
+    _worker_model = PosePredictionYolov8(model_dir, model_name, device, imgsize=imgsize)
+
+
+def _extract_video_worker(
+    task: Tuple[Path, List[Tuple[int, Path]], Dict]
+) -> Tuple[Path, List[Tuple[int, Path]], Dict, Dict[str, StageStats], MotionGateStats, Profile]:
+    """extract a video in a worker process. Return the path of the
+    video, its outputs, its fingerprint, and the stage stats, motion
+    gate stats and profile of the extraction."""
+    video_path, outputs, options = task
+    stage_stats = {}
+    gate_stats = MotionGateStats()
+    profile = Profile()
+    fingerprint = _extract_video_to_files(_worker_model, video_path, outputs, options, stage_stats, gate_stats,
+                                          profile)
+
+    return video_path, outputs, fingerprint, stage_stats, gate_stats, profile
+
+
+def _extract_video_to_files(
+    model: PosePredictionYolov8,
+    video_path: Path,
+    outputs: List[Tuple[int, Path]],
+    options: Dict,
+    stage_stats: Dict[str, StageStats] = None,
+    gate_stats: MotionGateStats = None,
+    profile: Profile = None,
+) -> Dict:
+    """extract the skeletons of a video for several fps in a single
+    pass, and write them to the (fps, output path) `outputs` with the
+    writer matching the suffix of each path, and the extraction
+    profile next to each of them. `options` are the keyword arguments
+    of `_extract_skeletons_video_multi`. Return the fingerprint of the
+    video taken before the extraction."""
+    fingerprint = source_fingerprint(video_path)
+    profile = Profile() if profile is None else profile
+
+    start = perf_counter()
+    with ExitStack() as stack:
+        writers = {target_fps: stack.enter_context(_open_writer(output_path))
+                   for target_fps, output_path in outputs}
+        _extract_skeletons_video_multi(model, video_path, writers, stage_stats=stage_stats,
+                                       gate_stats=gate_stats, profile=profile, **options)
+        # the JSON writers only write their file when closed
+        with profile.measure("close", len(writers)):
+            stack.close()
+    profile.wall_time = perf_counter() - start
+    profile.sample_memory()
+
+    fps_list = [target_fps for target_fps, _ in outputs]
+    for _, output_path in outputs:
+        profile.save(_stats_path(output_path), source=video_path.name, fps=fps_list)
+
+    return fingerprint
 
 
 def _fps_folder_name(fps: int):
@@ -68,42 +325,541 @@ def _count_files_in_dir(directory: Path, pattern: str):
     return nbr_of_files
 
 
-def _extract_skeletons_video(model: Yolov8, video_path: Path, fps: int):
-    cap = VideoCapture(video_path, target_fps=fps, buffer_size=1)
+class _VideoSkeletons:
+    """accumulate the skeletons of a video, frame after frame, into the
+    JSON layout of the processed data."""
+    def __init__(self) -> None:
+        self.frames = []
+        self.resolution = None
+        self.max_number_of_skeleton = 0
+        self.min_number_of_skeleton = float("inf")
 
-    video_dict = {"frames": []}
+    def add_frame(self, frame_id: int, skeletons: List[Skeleton], resolution: Tuple[int, int]):
+        """add the skeletons of a frame. The resolution of the first
+        frame is the resolution of the video."""
+        if self.resolution is None:
+            self.resolution = resolution
 
-    max_number_of_skeleton = 0
-    min_number_of_skeleton = float("inf")
+        frame_dict = {"frame_id": frame_id}
+        frame_dict["skeletons"] = skeletons
 
-    resolution = None
-    first_frame = True
+        self.max_number_of_skeleton = max(self.max_number_of_skeleton, len(skeletons))
+        self.min_number_of_skeleton = min(self.min_number_of_skeleton, len(skeletons))
 
-    while (cap_frame := cap.read()) is not None:
-        frame_id, frame = cap_frame
+        self.frames.append(frame_dict)
 
-        if first_frame:
-            resolution = frame.shape[:2]
-            first_frame = False
+    def to_dict(self) -> Dict:
+        """return the video dictionnary, or None if no frame was
+        added."""
+        if self.resolution is None:
+            return None
 
-        frame_dict = {"frame_id": frame_id}
+        return {"frames": self.frames,
+                "resolution": self.resolution,
+                "max_nbr_skeletons": self.max_number_of_skeleton,
+                "min_nbr_skeletons": self.min_number_of_skeleton}
 
-        skeletons = model.extract_skeletons(frame)
-        skeletons = stupid_reid(skeletons)
 
-        frame_dict["skeletons"] = skeletons
+class _JSONSkeletonWriter(_VideoSkeletons):
+    """keep the skeletons of a video in memory and write them
+    atomically to a JSON file when closed."""
+    def __init__(self, path: Path) -> None:
+        super().__init__()
+        self.path = path
+
+    def close(self):
+        """write the JSON file."""
+        with atomic_write(self.path) as fp:
+            json.dump(self.to_dict(), fp)
+
+    def __enter__(self) -> "_JSONSkeletonWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+SkeletonWriter = Union[_VideoSkeletons, NDJSONSkeletonWriter, SkeletonStoreWriter]
+
+
+def _open_writer(output_path: Path) -> Union[_JSONSkeletonWriter, NDJSONSkeletonWriter, SkeletonStoreWriter]:
+    """return the writer matching the suffix of the output path."""
+    writers = {".json": _JSONSkeletonWriter,
+               ".ndjson": NDJSONSkeletonWriter,
+               ".store": SkeletonStoreWriter}
+
+    return writers[output_path.suffix](output_path)
+
+
+class _FrameRouter:
+    """
+    hand the skeletons of each frame to the writers of the fps whose
+    stride the frame falls on.
+
+    Parameters
+    ----------
+    writers : List[Tuple[int, SkeletonWriter]]
+        the (stride, writer) pairs.
+    """
+    def __init__(self, writers: List[Tuple[int, SkeletonWriter]]) -> None:
+        self.writers = writers
+        # the finest stride that reaches every frame of every writer
+        self.stride = math.gcd(*[stride for stride, _ in writers])
 
-        max_number_of_skeleton = max(max_number_of_skeleton, len(skeletons))
-        min_number_of_skeleton = min(min_number_of_skeleton, len(skeletons))
+    def is_needed(self, frame_id: int) -> bool:
+        """whether at least one writer needs this frame."""
+        return any(frame_id % stride == 0 for stride, _ in self.writers)
+
+    def add_frame(self, frame_id: int, skeletons: List[Skeleton], resolution: Tuple[int, int]):
+        """add the skeletons of a frame to the writers needing it."""
+        for stride, writer in self.writers:
+            if frame_id % stride == 0:
+                writer.add_frame(frame_id, skeletons, resolution)
+
+
+def _extract_skeletons_video(
+    model: PosePredictionYolov8,
+    video_path: Path,
+    fps: int,
+    batch_size: int = 1,
+    pipelined: bool = False,
+    stage_stats: Dict[str, StageStats] = None,
+    writer: Union[NDJSONSkeletonWriter, SkeletonStoreWriter] = None,
+    motion_gate: Dict = None,
+    profile: Profile = None,
+) -> Dict:
+    """
+    extract the skeletons of every subsampled frame of a video.
+
+    Parameters
+    ----------
+    model : PosePredictionYolov8
+        the pose model.
+    video_path : Path
+        path to the video.
+    fps : int
+        the fps for the skeleton extraction.
+    batch_size : int, optional
+        the number of frames given to the model at once, by default 1.
+    pipelined : bool, optional
+        run the extraction stages concurrently, by default False. See
+        `_extract_skeletons_video_pipelined`.
+    stage_stats : Dict[str, StageStats], optional
+        if given and `pipelined` is set, the throughput of each stage
+        is added to it.
+    writer : Union[NDJSONSkeletonWriter, SkeletonStoreWriter], optional
+        if given, each frame is handed to its `add_frame` method as
+        soon as it is processed instead of being kept in memory.
+    motion_gate : Dict, optional
+        keyword arguments of the `MotionGate` skipping the static
+        frames. By default None, which infers every frame.
+    profile : Profile, optional
+        if given, the time spent in each stage, the counters and the
+        peak memory are added to it.
+
+    Returns
+    -------
+    Dict
+        the video dictionnary, or None if the video has no frame or if
+        a `writer` is given.
+    """
+    video_skeletons = _VideoSkeletons() if writer is None else writer
+
+    _extract_skeletons_video_multi(model, video_path, {fps: video_skeletons}, batch_size, pipelined,
+                                   stage_stats, motion_gate, profile=profile)
+
+    if writer is None:
+        return video_skeletons.to_dict()
+
+
+def _extract_skeletons_video_multi(
+    model: PosePredictionYolov8,
+    video_path: Path,
+    writers: Dict[int, SkeletonWriter],
+    batch_size: int = 1,
+    pipelined: bool = False,
+    stage_stats: Dict[str, StageStats] = None,
+    motion_gate: Dict = None,
+    gate_stats: MotionGateStats = None,
+    roi_crops: Dict = None,
+    profile: Profile = None,
+):
+    """
+    extract the skeletons of a video for several fps at once. The
+    video is decoded with the finest stride that reaches every frame of
+    every fps, each frame is inferred once, and its skeletons are given
+    to the writers of all the fps it belongs to.
+
+    Parameters
+    ----------
+    model : PosePredictionYolov8
+        the pose model.
+    video_path : Path
+        path to the video.
+    writers : Dict[int, SkeletonWriter]
+        the writer of each fps.
+    batch_size : int, optional
+        the number of frames given to the model at once, by default 1.
+    pipelined : bool, optional
+        run the extraction stages concurrently, by default False. See
+        `_extract_skeletons_video_pipelined`.
+    stage_stats : Dict[str, StageStats], optional
+        if given and `pipelined` is set, the throughput of each stage
+        is added to it.
+    motion_gate : Dict, optional
+        keyword arguments of the `MotionGate` skipping the static
+        frames, whose skeletons are interpolated from the neighbouring
+        inferred frames. By default None, which infers every frame.
+    gate_stats : MotionGateStats, optional
+        if given and `motion_gate` is set, the skipped frames and the
+        time spent are added to it.
+    roi_crops : Dict, optional
+        keyword arguments of the `RoiPoseEstimator` inferring crops
+        around the people of the previous frame. It cannot be combined
+        with `pipelined`. By default None, which infers the full
+        frames.
+    profile : Profile, optional
+        if given, the time spent in each stage (decode, gate,
+        preprocess, forward, nms, postprocess, reid, write), the
+        number of frames, skipped frames and skeletons and the peak
+        memory are added to it.
+    """
+    if roi_crops is not None and pipelined:
+        raise ValueError("the crop inference depends on the previous frame and cannot be pipelined.")
+
+    profile = Profile() if profile is None else profile
+
+    probe_cap = VideoCapture(video_path, buffer_size=1)
+    capture_fps = probe_cap.capture_fps
+    router = _FrameRouter([(probe_cap.get_stride(target_fps, None), writer)
+                           for target_fps, writer in writers.items()])
+    probe_cap.release()
+
+    cap = VideoCapture(video_path, stride=router.stride, capture_fps=capture_fps, buffer_size=1)
+
+    gate = None
+    sink: Union[_FrameRouter, SkeletonInterpolator] = router
+    video_gate_stats = MotionGateStats()
+    if motion_gate is not None:
+        gate = MotionGate(**motion_gate)
+        sink = SkeletonInterpolator(router)
+
+    estimator = None
+    if roi_crops is not None:
+        estimator = RoiPoseEstimator(model, **roi_crops)
+
+    previous_profile, model.profile = model.profile, profile
+    try:
+        if pipelined:
+            _extract_skeletons_video_pipelined(model, cap, router, sink, batch_size, stage_stats=stage_stats,
+                                               gate=gate, gate_stats=video_gate_stats, profile=profile)
+        else:
+            _extract_skeletons_video_serial(model, cap, router, sink, batch_size, gate, video_gate_stats,
+                                            estimator, profile)
+    finally:
+        model.profile = previous_profile
+        cap.release()
+
+    if gate is not None:
+        with profile.measure("write"):
+            sink.flush()
+        if gate_stats is not None:
+            gate_stats.merge(video_gate_stats)
+
+
+def _extract_skeletons_video_serial(
+    model: PosePredictionYolov8,
+    cap: VideoCapture,
+    router: _FrameRouter,
+    sink: Union[_FrameRouter, SkeletonInterpolator],
+    batch_size: int,
+    gate: MotionGate,
+    gate_stats: MotionGateStats,
+    estimator: RoiPoseEstimator,
+    profile: Profile,
+):
+    """the extraction loop of `_extract_skeletons_video_multi` when it
+    is not pipelined."""
+    nbr_frames = 0
+    for frame_ids, frames in _batched_frames(cap, batch_size, router.is_needed, profile):
+        static = [False] * len(frames)
+        gate_time = 0.
+        if gate is not None:
+            start = perf_counter()
+            static = [gate.is_static(frame) for frame in frames]
+            gate_time = perf_counter() - start
+            profile.stage("gate").add(len(frames), gate_time)
+
+        start = perf_counter()
+        inferred_frames = [frame for frame, is_static in zip(frames, static) if not is_static]
+        if estimator is not None:
+            skeletons_batch = iter([estimator.predict(frame) for frame in inferred_frames])
+        elif len(inferred_frames) > 0:
+            skeletons_batch = iter(model.predict_batch(inferred_frames, as_arrays=True))
+        else:
+            skeletons_batch = iter([])
+        gate_stats.add(len(frames), sum(static), gate_time, perf_counter() - start)
+
+        for frame_id, frame, is_static in zip(frame_ids, frames, static):
+            if is_static:
+                with profile.measure("write"):
+                    sink.add_skipped(frame_id, frame.shape[:2])
+            else:
+                with profile.measure("reid"):
+                    skeletons = stupid_reid(next(skeletons_batch))
+                with profile.measure("write"):
+                    sink.add_frame(frame_id, skeletons, frame.shape[:2])
+                profile.count("skeletons", len(skeletons))
+
+        profile.count("frames", len(frames))
+        profile.count("skipped", sum(static))
+        if nbr_frames // MEMORY_SAMPLE_PERIOD != (nbr_frames + len(frames)) // MEMORY_SAMPLE_PERIOD:
+            profile.sample_memory()
+        nbr_frames += len(frames)
+
+
+def _extract_skeletons_video_pipelined(
+    model: PosePredictionYolov8,
+    cap: VideoCapture,
+    router: _FrameRouter,
+    sink: Union[_FrameRouter, SkeletonInterpolator],
+    batch_size: int = 1,
+    n_preprocess_workers: int = 2,
+    queue_size: int = 8,
+    stage_stats: Dict[str, StageStats] = None,
+    gate: MotionGate = None,
+    gate_stats: MotionGateStats = None,
+    profile: Profile = None,
+):
+    """
+    extract the skeletons of a video like `_extract_skeletons_video`,
+    but the decoding, the preprocessing, the inference and the writing
+    run concurrently, connected by bounded queues:
+
+    decoder thread -> preprocessing thread pool -> inference (this
+    thread) -> writer thread
+
+    Parameters
+    ----------
+    model : PosePredictionYolov8
+        the pose model.
+    cap : VideoCapture
+        the capture to read the frames from. It is released at the
+        end.
+    router : _FrameRouter
+        selects the frames to infer.
+    sink : Union[_FrameRouter, SkeletonInterpolator]
+        receives the skeletons of each frame, in the frame order, and
+        the skipped frames if a `gate` is given.
+    batch_size : int, optional
+        the number of frames given to the model at once, by default 1.
+    n_preprocess_workers : int, optional
+        number of threads letterboxing the frames, by default 2.
+    queue_size : int, optional
+        maximum number of items waiting between two stages, by
+        default 8.
+    stage_stats : Dict[str, StageStats], optional
+        if given, the throughput of each stage is added to it.
+    gate : MotionGate, optional
+        if given, the decoder thread skips the static frames, which
+        are handed to `sink.add_skipped` without being inferred.
+    gate_stats : MotionGateStats, optional
+        if given with a `gate`, the skipped frames and the time spent
+        are added to it.
+    profile : Profile, optional
+        if given, the time spent in each stage, the counters and the
+        peak memory are added to it, see
+        `_extract_skeletons_video_multi`.
+    """
+    profile = Profile() if profile is None else profile
+    stats = {"decode": StageStats("decode"),
+             "preprocess": StageStats("preprocess", n_preprocess_workers),
+             "infer": StageStats("infer"),
+             "write": StageStats("write")}
+    if gate is not None:
+        stats["gate"] = StageStats("gate")
+    stop_event = threading.Event()
+    decoded_queue = queue.Queue(maxsize=queue_size)
+    preprocessed_queue = queue.Queue(maxsize=queue_size)
+    inferred_queue = queue.Queue(maxsize=queue_size)
+    executor = ThreadPoolExecutor(n_preprocess_workers)
+
+    def decode():
+        while not stop_event.is_set():
+            start = perf_counter()
+            cap_frame = cap.read()
+            if cap_frame is None:
+                return
+            decode_time = perf_counter() - start
+            stats["decode"].add(1, decode_time)
+            profile.stage("decode").add(1, decode_time)
+
+            frame_id, frame = cap_frame
+            if not router.is_needed(frame_id):
+                continue
+
+            is_static = False
+            if gate is not None:
+                start = perf_counter()
+                is_static = gate.is_static(frame)
+                gate_time = perf_counter() - start
+                stats["gate"].add(1, gate_time)
+                profile.stage("gate").add(1, gate_time)
+
+            if not put_until_stopped(decoded_queue, (frame_id, frame, is_static), stop_event):
+                return
+
+    def preprocess(frame: np.ndarray):
+        with stats["preprocess"].measure():
+            return model.preprocess(frame)
+
+    def dispatch():
+        # the futures are queued in the decoding order, which keeps
+        # the frame order whatever the preprocessing order. Static
+        # frames are not preprocessed and go through with no future.
+        for frame_id, frame, is_static in iter_queue(decoded_queue):
+            future = None if is_static else executor.submit(preprocess, frame)
+            if not put_until_stopped(preprocessed_queue, (frame_id, frame.shape[:2], future), stop_event):
+                return
+
+    def write():
+        nbr_frames = 0
+        for frame_ids, img0_sizes, skeletons_batch in iter_queue(inferred_queue):
+            with stats["write"].measure(len(frame_ids)):
+                for frame_id, img0_size, skeletons in zip(frame_ids, img0_sizes, skeletons_batch):
+                    if skeletons is None:
+                        with profile.measure("write"):
+                            sink.add_skipped(frame_id, img0_size)
+                        profile.count("skipped")
+                    else:
+                        with profile.measure("reid"):
+                            skeletons = stupid_reid(skeletons)
+                        with profile.measure("write"):
+                            sink.add_frame(frame_id, skeletons, img0_size)
+                        profile.count("skeletons", len(skeletons))
+
+                    profile.count("frames")
+                    nbr_frames += 1
+                    if nbr_frames % MEMORY_SAMPLE_PERIOD == 0:
+                        profile.sample_memory()
+
+    def infer(batch: List[Tuple[int, Tuple, Tuple[torch.Tensor, Tuple, Tuple]]]) -> bool:
+        # the static frames of the batch keep their place but are not
+        # inferred
+        frame_ids = [frame_id for frame_id, _, _ in batch]
+        img0_sizes = [img0_size for _, img0_size, _ in batch]
+        preprocessed = [item for _, _, item in batch if item is not None]
+        inferred = iter([])
+        if len(preprocessed) > 0:
+            with stats["infer"].measure(len(preprocessed)):
+                imgs = torch.cat([img for img, _, _ in preprocessed])
+                inferred = iter(model.predict_tensor(imgs, [size for _, size, _ in preprocessed],
+                                                     preprocessed[0][2], as_arrays=True))
+        skeletons_batch = [None if item is None else next(inferred) for _, _, item in batch]
+
+        return put_until_stopped(inferred_queue, (frame_ids, img0_sizes, skeletons_batch), stop_event)
+
+    threads = [StageThread(decode, decoded_queue, stop_event),
+               StageThread(dispatch, preprocessed_queue, stop_event),
+               StageThread(write, queue.Queue(), stop_event)]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+
+    try:
+        batch = []
+        img_size = None
+        nbr_inferred = 0
+        for frame_id, img0_size, future in iter_queue(preprocessed_queue):
+            preprocessed = None if future is None else future.result()
+            # a batch can only hold images of the same size
+            if preprocessed is not None and img_size is not None and img_size != preprocessed[2]:
+                if not infer(batch):
+                    break
+                batch, img_size, nbr_inferred = [], None, 0
+
+            batch.append((frame_id, img0_size, preprocessed))
+            if preprocessed is not None:
+                img_size = preprocessed[2]
+                nbr_inferred += 1
+            if nbr_inferred == batch_size:
+                if not infer(batch):
+                    break
+                batch, img_size, nbr_inferred = [], None, 0
+
+        if len(batch) > 0:
+            infer(batch)
+    except BaseException:
+        stop_event.set()
+        raise
+    finally:
+        put_until_stopped(inferred_queue, END_OF_STREAM, stop_event, force=True)
+        for thread in threads:
+            thread.join_and_raise()
+        executor.shutdown()
+        cap.release()
+
+    wall_time = perf_counter() - start
+    for stage in stats.values():
+        stage.wall_time = wall_time
+    if stage_stats is not None:
+        merge_stage_stats(stage_stats, stats)
+    if gate is not None and gate_stats is not None:
+        gate_stats.add(stats["gate"].items, stats["gate"].items - stats["infer"].items,
+                       stats["gate"].busy_time, stats["infer"].busy_time)
+
+
+def _batched_frames(
+    cap: VideoCapture,
+    batch_size: int,
+    frame_filter: Callable[[int], bool] = None,
+    profile: Profile = None,
+) -> Generator[Tuple[List[int], List[np.ndarray]], None, None]:
+    """
+    read a capture until its end, grouping the frames in batches.
+
+    Parameters
+    ----------
+    cap : VideoCapture
+        the capture to read from.
+    batch_size : int
+        the maximum number of frames in a batch. The last batch can
+        be smaller.
+    frame_filter : Callable[[int], bool], optional
+        if given, only the frames whose id it returns True for are
+        kept.
+    profile : Profile, optional
+        if given, the time spent reading the capture is added to its
+        "decode" stage.
+
+    Yields
+    ------
+    Tuple[List[int], List[np.ndarray]]
+        the frame ids and the frames of the batch.
+    """
+    frame_ids, frames = [], []
+    while True:
+        start = perf_counter()
+        cap_frame = cap.read()
+        if cap_frame is None:
+            break
+        if profile is not None:
+            profile.stage("decode").add(1, perf_counter() - start)
+
+        frame_id, frame = cap_frame
+        if frame_filter is not None and not frame_filter(frame_id):
+            continue
 
-        video_dict["frames"].append(frame_dict)
+        frame_ids.append(frame_id)
+        frames.append(frame)
 
-    if resolution is not None:
-        video_dict["resolution"] = resolution
-        video_dict["max_nbr_skeletons"] = max_number_of_skeleton
-        video_dict["min_nbr_skeletons"] = min_number_of_skeleton
+        if len(frames) == batch_size:
+            yield frame_ids, frames
+            frame_ids, frames = [], []
 
-        return video_dict
+    if len(frames) > 0:
+        yield frame_ids, frames
 
 
 def augment_all_vid(input_folder_path: Path,
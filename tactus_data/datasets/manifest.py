@@ -0,0 +1,140 @@
+"""
+keeps track of the extracted videos so that an extraction can be
+resumed after an interruption, or run again on a dataset where only a
+few videos changed.
+"""
+from pathlib import Path
+from typing import Dict
+import json
+
+from tactus_data.utils.files import atomic_write, file_sha256
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def source_fingerprint(video_path: Path) -> Dict:
+    """
+    identify the content of a source file.
+
+    Parameters
+    ----------
+    video_path : Path
+        path to the source file.
+
+    Returns
+    -------
+    Dict
+        the file `size` in bytes, its modification time `mtime_ns` in
+        nanoseconds and the `sha256` hash of its content.
+    """
+    stat = video_path.stat()
+
+    return {"size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_sha256(video_path)}
+
+
+class Manifest:
+    """
+    record of the outputs of an extraction, with the source file and
+    the parameters each of them was produced from.
+
+    Parameters
+    ----------
+    input_dir : Path
+        directory of the source videos. Sources are stored relative
+        to it.
+    output_dir : Path
+        directory of the extraction outputs. The manifest is saved in
+        it, and outputs are stored relative to it.
+    """
+    def __init__(self, input_dir: Path, output_dir: Path) -> None:
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.path = output_dir / MANIFEST_NAME
+
+        self.entries: Dict[str, Dict] = {}
+        if self.path.is_file():
+            with self.path.open(encoding="utf-8") as fp:
+                manifest = json.load(fp)
+
+            if manifest.get("version") == MANIFEST_VERSION:
+                self.entries = manifest["entries"]
+
+    def _key(self, output_path: Path) -> str:
+        return output_path.relative_to(self.output_dir).as_posix()
+
+    def is_current(self, video_path: Path, output_path: Path, params: Dict) -> bool:
+        """
+        check whether an output exists and was extracted from the
+        current version of a source with the same parameters.
+
+        When only the modification time of the source changed, its
+        content hash is compared and the manifest entry is refreshed if
+        the content is the same.
+
+        Parameters
+        ----------
+        video_path : Path
+            path to the source video.
+        output_path : Path
+            path to the output file.
+        params : Dict
+            the extraction parameters (model name, fps, thresholds).
+
+        Returns
+        -------
+        bool
+            True if the output does not need to be extracted again.
+        """
+        entry = self.entries.get(self._key(output_path))
+        if entry is None or not output_path.exists():
+            return False
+
+        if entry["source"] != video_path.relative_to(self.input_dir).as_posix():
+            return False
+
+        if entry["params"] != params:
+            return False
+
+        stat = video_path.stat()
+        if stat.st_size != entry["size"]:
+            return False
+
+        if stat.st_mtime_ns != entry["mtime_ns"]:
+            if file_sha256(video_path) != entry["sha256"]:
+                return False
+
+            entry["mtime_ns"] = stat.st_mtime_ns
+            self.save()
+
+        return True
+
+    def update(self, video_path: Path, output_path: Path, params: Dict, fingerprint: Dict):
+        """
+        record a freshly written output and save the manifest.
+
+        Parameters
+        ----------
+        video_path : Path
+            path to the source video.
+        output_path : Path
+            path to the output file.
+        params : Dict
+            the extraction parameters (model name, fps, thresholds).
+        fingerprint : Dict
+            the fingerprint of the source, taken before the extraction.
+            See `source_fingerprint`.
+        """
+        self.entries[self._key(output_path)] = {
+            "source": video_path.relative_to(self.input_dir).as_posix(),
+            **fingerprint,
+            "params": params,
+        }
+        self.save()
+
+    def save(self):
+        """write the manifest atomically."""
+        with atomic_write(self.path) as fp:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, fp, indent=1)
@@ -6,6 +6,7 @@ import io
 import requests
 import random
 from pathlib import Path
+from typing import Sequence, Union
 
 from tactus_data.datasets import dataset
 
@@ -20,20 +21,25 @@ ACTION_INDEXES = ["neutral", "neutral", "kicking",
                   "neutral", "punching", "pushing"]
 
 
-def extract_skeletons(fps: int = 10, device: str = None):
+def extract_skeletons(fps: Union[int, Sequence[int]] = 10, device: str = None, batch_size: int = 1, n_workers: int = 1):
     """
     Extract skeletons from a folder containing video frames using
     yolov7.
 
     Parameters
     ----------
-    fps : int
-        the fps of the extracted frames
+    fps : Union[int, Sequence[int]]
+        the fps of the extracted frames. Several fps are extracted
+        from a single decoding of each video.
     device : str
         the computing device to use with yolov7.
         Can be 'cpu', 'cuda:0' etc.
+    batch_size : int
+        the number of frames given to the model at once.
+    n_workers : int
+        the number of processes extracting videos in parallel.
     """
-    dataset.extract_skeletons(NAME, fps, "avi", device)
+    dataset.extract_skeletons(NAME, fps, "avi", device, batch_size, n_workers)
 
 
 def augment(grid: dict = None, fps: int = 10):
@@ -0,0 +1,222 @@
+"""
+Adaptive inference resolution of a stream: a camera filming people
+from close can be inferred at a low resolution, while a camera filming
+a crowd from far needs a high one. The input size of the model is
+chosen from the size of the people found in the previous frames.
+"""
+from typing import Dict, List, Sequence, Tuple, Union
+import time
+
+import numpy as np
+
+from tactus_data.utils.pose_results import PoseResults
+from tactus_data.utils.skeleton import Skeleton
+from tactus_data.utils.yolov8 import PosePredictionYolov8
+
+IMGSIZES = (320, 384, 448, 512, 640, 768, 960, 1280)
+
+
+class AdaptiveImgsize:
+    """
+    infer the successive frames of a stream at the cheapest input size
+    at which the people of the stream are still large enough to be
+    found.
+
+    Every `window` frames, the height of the smallest people, as the
+    `quantile` of the heights of the confident bounding boxes, gives
+    the smallest input size at which they are `min_person_height`
+    pixels high in the model input:
+
+    - the size goes up when the smallest people are too small, unless
+      the larger size would exceed `max_latency`.
+    - the size goes down when they are large enough at a smaller size
+      with a `hysteresis` margin. If the mean number of people per frame
+      then drops by more than `max_recall_drop`, the people too small
+      to be found at the smaller size are missing: the size goes back
+      up, and the smaller size is never tried again.
+    - it does not change when no one was found in the window.
+
+    Parameters
+    ----------
+    model : PosePredictionYolov8
+        the pose model. It starts at its `imgsize`.
+    imgsizes : Sequence[int], optional
+        the candidate input sizes, by default `IMGSIZES`. Only the
+        multiples of the model stride are used.
+    min_person_height : float, optional
+        height in pixels of the model input under which the keypoints
+        of a person are unreliable, by default 64.
+    max_latency : float, optional
+        maximum inference time of a frame in seconds, by default None
+        which does not bound the latency. The latency of a size that was
+        never used is extrapolated from the current one.
+    window : int, optional
+        number of frames between two decisions, by default 30.
+    quantile : float, optional
+        quantile of the heights of the people considered as the
+        smallest people, by default 0.1.
+    min_score : float, optional
+        minimum score of the bounding boxes whose height is measured,
+        by default 0.5.
+    hysteresis : float, optional
+        extra margin, as a fraction of `min_person_height`, required to
+        go down to a smaller size, by default 0.25.
+    max_recall_drop : float, optional
+        maximum relative drop of the mean number of people per frame
+        after going down to a smaller size, by default 0.2.
+    """
+    def __init__(
+        self,
+        model: PosePredictionYolov8,
+        imgsizes: Sequence[int] = IMGSIZES,
+        min_person_height: float = 64.,
+        max_latency: float = None,
+        window: int = 30,
+        quantile: float = 0.1,
+        min_score: float = 0.5,
+        hysteresis: float = 0.25,
+        max_recall_drop: float = 0.2,
+    ) -> None:
+        self.model = model
+        stride = int(model.model.stride)
+        self.imgsizes = sorted({size for size in imgsizes if size % stride == 0} | {model.imgsize})
+        self.min_person_height = min_person_height
+        self.max_latency = max_latency
+        self.window = window
+        self.quantile = quantile
+        self.min_score = min_score
+        self.hysteresis = hysteresis
+        self.max_recall_drop = max_recall_drop
+
+        self.imgsize = model.imgsize
+        self.history: List[Tuple[int, int]] = [(0, self.imgsize)]
+
+        self._nbr_frames = 0
+        self._window_frames = 0
+        self._window_heights: List[np.ndarray] = []
+        self._window_people = 0
+        self._latencies: Dict[int, float] = {}
+        self._people_per_frame: Dict[int, float] = {}
+        self._floor = self.imgsizes[0]
+        self._previous_imgsize: int = None
+
+    def predict(self, frame: np.ndarray, as_arrays: bool = False) -> Union[List[Skeleton], PoseResults]:
+        """
+        extract the skeletons of the next frame of the stream at the
+        current input size, and update the input size.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            the frame.
+        as_arrays : bool, optional
+            return a `PoseResults` instead of the list of skeletons, by
+            default False.
+
+        Returns
+        -------
+        Union[List[Skeleton], PoseResults]
+            the skeletons of the frame.
+        """
+        start = time.perf_counter()
+        results = self.model.predict_batch([frame], self.imgsize, as_arrays=True)[0]
+        self.update(results, frame.shape[:2], time.perf_counter() - start)
+
+        if as_arrays:
+            return results
+
+        return results.skeletons
+
+    def update(self, results: PoseResults, img0_size: Tuple[int, int], latency: float) -> int:
+        """
+        record the predictions of a frame inferred at the current input
+        size, for streams inferred outside of `predict`.
+
+        Parameters
+        ----------
+        results : PoseResults
+            the predictions of the frame.
+        img0_size : Tuple[int, int]
+            (height, width) of the frame.
+        latency : float
+            inference time of the frame, in seconds.
+
+        Returns
+        -------
+        int
+            the input size of the next frame.
+        """
+        previous_latency = self._latencies.get(self.imgsize)
+        if previous_latency is None:
+            self._latencies[self.imgsize] = latency
+        else:
+            self._latencies[self.imgsize] = 0.8 * previous_latency + 0.2 * latency
+
+        confident = np.asarray(results.scores) >= self.min_score
+        bboxes = np.asarray(results.bboxes_lbrt)[confident]
+        # heights relative to the longest side of the frame, which is
+        # scaled to the input size
+        self._window_heights.append(np.abs(bboxes[:, 1] - bboxes[:, 3]) / max(img0_size))
+        self._window_people += int(confident.sum())
+
+        self._nbr_frames += 1
+        self._window_frames += 1
+        if self._window_frames >= self.window:
+            self._decide()
+
+        return self.imgsize
+
+    def _estimated_latency(self, imgsize: int) -> float:
+        if imgsize in self._latencies:
+            return self._latencies[imgsize]
+
+        # the cost of the model is proportional to the number of pixels
+        return self._latencies[self.imgsize] * (imgsize / self.imgsize) ** 2
+
+    def _decide(self):
+        heights = np.concatenate(self._window_heights)
+        people_per_frame = self._window_people / self._window_frames
+        self._window_heights = []
+        self._window_people = 0
+        self._window_frames = 0
+
+        previous_imgsize, self._previous_imgsize = self._previous_imgsize, None
+        if previous_imgsize is not None and previous_imgsize > self.imgsize:
+            previous_people = self._people_per_frame[previous_imgsize]
+            if people_per_frame < (1 - self.max_recall_drop) * previous_people:
+                self._floor = previous_imgsize
+                self._set_imgsize(previous_imgsize)
+                return
+
+        self._people_per_frame[self.imgsize] = people_per_frame
+        if len(heights) == 0:
+            return
+
+        smallest = np.quantile(heights, self.quantile)
+        candidates = [size for size in self.imgsizes if size >= self._floor
+                      and (self.max_latency is None or size <= self.imgsize
+                           or self._estimated_latency(size) <= self.max_latency)]
+
+        if smallest * self.imgsize < self.min_person_height:
+            large_enough = [size for size in candidates if smallest * size >= self.min_person_height]
+            target = large_enough[0] if large_enough else candidates[-1]
+        else:
+            margin = self.min_person_height * (1 + self.hysteresis)
+            target = next(size for size in candidates if smallest * size >= margin or size >= self.imgsize)
+
+        if self.max_latency is not None:
+            # the latency bound comes before the size of the people
+            within_latency = [size for size in self.imgsizes
+                              if self._estimated_latency(size) <= self.max_latency]
+            target = min(target, within_latency[-1] if within_latency else self.imgsizes[0])
+            # the floor is lowered too, so that the current size stays
+            # among the candidates of the next decisions
+            self._floor = min(self._floor, target)
+
+        if target != self.imgsize:
+            self._set_imgsize(target)
+
+    def _set_imgsize(self, imgsize: int):
+        self._previous_imgsize = self.imgsize
+        self.imgsize = imgsize
+        self.history.append((self._nbr_frames, imgsize))
@@ -0,0 +1,184 @@
+"""
+Comparison of the inference backends of a pose model: the latency of
+each backend, and the deviation of its keypoints from the ones of the
+pytorch weights, to check that an ONNX export or an int8 quantization
+is worth it on a given machine.
+"""
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple, Union
+import time
+
+import numpy as np
+
+from tactus_data.utils.pose_results import PoseResults
+from tactus_data.utils.yolov8 import PosePredictionYolov8
+
+
+def compare_backends(
+    model_dir: Path,
+    model_name: str,
+    images: Sequence[Union[Path, np.ndarray]],
+    backends: Sequence[str] = ("onnx", "onnx-int8"),
+    device: str = "cpu",
+    n_warmup: int = 2,
+    min_iou: float = 0.5,
+) -> List[Dict]:
+    """
+    run the pytorch weights and other backends of a pose model on the
+    same images, and compare their latency and their skeletons.
+
+    Parameters
+    ----------
+    model_dir : Path
+        directory of the model weights.
+    model_name : str
+        name of the pytorch model weights, e.g. "yolov8n-pose.pt".
+    images : Sequence[Union[Path, np.ndarray]]
+        the images to infer, one at a time.
+    backends : Sequence[str], optional
+        the backends to compare to the "pt" backend, by default
+        ("onnx", "onnx-int8").
+    device : str, optional
+        the device to run the models on, by default "cpu".
+    n_warmup : int, optional
+        number of untimed inferences before the timed ones, by default
+        2.
+    min_iou : float, optional
+        minimum intersection over union of the bounding boxes of two
+        skeletons to be matched, by default 0.5.
+
+    Returns
+    -------
+    List[Dict]
+        a row per backend, "pt" first, with the `backend`, the mean
+        `latency_ms` per image, the `speedup` over "pt", the number of
+        `skeletons` found, the number of skeletons `matched` with the
+        "pt" ones, and the `mean_deviation_px` and `max_deviation_px`
+        of the keypoints of the matched skeletons.
+    """
+    reference, reference_latency = _run_backend(model_dir, model_name, "pt", images, device, n_warmup)
+    rows = [_report_row("pt", reference_latency, reference_latency, reference, reference, min_iou)]
+
+    for backend in backends:
+        results, latency = _run_backend(model_dir, model_name, backend, images, device, n_warmup)
+        rows.append(_report_row(backend, latency, reference_latency, results, reference, min_iou))
+
+    return rows
+
+
+def format_backend_report(rows: List[Dict]) -> str:
+    """format the rows of `compare_backends` as a text table."""
+    lines = [f"{'backend':<10} {'latency':>10} {'speedup':>8} {'skeletons':>10} "
+             f"{'matched':>8} {'mean dev':>9} {'max dev':>8}"]
+    for row in rows:
+        lines.append(f"{row['backend']:<10} {row['latency_ms']:>8.1f}ms {row['speedup']:>7.2f}x "
+                     f"{row['skeletons']:>10} {row['matched']:>8} "
+                     f"{row['mean_deviation_px']:>7.2f}px {row['max_deviation_px']:>6.1f}px")
+
+    return "\n".join(lines)
+
+
+def _run_backend(
+    model_dir: Path,
+    model_name: str,
+    backend: str,
+    images: Sequence[Union[Path, np.ndarray]],
+    device: str,
+    n_warmup: int,
+):
+    """infer every image with a backend, returning the results and the
+    mean latency per image in seconds."""
+    model = PosePredictionYolov8(model_dir, model_name, device, backend=backend)
+    for image in images[:1] * n_warmup:
+        model.predict_batch([image], as_arrays=True)
+
+    results = []
+    start = time.perf_counter()
+    for image in images:
+        results.append(model.predict_batch([image], as_arrays=True)[0])
+
+    return results, (time.perf_counter() - start) / len(images)
+
+
+def _report_row(
+    backend: str,
+    latency: float,
+    reference_latency: float,
+    results: List[PoseResults],
+    reference: List[PoseResults],
+    min_iou: float,
+) -> Dict:
+    deviations = []
+    nbr_matched = 0
+    for image_results, image_reference in zip(results, reference):
+        for i, j in match_skeletons(image_results, image_reference, min_iou):
+            nbr_matched += 1
+            deviations.append(np.linalg.norm(image_results.keypoints[i] - image_reference.keypoints[j], axis=-1))
+
+    deviations = np.concatenate(deviations) if deviations else np.zeros(1)
+
+    return {"backend": backend,
+            "latency_ms": latency * 1000,
+            "speedup": reference_latency / latency,
+            "skeletons": sum(len(image_results) for image_results in results),
+            "matched": nbr_matched,
+            "mean_deviation_px": float(deviations.mean()),
+            "max_deviation_px": float(deviations.max())}
+
+
+def match_skeletons(results: PoseResults, reference: PoseResults, min_iou: float = 0.5) -> List[Tuple[int, int]]:
+    """
+    greedily match the skeletons of two predictions of the same image
+    by decreasing intersection over union of their bounding boxes.
+
+    Parameters
+    ----------
+    results : PoseResults
+        the skeletons to match.
+    reference : PoseResults
+        the reference skeletons.
+    min_iou : float, optional
+        minimum intersection over union of two matched bounding boxes,
+        by default 0.5.
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+        the (index in `results`, index in `reference`) pairs.
+    """
+    if len(results) == 0 or len(reference) == 0:
+        return []
+
+    ious = _iou_matrix(_bboxes_ltrb(results), _bboxes_ltrb(reference))
+
+    pairs = []
+    for flat_index in np.argsort(-ious, axis=None):
+        i, j = np.unravel_index(flat_index, ious.shape)
+        if ious[i, j] < min_iou:
+            break
+        pairs.append((int(i), int(j)))
+        # neither skeleton can be matched again
+        ious[i, :] = -1
+        ious[:, j] = -1
+
+    return pairs
+
+
+def _bboxes_ltrb(results: PoseResults) -> np.ndarray:
+    x_left, y_bottom, x_right, y_top = np.asarray(results.bboxes_lbrt, dtype=float).T
+
+    return np.stack((x_left, np.minimum(y_bottom, y_top), x_right, np.maximum(y_bottom, y_top)), axis=1)
+
+
+def _iou_matrix(bboxes_a: np.ndarray, bboxes_b: np.ndarray) -> np.ndarray:
+    """intersection over union of every pair of x_left, y_top, x_right,
+    y_bottom bounding boxes."""
+    top_left = np.maximum(bboxes_a[:, None, :2], bboxes_b[None, :, :2])
+    bottom_right = np.minimum(bboxes_a[:, None, 2:], bboxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=-1)
+
+    area_a = (bboxes_a[:, 2:] - bboxes_a[:, :2]).prod(axis=-1)
+    area_b = (bboxes_b[:, 2:] - bboxes_b[:, :2]).prod(axis=-1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
@@ -0,0 +1,92 @@
+"""
+Counters and histograms of a threaded capture: the frames captured,
+delivered and dropped, the depth of the buffer and the latency between
+the capture of a frame and its consumption.
+"""
+from bisect import bisect_left
+from typing import Dict, Iterable
+
+# upper bounds of the capture-to-consume latency buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1., 2., 5.)
+
+
+class Histogram:
+    """
+    counts of values in fixed buckets: the bucket `i` counts the values
+    in (edges[i - 1], edges[i]], the last bucket the values above the
+    last edge.
+
+    Parameters
+    ----------
+    edges : Iterable[float]
+        the increasing upper bounds of the buckets.
+    """
+    def __init__(self, edges: Iterable[float]) -> None:
+        self.edges = list(edges)
+        self.counts = [0] * (len(self.edges) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+
+    def add(self, value: float):
+        """count a value."""
+        self.counts[bisect_left(self.edges, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self) -> float:
+        """the mean of the values, 0 without values."""
+        return self.sum / self.count if self.count else 0.
+
+    def quantile(self, q: float) -> float:
+        """the upper bound of the bucket of the `q` quantile, the
+        maximum value if it is in the last bucket."""
+        rank = q * self.count
+        cumulated = 0
+        for edge, count in zip(self.edges, self.counts):
+            cumulated += count
+            if cumulated >= rank and cumulated > 0:
+                return edge
+
+        return self.max
+
+    def to_dict(self) -> Dict:
+        """the buckets and statistics, to be saved as JSON."""
+        return {"edges": self.edges, "counts": list(self.counts), "count": self.count,
+                "mean": self.mean, "max": self.max}
+
+
+class CaptureMetrics:
+    """
+    measures of a threaded capture. The reading thread updates the
+    `captured`, `dropped` and `queue_depth` measures, the consumer the
+    `delivered` and `latency` ones.
+
+    Parameters
+    ----------
+    buffer_size : int
+        the size of the buffer of the capture.
+    """
+    def __init__(self, buffer_size: int) -> None:
+        self.captured = 0
+        self.delivered = 0
+        self.dropped = 0
+        # depth of the buffer after each captured frame
+        self.queue_depth = Histogram(range(buffer_size + 1))
+        # time between the capture of a frame and its delivery, seconds
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+    def to_dict(self) -> Dict:
+        """the measures, to be saved as JSON."""
+        return {"captured": self.captured, "delivered": self.delivered, "dropped": self.dropped,
+                "queue_depth": self.queue_depth.to_dict(), "latency": self.latency.to_dict()}
+
+    def __str__(self) -> str:
+        drop_rate = self.dropped / self.captured if self.captured else 0.
+        return (f"captured {self.captured}, delivered {self.delivered}, dropped {self.dropped} "
+                f"({drop_rate:.0%}), mean queue depth {self.queue_depth.mean:.1f}, "
+                f"latency mean {self.latency.mean * 1000:.1f}ms "
+                f"p50 <= {self.latency.quantile(0.5) * 1000:.0f}ms "
+                f"p99 <= {self.latency.quantile(0.99) * 1000:.0f}ms")
@@ -0,0 +1,197 @@
+"""
+Decoding of a video or stream by an ffmpeg process: the frames are
+subsampled and downscaled by the decoder, on its own threads, and
+streamed as raw BGR images through a pipe.
+"""
+from pathlib import Path
+from typing import List, Tuple, Union
+import shutil
+import subprocess
+
+import numpy as np
+import cv2
+
+
+class FFmpegReader:
+    """
+    the subset of the `cv2.VideoCapture` interface used by
+    `VideoCapture`, reading the frames from an ffmpeg process.
+
+    The properties of the source are probed with opencv. The process is
+    started by `start`, or by the first read with every frame.
+
+    Parameters
+    ----------
+    filename : Union[Path, str]
+        video file or stream url.
+    max_size : int, optional
+        downscale the frames whose longest side is larger than
+        `max_size`, keeping their aspect ratio, by default None. The
+        size is the one the frames are letterboxed to for a model of
+        input size `max_size`, so that they are not resized again.
+    threads : int, optional
+        number of decoding threads, by default 0 which lets ffmpeg
+        choose.
+    ffmpeg : str, optional
+        the ffmpeg executable, by default "ffmpeg" found in the PATH.
+    """
+    def __init__(
+        self,
+        filename: Union[Path, str],
+        max_size: int = None,
+        threads: int = 0,
+        ffmpeg: str = "ffmpeg",
+    ) -> None:
+        self._proc: subprocess.Popen = None
+        self.executable = shutil.which(ffmpeg)
+        if self.executable is None:
+            raise FileNotFoundError(f"{ffmpeg} was not found, install ffmpeg or use the opencv backend")
+
+        self.filename = str(filename)
+        self.threads = threads
+
+        probe = cv2.VideoCapture(self.filename)
+        if not probe.isOpened():
+            raise FileNotFoundError(f"could not open {filename}")
+        self.fps = probe.get(cv2.CAP_PROP_FPS)
+        self.frame_count = probe.get(cv2.CAP_PROP_FRAME_COUNT)
+        self.source_size = int(probe.get(cv2.CAP_PROP_FRAME_WIDTH)), int(probe.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        probe.release()
+
+        self.size = scaled_size(self.source_size, max_size)
+        self.shape = (self.size[1], self.size[0], 3)
+        self.stride = 1
+
+        self._scratch: np.ndarray = None
+        self._nbr_read = 0
+        self._eof = False
+
+    def command(self, stride: int = 1) -> List[str]:
+        """the ffmpeg command line reading one frame over `stride`."""
+        filters = []
+        if stride > 1:
+            # keeps the frames whose index counted from 1 is a multiple
+            # of the stride, like the opencv subsampling
+            filters.append(f"select='not(mod(n+1\\,{stride}))'")
+        if self.size != self.source_size:
+            filters.append(f"scale={self.size[0]}:{self.size[1]}:flags=bilinear")
+
+        command = [self.executable, "-nostdin", "-loglevel", "error",
+                   "-threads", str(self.threads), "-i", self.filename, "-an", "-sn"]
+        if filters:
+            command += ["-vf", ",".join(filters)]
+        # one output frame per selected frame, without duplicates
+        command += ["-vsync", "0", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+
+        return command
+
+    def start(self, stride: int = 1):
+        """start decoding one frame over `stride`, from the beginning
+        of a video."""
+        self.release()
+        self.stride = stride
+        self._nbr_read = 0
+        self._eof = False
+        self._proc = subprocess.Popen(self.command(stride), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                      bufsize=int(np.prod(self.shape)))
+
+    def read(self, image: np.ndarray = None) -> Tuple[bool, np.ndarray]:
+        """read the next frame, into `image` if it is a contiguous array
+        of the frame shape."""
+        if image is None or image.shape != self.shape or image.dtype != np.uint8 or not image.flags.c_contiguous:
+            image = np.empty(self.shape, dtype=np.uint8)
+
+        if not self._read_into(image):
+            return False, None
+
+        return True, image
+
+    def grab(self) -> bool:
+        """read the next frame and discard it."""
+        if self._scratch is None:
+            self._scratch = np.empty(self.shape, dtype=np.uint8)
+
+        return self._read_into(self._scratch)
+
+    def _read_into(self, image: np.ndarray) -> bool:
+        if self._proc is None:
+            self.start()
+        if self._eof:
+            return False
+
+        buffer = memoryview(image).cast("B")
+        filled = 0
+        while filled < len(buffer):
+            nbr_bytes = self._proc.stdout.readinto(buffer[filled:])
+            if not nbr_bytes:
+                self._eof = True
+                return False
+            filled += nbr_bytes
+
+        self._nbr_read += 1
+        return True
+
+    def get(self, prop: int) -> float:
+        """the fps, frame count, frame width and height (of the scaled
+        frames) and position of the capture, 0 for other properties."""
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frame_count
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.size[0])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.size[1])
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._nbr_read * self.stride)
+
+        return 0.
+
+    def set(self, prop: int, value: float) -> bool:
+        """the properties cannot be changed, like for an opencv backend
+        not supporting them."""
+        return False
+
+    def isOpened(self) -> bool:
+        """whether frames can still be read."""
+        return not self._eof
+
+    def release(self):
+        """stop the ffmpeg process."""
+        self._eof = True
+        if self._proc is None:
+            return
+
+        proc, self._proc = self._proc, None
+        proc.kill()
+        proc.stdout.close()
+        proc.wait()
+
+    def __del__(self):
+        self.release()
+
+
+def scaled_size(size: Tuple[int, int], max_size: int = None) -> Tuple[int, int]:
+    """
+    the (width, height) of a frame downscaled so that its longest side is
+    at most `max_size`, rounded like the letterbox of the models.
+
+    Parameters
+    ----------
+    size : Tuple[int, int]
+        (width, height) of the frame.
+    max_size : int, optional
+        maximum size of the longest side, by default None which keeps
+        the size.
+
+    Returns
+    -------
+    Tuple[int, int]
+        (width, height) of the downscaled frame.
+    """
+    width, height = size
+    if max_size is None or max(width, height) <= max_size:
+        return width, height
+
+    ratio = min(max_size / height, max_size / width)
+    return int(round(width * ratio)), int(round(height * ratio))
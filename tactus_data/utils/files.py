@@ -0,0 +1,59 @@
+"""
+file helpers shared by the data pipeline.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Generator, IO
+import hashlib
+import os
+import tempfile
+
+
+@contextmanager
+def atomic_write(path: Path, mode: str = "w", encoding: str = "utf-8") -> Generator[IO, None, None]:
+    """
+    open a temporary file next to `path` and move it to `path` once
+    the writing is done. A crash while writing never leaves a
+    truncated file behind: either the old file or the complete new
+    one is found at `path`.
+
+    Parameters
+    ----------
+    path : Path
+        the destination file. Its parent directories are created if
+        needed.
+    mode : str, optional
+        "w" for text or "wb" for binary, by default "w".
+    encoding : str, optional
+        encoding of the text mode, by default "utf-8".
+
+    Yields
+    ------
+    IO
+        the file object to write to.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if "b" in mode:
+        encoding = None
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as fp:
+            yield fp
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """return the hexadecimal sha256 digest of a file, read by chunks
+    to keep the memory usage constant."""
+    digest = hashlib.sha256()
+    with path.open("rb") as fp:
+        while chunk := fp.read(chunk_size):
+            digest.update(chunk)
+
+    return digest.hexdigest()
@@ -0,0 +1,154 @@
+"""
+Preallocated frames of a capture: the frames are decoded into the slots
+of a ring instead of new arrays, and the slots are reused once the
+consumers released them. The ring can live in shared memory, so that
+another process reads the frames without them being pickled or copied.
+"""
+from multiprocessing import shared_memory
+from typing import Dict, Tuple
+import threading
+
+import numpy as np
+
+
+class FrameRing:
+    """
+    `nbr_slots` preallocated frames, lent one at a time to the writer of
+    a frame and given back by the consumer of the frame.
+
+    Parameters
+    ----------
+    nbr_slots : int
+        number of frames.
+    shape : Tuple[int, ...]
+        shape of a frame, (height, width, 3) for BGR images.
+    dtype : np.dtype, optional
+        type of the pixels, by default np.uint8.
+    shared : bool, optional
+        allocate the frames in shared memory, by default False. Another
+        process can then read them through `FrameRing.attach`.
+    """
+    def __init__(self, nbr_slots: int, shape: Tuple[int, ...], dtype: np.dtype = np.uint8,
+                 shared: bool = False) -> None:
+        if nbr_slots < 1:
+            raise ValueError(f"a ring needs at least one slot, got {nbr_slots}")
+
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._shm: shared_memory.SharedMemory = None
+        self._owner = True
+        if shared:
+            nbytes = nbr_slots * int(np.prod(self.shape)) * self.dtype.itemsize
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.frames = np.ndarray((nbr_slots, *self.shape), dtype=self.dtype, buffer=self._shm.buf)
+        else:
+            self.frames = np.empty((nbr_slots, *self.shape), dtype=self.dtype)
+
+        self._free = list(range(nbr_slots))
+        self._closed = False
+        self._slot_freed = threading.Condition()
+
+    @classmethod
+    def attach(cls, descriptor: Dict) -> "FrameRing":
+        """
+        open, from another process, the frames of a ring in shared
+        memory. The slots are only managed by the process which created
+        the ring: the other processes only read `frames`.
+
+        Parameters
+        ----------
+        descriptor : Dict
+            the `descriptor` of the ring.
+
+        Returns
+        -------
+        FrameRing
+            a ring whose `frames` are the shared frames.
+        """
+        ring = cls.__new__(cls)
+        ring.shape = tuple(descriptor["shape"])
+        ring.dtype = np.dtype(descriptor["dtype"])
+        ring._shm = shared_memory.SharedMemory(name=descriptor["name"])
+        ring._owner = False
+        ring.frames = np.ndarray((descriptor["nbr_slots"], *ring.shape), dtype=ring.dtype, buffer=ring._shm.buf)
+        ring._free = []
+        ring._closed = True
+        ring._slot_freed = threading.Condition()
+        return ring
+
+    @property
+    def descriptor(self) -> Dict:
+        """the `name`, `nbr_slots`, `shape` and `dtype` of a ring in
+        shared memory, to attach it from another process."""
+        if self._shm is None:
+            raise ValueError("the ring is not in shared memory")
+
+        return {"name": self._shm.name, "nbr_slots": len(self.frames),
+                "shape": self.shape, "dtype": self.dtype.str}
+
+    def acquire(self, timeout: float = None) -> int:
+        """
+        lend a free slot, waiting for one to be released if they are all
+        in use.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum time to wait for a free slot in seconds, by default
+            None which waits until a slot is released or the ring closed.
+
+        Returns
+        -------
+        int
+            the index of the slot, or None if the ring is closed or no
+            slot was released before `timeout`.
+        """
+        with self._slot_freed:
+            if not self._slot_freed.wait_for(lambda: self._closed or self._free, timeout):
+                return None
+            if self._closed:
+                return None
+
+            return self._free.pop()
+
+    def release(self, slot: int):
+        """give back a slot, its frame can be overwritten."""
+        with self._slot_freed:
+            if slot in self._free:
+                raise ValueError(f"the slot {slot} was already released")
+
+            self._free.append(slot)
+            self._slot_freed.notify()
+
+    def slot_of(self, frame: np.ndarray) -> int:
+        """the index of the slot holding a frame of the ring, or None if
+        the frame is not in the ring."""
+        if self.frames is None or frame.shape != self.shape or not np.may_share_memory(frame, self.frames):
+            return None
+
+        offset = frame.__array_interface__["data"][0] - self.frames.__array_interface__["data"][0]
+        return offset // self.frames.strides[0]
+
+    def close(self):
+        """stop lending slots and wake up the threads waiting for one."""
+        with self._slot_freed:
+            self._closed = True
+            self._slot_freed.notify_all()
+
+    def unlink(self):
+        """close the ring and free its shared memory, once nothing writes
+        in it anymore. Its frames must not be used afterwards."""
+        self.close()
+        if self._shm is None:
+            return
+
+        shm, self._shm = self._shm, None
+        self.frames = None
+        if self._owner:
+            shm.unlink()
+        try:
+            shm.close()
+        except BufferError:
+            # a borrowed frame still uses the memory, it is unmapped when
+            # the frame is garbage collected
+            pass
@@ -0,0 +1,167 @@
+"""
+Process-wide registry of the loaded model backends: the models created
+per stream or per dataset run with the same weights, device and
+precision share a single backend, loaded from disk and warmed up once.
+"""
+from pathlib import Path
+from typing import Dict, List, Tuple
+import threading
+import time
+
+import torch
+
+from ultralytics.nn.autobackend import AutoBackend
+
+RegistryKey = Tuple[str, str, bool]
+
+
+class _RegistryEntry:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.backend: AutoBackend = None
+        self.refcount = 0
+        self.load_time = 0.
+
+
+class ModelRegistry:
+    """
+    cache of the loaded `AutoBackend`s, keyed by (weights path, device,
+    precision), with the number of models using each of them.
+
+    A backend whose models were all released stays loaded, so that the
+    next model with the same weights does not read them again, until it
+    is evicted with `evict`.
+
+    The shared backends are only used for inference: pytorch modules in
+    eval mode and onnxruntime sessions can run from several threads.
+
+    Parameters
+    ----------
+    warmup_imgsize : int, optional
+        side of the square dummy input a freshly loaded backend is run
+        on, by default 640. The first inference allocates the buffers
+        of the backend and is much slower than the next ones. 0 disables
+        the warmup.
+    """
+    def __init__(self, warmup_imgsize: int = 640) -> None:
+        self.warmup_imgsize = warmup_imgsize
+        self._lock = threading.Lock()
+        self._entries: Dict[RegistryKey, _RegistryEntry] = {}
+
+    @staticmethod
+    def key(weights_path: Path, device: torch.device, half: bool = False) -> RegistryKey:
+        """the registry key of a backend."""
+        return (str(Path(weights_path).resolve()), str(device), half)
+
+    def acquire(self, weights_path: Path, device: torch.device, half: bool = False) -> AutoBackend:
+        """
+        return the backend of some weights, loading and warming it up
+        if it is not loaded yet, and count one more model using it.
+        Each call must be balanced by a call to `release`.
+
+        Parameters
+        ----------
+        weights_path : Path
+            path to the model weights.
+        device : torch.device
+            the device to run the model on.
+        half : bool, optional
+            use half precision (float16), by default False.
+
+        Returns
+        -------
+        AutoBackend
+            the shared backend, in eval mode.
+        """
+        key = self.key(weights_path, device, half)
+        with self._lock:
+            entry = self._entries.setdefault(key, _RegistryEntry())
+            entry.refcount += 1
+
+        # loaded outside of the registry lock, so that loading a model
+        # does not block the models already loaded
+        with entry.lock:
+            if entry.backend is None:
+                start = time.perf_counter()
+                try:
+                    entry.backend = self._load(weights_path, device, half)
+                except BaseException:
+                    self._release(key, entry)
+                    raise
+                entry.load_time = time.perf_counter() - start
+
+        return entry.backend
+
+    def release(self, weights_path: Path, device: torch.device, half: bool = False):
+        """count one less model using a backend. The backend stays
+        loaded until it is evicted."""
+        key = self.key(weights_path, device, half)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            self._release(key, entry)
+
+    def _release(self, key: RegistryKey, entry: _RegistryEntry):
+        with self._lock:
+            entry.refcount = max(0, entry.refcount - 1)
+            if entry.backend is None and entry.refcount == 0 and self._entries.get(key) is entry:
+                # failed load
+                del self._entries[key]
+
+    def evict(self, weights_path: Path = None) -> int:
+        """
+        drop the backends no model is using anymore, so that their
+        memory can be freed.
+
+        Parameters
+        ----------
+        weights_path : Path, optional
+            only evict the backends of these weights, by default all
+            the unused backends.
+
+        Returns
+        -------
+        int
+            the number of evicted backends.
+        """
+        path = None if weights_path is None else str(Path(weights_path).resolve())
+        with self._lock:
+            keys = [key for key, entry in self._entries.items()
+                    if entry.refcount == 0 and (path is None or key[0] == path)]
+            for key in keys:
+                del self._entries[key]
+
+        if keys and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+        return len(keys)
+
+    def stats(self) -> List[Dict]:
+        """the `path`, `device`, `half`, `refcount` and `load_time` in
+        seconds of each registered backend."""
+        with self._lock:
+            return [{"path": path, "device": device, "half": half,
+                     "refcount": entry.refcount, "load_time": entry.load_time}
+                    for (path, device, half), entry in self._entries.items()]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: RegistryKey) -> bool:
+        return key in self._entries
+
+    def _load(self, weights_path: Path, device: torch.device, half: bool) -> AutoBackend:
+        backend = AutoBackend(weights_path, device=device, fp16=half)
+        backend.eval()
+
+        if self.warmup_imgsize:
+            dtype = torch.half if half else torch.float
+            dummy = torch.zeros((1, 3, self.warmup_imgsize, self.warmup_imgsize), dtype=dtype, device=device)
+            with torch.no_grad():
+                backend(dummy)
+
+        return backend
+
+
+# the registry shared by all the models of the process
+MODEL_REGISTRY = ModelRegistry()
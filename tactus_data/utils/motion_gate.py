@@ -0,0 +1,214 @@
+"""
+Motion gating of the pose inference: most of the frames of a
+surveillance video barely differ from the previous ones, so a cheap
+difference between downscaled frames decides whether running the pose
+model is worth it. The skeletons of the skipped frames are interpolated
+from the neighbouring inferred frames.
+"""
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from tactus_data.utils.skeleton import Skeleton
+
+
+class MotionGate:
+    """
+    decide whether a frame changed enough since the last inferred frame
+    to be inferred again.
+
+    The frames are converted to grayscale and downscaled, and the mean
+    absolute difference of their pixels is compared to `threshold`.
+    They are compared to the last inferred frame rather than to the
+    previous frame, so that a slow motion cannot be skipped forever.
+
+    Parameters
+    ----------
+    threshold : float, optional
+        mean absolute difference, between 0 and 255, under which a
+        frame is static, by default 2.
+    max_skip : int, optional
+        maximum number of consecutive static frames to skip, by default
+        4. It bounds the staleness of the interpolated skeletons.
+    downscale_width : int, optional
+        width the frames are downscaled to before being compared, by
+        default 64.
+    """
+    def __init__(self, threshold: float = 2., max_skip: int = 4, downscale_width: int = 64) -> None:
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.downscale_width = downscale_width
+        self._reference: np.ndarray = None
+        self._nbr_skipped = 0
+
+    def params(self) -> Dict:
+        """the parameters of the gate, which change the extraction
+        output."""
+        return {"threshold": self.threshold,
+                "max_skip": self.max_skip,
+                "downscale_width": self.downscale_width}
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        size = (self.downscale_width, max(1, round(height * self.downscale_width / width)))
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def is_static(self, frame: np.ndarray) -> bool:
+        """
+        check whether a frame can be skipped. A frame which is not
+        static becomes the reference the next frames are compared to.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            the BGR or grayscale frame.
+
+        Returns
+        -------
+        bool
+            True if the inference can be skipped for this frame.
+        """
+        thumbnail = self._thumbnail(frame)
+
+        if (self._reference is not None
+                and self._reference.shape == thumbnail.shape
+                and self._nbr_skipped < self.max_skip
+                and np.abs(thumbnail - self._reference).mean() < self.threshold):
+            self._nbr_skipped += 1
+            return True
+
+        self._reference = thumbnail
+        self._nbr_skipped = 0
+        return False
+
+
+class MotionGateStats:
+    """
+    how many frames a motion gate skipped and how much time it saved.
+
+    The time saved is estimated from the mean inference time of the
+    inferred frames, minus the time spent gating.
+    """
+    def __init__(self) -> None:
+        self.nbr_frames = 0
+        self.nbr_skipped = 0
+        self.gate_time = 0.
+        self.infer_time = 0.
+
+    def add(self, nbr_frames: int, nbr_skipped: int, gate_time: float, infer_time: float):
+        """count `nbr_frames` gated frames, `nbr_skipped` of which were
+        skipped, and the time spent gating and inferring them."""
+        self.nbr_frames += nbr_frames
+        self.nbr_skipped += nbr_skipped
+        self.gate_time += gate_time
+        self.infer_time += infer_time
+
+    def merge(self, other: "MotionGateStats"):
+        """add the measures of another run."""
+        self.add(other.nbr_frames, other.nbr_skipped, other.gate_time, other.infer_time)
+
+    @property
+    def skip_rate(self) -> float:
+        """fraction of the frames that were not inferred."""
+        if self.nbr_frames == 0:
+            return 0.
+
+        return self.nbr_skipped / self.nbr_frames
+
+    @property
+    def time_saved(self) -> float:
+        """estimated inference time saved, in seconds."""
+        nbr_inferred = self.nbr_frames - self.nbr_skipped
+        if nbr_inferred == 0:
+            return -self.gate_time
+
+        return self.nbr_skipped * self.infer_time / nbr_inferred - self.gate_time
+
+    def __str__(self) -> str:
+        return (f"motion gate: {self.nbr_skipped}/{self.nbr_frames} frames skipped "
+                f"({self.skip_rate:.0%}), ~{self.time_saved:.1f}s saved "
+                f"({self.gate_time:.1f}s spent gating)")
+
+
+class SkeletonInterpolator:
+    """
+    fill the frames skipped by a motion gate with skeletons
+    interpolated from the neighbouring inferred frames, and hand every
+    frame, in order, to a writer.
+
+    A skipped frame is held back until the next inferred frame arrives.
+    The keypoints and bounding box of a skeleton present with the same
+    tracking id in both inferred frames are linearly interpolated; the
+    other skeletons of the previous inferred frame are carried forward.
+    Interpolated skeletons have their `interpolated` flag set.
+
+    Parameters
+    ----------
+    writer
+        any object with an `add_frame(frame_id, skeletons, resolution)`
+        method.
+    """
+    def __init__(self, writer) -> None:
+        self.writer = writer
+        self._previous: Tuple[int, List[Skeleton]] = None
+        self._pending: List[Tuple[int, Tuple[int, int]]] = []
+
+    def add_skipped(self, frame_id: int, resolution: Tuple[int, int]):
+        """add a frame that was not inferred."""
+        if self._previous is None:
+            raise ValueError("the first frame of a video cannot be skipped.")
+
+        self._pending.append((frame_id, resolution))
+
+    def add_frame(self, frame_id: int, skeletons: List[Skeleton], resolution: Tuple[int, int]):
+        """add an inferred frame, releasing the skipped frames before
+        it."""
+        for pending_id, pending_resolution in self._pending:
+            self.writer.add_frame(pending_id, self._interpolate(pending_id, frame_id, skeletons), pending_resolution)
+        self._pending = []
+
+        self.writer.add_frame(frame_id, skeletons, resolution)
+        self._previous = (frame_id, skeletons)
+
+    def flush(self):
+        """release the skipped frames at the end of the video by
+        carrying the last skeletons forward."""
+        for pending_id, pending_resolution in self._pending:
+            self.writer.add_frame(pending_id, self._interpolate(pending_id, None, []), pending_resolution)
+        self._pending = []
+
+    def _interpolate(self, frame_id: int, next_id: int, next_skeletons: List[Skeleton]) -> List[Skeleton]:
+        previous_id, previous_skeletons = self._previous
+        next_by_id = {skeleton.tracking_id: skeleton for skeleton in next_skeletons
+                      if skeleton.tracking_id is not None}
+
+        skeletons = []
+        for skeleton in previous_skeletons:
+            next_skeleton = next_by_id.get(skeleton.tracking_id)
+            if next_skeleton is None:
+                skeletons.append(_lerp_skeleton(skeleton, skeleton, 0.))
+            else:
+                ratio = (frame_id - previous_id) / (next_id - previous_id)
+                skeletons.append(_lerp_skeleton(skeleton, next_skeleton, ratio))
+
+        return skeletons
+
+
+def _lerp_skeleton(start: Skeleton, end: Skeleton, ratio: float) -> Skeleton:
+    """return a new interpolated skeleton between `start` and `end`."""
+    keypoints = (1 - ratio) * np.array(start.keypoints) + ratio * np.array(end.keypoints)
+
+    bbox = ()
+    if start.bbox_lbrt is not None and end.bbox_lbrt is not None:
+        bbox = ((1 - ratio) * np.array(start.bbox_lbrt) + ratio * np.array(end.bbox_lbrt)).tolist()
+
+    return Skeleton(bbox_lbrt=bbox,
+                    score=start.score,
+                    keypoints=keypoints.round().tolist(),
+                    keypoints_visibility=start.keypoints_visibility,
+                    tracking_id=start.tracking_id,
+                    interpolated=True)
@@ -0,0 +1,209 @@
+"""
+Capture of many cameras or videos at once, read by a bounded pool of
+threads, so that a single pose model can infer the frames of every
+stream in one batch.
+"""
+from pathlib import Path
+from typing import Dict, Hashable, List, Mapping, Sequence, Tuple, Union
+import queue
+import threading
+
+import numpy as np
+
+from tactus_data.utils.thread_videocapture import STREAM_RETRY_DELAY, VideoCapture
+
+Source = Union[Path, str, int, VideoCapture]
+
+
+class _Stream:
+    def __init__(self, name: Hashable, cap: VideoCapture) -> None:
+        self.name = name
+        self.cap = cap
+        # the last frame read and not consumed yet
+        self.latest: Tuple[int, np.ndarray] = None
+        self.finished = False
+        self.nbr_read = 0
+        self.nbr_delivered = 0
+        self.nbr_dropped = 0
+
+
+class MultiStreamCapture:
+    """
+    read many captures (video files, device ids or stream urls) with
+    `n_readers` threads and hand the latest frame of each of them to a
+    single consumer.
+
+    The streams are read in turn: a reader thread takes the stream that
+    waited the longest, reads its next subsampled frame and puts it back
+    at the end of the schedule, so that every stream gets the same share
+    of the readers. Each stream keeps only its latest frame: when the
+    consumer is slower than a stream, the frames it did not take in time
+    are dropped. The frames of a video file are never dropped, the file
+    is only read again once its last frame was consumed.
+
+    Parameters
+    ----------
+    sources : Union[Sequence[Source], Mapping[Hashable, Source]]
+        the captures, as filenames, device ids, stream urls or already
+        opened `VideoCapture`s without threading. They are named by
+        their keys, or by their index for a sequence.
+    n_readers : int, optional
+        number of reader threads, by default 4. A reader waiting for the
+        next frame of a stream does not read the others, so the streams
+        of a slow network need more readers.
+    target_fps : int, optional
+        the target frame rate of the captures opened from a filename,
+        see `VideoCapture`.
+    stride : int, optional
+        the stride of the captures opened from a filename, see
+        `VideoCapture`.
+    capture_fps : float, optional
+        the frame rate of the captures opened from a filename, see
+        `VideoCapture`.
+    """
+    def __init__(self,
+                 sources: Union[Sequence[Source], Mapping[Hashable, Source]],
+                 *,
+                 n_readers: int = 4,
+                 target_fps: int = None,
+                 stride: int = None,
+                 capture_fps: float = None,
+                 ) -> None:
+        if not isinstance(sources, Mapping):
+            sources = dict(enumerate(sources))
+        if len(sources) == 0:
+            raise ValueError("no source to capture")
+
+        self.streams: Dict[Hashable, _Stream] = {}
+        try:
+            for name, source in sources.items():
+                if not isinstance(source, VideoCapture):
+                    source = VideoCapture(source, target_fps=target_fps, stride=stride, capture_fps=capture_fps)
+                elif source.use_threading:
+                    raise ValueError(f"the capture {name!r} has its own reading thread")
+                self.streams[name] = _Stream(name, source)
+        except BaseException:
+            for stream in self.streams.values():
+                stream.cap.release()
+            raise
+
+        self._lock = threading.Lock()
+        self._new_frames = threading.Condition(self._lock)
+        self._stop_event = threading.Event()
+
+        # names of the streams waiting for a reader, None stops a reader
+        self._schedule = queue.Queue()
+        for name in self.streams:
+            self._schedule.put(name)
+
+        # daemon threads: a reader blocked on a dead stream must not
+        # prevent the interpreter from exiting
+        self._readers = [threading.Thread(target=self._read_streams, daemon=True)
+                         for _ in range(max(1, min(n_readers, len(self.streams))))]
+        for reader in self._readers:
+            reader.start()
+
+    def read(self, timeout: float = None) -> Dict[Hashable, Tuple[int, np.ndarray]]:
+        """
+        return the latest frame of every stream that read a new frame
+        since the previous call, waiting for at least one of them.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum time to wait for a frame in seconds, by default None
+            which waits until a frame arrives or every stream ended.
+
+        Returns
+        -------
+        Dict[Hashable, Tuple[int, np.ndarray]]
+            the (frame index, frame) of the streams with a new frame, by
+            stream name, or None if every stream ended, the capture was
+            released or no frame arrived before `timeout`.
+        """
+        with self._new_frames:
+            self._new_frames.wait_for(self._can_read, timeout)
+            if self._stop_event.is_set():
+                return None
+
+            frames = {}
+            for stream in self.streams.values():
+                if stream.latest is None:
+                    continue
+
+                frames[stream.name] = stream.latest
+                stream.latest = None
+                stream.nbr_delivered += 1
+                if stream.cap.mode == "video":
+                    self._schedule.put(stream.name)
+
+        return frames or None
+
+    def _can_read(self) -> bool:
+        return (self._stop_event.is_set()
+                or any(stream.latest is not None for stream in self.streams.values())
+                or all(stream.finished for stream in self.streams.values()))
+
+    def _read_streams(self):
+        """read the next frame of the streams of the schedule, until a
+        None is scheduled."""
+        while True:
+            name = self._schedule.get()
+            if name is None:
+                return
+
+            stream = self.streams[name]
+            item = stream.cap.read()
+
+            if item is None:
+                if stream.cap.mode == "stream" and stream.cap.isOpened() and not self._stop_event.is_set():
+                    # a stream can miss a frame, try again later
+                    self._stop_event.wait(STREAM_RETRY_DELAY)
+                    self._schedule.put(name)
+                    continue
+
+                with self._new_frames:
+                    stream.finished = True
+                    self._new_frames.notify_all()
+                continue
+
+            with self._new_frames:
+                stream.nbr_read += 1
+                if stream.latest is not None:
+                    stream.nbr_dropped += 1
+                stream.latest = item
+                self._new_frames.notify_all()
+
+            # a video is scheduled again when its frame is consumed
+            if stream.cap.mode == "stream":
+                self._schedule.put(name)
+
+    def stats(self) -> List[Dict]:
+        """the `name`, `mode`, numbers of frames `read`, `delivered` and
+        `dropped`, and whether it `finished`, of each stream."""
+        with self._lock:
+            return [{"name": stream.name, "mode": stream.cap.mode, "read": stream.nbr_read,
+                     "delivered": stream.nbr_delivered, "dropped": stream.nbr_dropped,
+                     "finished": stream.finished}
+                    for stream in self.streams.values()]
+
+    def release(self):
+        """stop the readers and close every capture."""
+        if self._stop_event.is_set():
+            return
+
+        with self._new_frames:
+            self._stop_event.set()
+            self._new_frames.notify_all()
+        for _ in self._readers:
+            self._schedule.put(None)
+        for reader in self._readers:
+            reader.join()
+        for stream in self.streams.values():
+            stream.cap.release()
+
+    def __enter__(self) -> "MultiStreamCapture":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
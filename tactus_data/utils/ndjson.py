@@ -0,0 +1,196 @@
+"""
+Streaming storage of the skeletons of a video as newline-delimited
+JSON: one line per frame, written as soon as the frame is processed, so
+that neither the extraction nor the reading has to hold a whole video
+in memory.
+
+The first line is a header, the last one a trailer holding the video
+metadata, and every line in between is a frame dictionnary with the
+same layout as the frames of the JSON files:
+
+    {"header": {"format": "tactus-skeletons", "version": 1}}
+    {"frame_id": 3, "skeletons": [...]}
+    {"frame_id": 6, "skeletons": [...]}
+    ...
+    {"trailer": {"resolution": [240, 320], "max_nbr_skeletons": 2, ...}}
+"""
+from pathlib import Path
+from typing import Dict, Generator, List, Tuple
+import json
+import os
+
+from tactus_data.utils.files import atomic_write
+from tactus_data.utils.skeleton import Skeleton
+
+FORMAT_NAME = "tactus-skeletons"
+FORMAT_VERSION = 1
+
+
+class NDJSONSkeletonWriter:
+    """
+    write the skeletons of a video frame after frame. The file is
+    written to a temporary file and only moved to `path` by `close`,
+    so an interrupted extraction never leaves a truncated file.
+
+    Parameters
+    ----------
+    path : Path
+        path of the NDJSON file.
+
+    Examples
+    --------
+    >>> with NDJSONSkeletonWriter(Path("yolov8.ndjson")) as writer:
+    ...     writer.add_frame(1, skeletons, frame.shape[:2])
+    """
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.resolution = None
+        self.nbr_frames = 0
+        self.max_number_of_skeleton = 0
+        self.min_number_of_skeleton = float("inf")
+
+        self._atomic_write = atomic_write(path)
+        self._fp = self._atomic_write.__enter__()
+        self._write_line({"header": {"format": FORMAT_NAME, "version": FORMAT_VERSION}})
+
+    def _write_line(self, record: Dict):
+        self._fp.write(json.dumps(record))
+        self._fp.write("\n")
+
+    def add_frame(self, frame_id: int, skeletons: List[Skeleton], resolution: Tuple[int, int]):
+        """write the skeletons of a frame. The resolution of the first
+        frame is the resolution of the video."""
+        if self.resolution is None:
+            self.resolution = resolution
+
+        self._write_line({"frame_id": frame_id, "skeletons": skeletons})
+
+        self.nbr_frames += 1
+        self.max_number_of_skeleton = max(self.max_number_of_skeleton, len(skeletons))
+        self.min_number_of_skeleton = min(self.min_number_of_skeleton, len(skeletons))
+
+    def metadata(self) -> Dict:
+        """return the video metadata written in the trailer."""
+        if self.resolution is None:
+            return {"resolution": None, "nbr_frames": 0}
+
+        return {"resolution": self.resolution,
+                "max_nbr_skeletons": self.max_number_of_skeleton,
+                "min_nbr_skeletons": self.min_number_of_skeleton,
+                "nbr_frames": self.nbr_frames}
+
+    def close(self):
+        """write the trailer and move the file to its destination."""
+        if self._fp is None:
+            return
+
+        self._write_line({"trailer": self.metadata()})
+        self._fp = None
+        self._atomic_write.__exit__(None, None, None)
+
+    def abort(self):
+        """delete the temporary file without touching `path`."""
+        if self._fp is None:
+            return
+
+        self._fp = None
+        exception = InterruptedError("NDJSON writing aborted")
+        self._atomic_write.__exit__(InterruptedError, exception, None)
+
+    def __enter__(self) -> "NDJSONSkeletonWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def iter_ndjson_frames(path: Path) -> Generator[Dict, None, None]:
+    """
+    lazily read the frames of a NDJSON skeleton file.
+
+    Parameters
+    ----------
+    path : Path
+        path of the NDJSON file.
+
+    Yields
+    ------
+    Dict
+        the frame dictionnaries, with `frame_id` and `skeletons` keys.
+    """
+    with path.open(encoding="utf-8") as fp:
+        for line in fp:
+            record = json.loads(line)
+            if "frame_id" in record:
+                yield record
+
+
+def read_ndjson_metadata(path: Path) -> Dict:
+    """
+    read the header and the trailer of a NDJSON skeleton file without
+    reading the frames.
+
+    Parameters
+    ----------
+    path : Path
+        path of the NDJSON file.
+
+    Returns
+    -------
+    Dict
+        the trailer metadata (`resolution`, `max_nbr_skeletons`,
+        `min_nbr_skeletons`, `nbr_frames`) and the header `format` and
+        `version`.
+    """
+    with path.open("rb") as fp:
+        header = json.loads(fp.readline())["header"]
+        if header.get("format") != FORMAT_NAME:
+            raise ValueError(f"{path} is not a NDJSON skeleton file.")
+
+        # the trailer is the last line: read backward until the
+        # previous line break
+        position = fp.seek(0, os.SEEK_END)
+        chunk_size = 4096
+        tail = b""
+        while position > 0 and tail.count(b"\n") < 2:
+            read_size = min(chunk_size, position)
+            position -= read_size
+            fp.seek(position)
+            tail = fp.read(read_size) + tail
+
+        last_line = tail.rstrip(b"\n").rsplit(b"\n", 1)[-1]
+        trailer = json.loads(last_line).get("trailer")
+
+    if trailer is None:
+        raise ValueError(f"{path} has no trailer. It is probably incomplete.")
+
+    return {**header, **trailer}
+
+
+def load_ndjson(path: Path) -> Dict:
+    """
+    load a whole NDJSON skeleton file into the same dictionnary as the
+    JSON files. Only use it when the video fits in memory.
+
+    Parameters
+    ----------
+    path : Path
+        path of the NDJSON file.
+
+    Returns
+    -------
+    Dict
+        a dict with `frames`, `resolution`, `max_nbr_skeletons` and
+        `min_nbr_skeletons`, or None if the video has no frame.
+    """
+    metadata = read_ndjson_metadata(path)
+    if metadata["resolution"] is None:
+        return None
+
+    return {"frames": list(iter_ndjson_frames(path)),
+            "resolution": metadata["resolution"],
+            "max_nbr_skeletons": metadata["max_nbr_skeletons"],
+            "min_nbr_skeletons": metadata["min_nbr_skeletons"]}
@@ -0,0 +1,179 @@
+"""
+Building blocks for multi-threaded processing pipelines: stages
+connected by bounded queues, each of them measuring its own throughput.
+"""
+from contextlib import contextmanager
+from typing import Callable, Dict, Generator, Iterable
+from time import perf_counter
+import queue
+import threading
+
+# put in a queue to signal that a stage will not produce anything else
+END_OF_STREAM = object()
+
+
+class StageStats:
+    """
+    throughput of a pipeline stage.
+
+    Parameters
+    ----------
+    name : str
+        name of the stage.
+    n_workers : int, optional
+        number of threads running the stage, by default 1.
+    """
+    def __init__(self, name: str, n_workers: int = 1) -> None:
+        self.name = name
+        self.n_workers = n_workers
+        self.items = 0
+        self.calls = 0
+        self.busy_time = 0.
+        self.max_time = 0.
+        self.wall_time = 0.
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, n_items: int = 1) -> Generator[None, None, None]:
+        """measure the time spent processing `n_items` items."""
+        start = perf_counter()
+        yield
+        self.add(n_items, perf_counter() - start)
+
+    def add(self, n_items: int, busy_time: float):
+        """count `n_items` items processed in `busy_time` seconds."""
+        with self._lock:
+            self.items += n_items
+            self.calls += 1
+            self.busy_time += busy_time
+            self.max_time = max(self.max_time, busy_time)
+
+    @property
+    def throughput(self) -> float:
+        """number of items the stage can process per second when it
+        never waits for its input or its output."""
+        if self.busy_time == 0:
+            return float("inf")
+
+        return self.items / self.busy_time * self.n_workers
+
+    @property
+    def utilisation(self) -> float:
+        """fraction of the time the stage workers were busy. The stage
+        with the highest utilisation is the bottleneck."""
+        if self.wall_time == 0:
+            return 0.
+
+        return self.busy_time / (self.wall_time * self.n_workers)
+
+    def merge(self, other: "StageStats"):
+        """add the measures of another run of the same stage."""
+        self.items += other.items
+        self.calls += other.calls
+        self.busy_time += other.busy_time
+        self.max_time = max(self.max_time, other.max_time)
+        self.wall_time += other.wall_time
+
+    def __str__(self) -> str:
+        return (f"{self.name}: {self.items} items, {self.throughput:.1f} items/s, "
+                f"{self.utilisation:.0%} busy ({self.n_workers} worker(s))")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def merge_stage_stats(total: Dict[str, StageStats], stats: Dict[str, StageStats]):
+    """add the stage stats of `stats` to `total`, in place."""
+    for name, stage_stats in stats.items():
+        if name in total:
+            total[name].merge(stage_stats)
+        else:
+            total[name] = stage_stats
+
+
+def format_stage_stats(stats: Dict[str, StageStats]) -> str:
+    """one line per stage, the bottleneck being marked."""
+    if len(stats) == 0:
+        return ""
+
+    bottleneck = max(stats.values(), key=lambda stage_stats: stage_stats.utilisation)
+    lines = []
+    for stage_stats in stats.values():
+        marker = " <- bottleneck" if stage_stats is bottleneck else ""
+        lines.append(f"{stage_stats}{marker}")
+
+    return "\n".join(lines)
+
+
+class StageThread(threading.Thread):
+    """
+    thread running a pipeline stage. An exception raised by the stage
+    is kept to be raised again in the thread that joins it, and
+    END_OF_STREAM is always put in the output queue so that the next
+    stage never waits forever.
+
+    Parameters
+    ----------
+    target : Callable[[], None]
+        the stage loop.
+    output_queue : queue.Queue
+        the queue the stage writes to.
+    stop_event : threading.Event
+        set when a stage failed, so that the others stop early.
+    """
+    def __init__(self, target: Callable[[], None], output_queue: queue.Queue, stop_event: threading.Event) -> None:
+        super().__init__(daemon=True)
+        self._target_loop = target
+        self.output_queue = output_queue
+        self.stop_event = stop_event
+        self.exception: BaseException = None
+
+    def run(self):
+        try:
+            self._target_loop()
+        except BaseException as exception:  # pylint: disable=broad-except
+            self.exception = exception
+            self.stop_event.set()
+        finally:
+            put_until_stopped(self.output_queue, END_OF_STREAM, self.stop_event, force=True)
+
+    def join_and_raise(self):
+        """join the thread and raise the exception of the stage if any."""
+        self.join()
+        if self.exception is not None:
+            raise self.exception
+
+
+def put_until_stopped(output_queue: queue.Queue, item, stop_event: threading.Event, force: bool = False) -> bool:
+    """
+    put an item in a bounded queue, giving up when the pipeline is
+    stopped. Return whether the item was put.
+
+    If `force` is set, an item is dropped from the queue to make space
+    once the pipeline is stopped: nothing will read it anyway.
+    """
+    while True:
+        try:
+            output_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            if not stop_event.is_set():
+                continue
+            if not force:
+                return False
+            try:
+                output_queue.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def iter_queue(input_queue: queue.Queue) -> Iterable:
+    """yield the items of a queue until END_OF_STREAM is found."""
+    while (item := input_queue.get()) is not END_OF_STREAM:
+        yield item
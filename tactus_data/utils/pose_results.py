@@ -0,0 +1,102 @@
+"""
+Pose predictions kept as arrays, so that the detections of a frame do
+not have to be looped over in python unless Skeleton objects are
+needed.
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from tactus_data.utils.skeleton import Skeleton
+
+
+class PoseResults:
+    """
+    skeletons of an image as arrays. It behaves like the list of its
+    skeletons, but the Skeleton objects are only built the first time
+    they are accessed.
+
+    Parameters
+    ----------
+    bboxes_lbrt : np.ndarray
+        (N, 4) x_left, y_bottom, x_right, y_top bounding boxes.
+    scores : np.ndarray
+        (N,) scores.
+    keypoints : np.ndarray
+        (N, 13, 2) keypoints coordinates, the head being replaced by
+        the neck.
+    keypoints_visibility : np.ndarray
+        (N, 13) keypoints visibility.
+    tracking_ids : np.ndarray, optional
+        (N,) tracking ids, -1 for the untracked skeletons. By default,
+        none is tracked.
+    """
+    def __init__(
+        self,
+        bboxes_lbrt: np.ndarray,
+        scores: np.ndarray,
+        keypoints: np.ndarray,
+        keypoints_visibility: np.ndarray,
+        tracking_ids: np.ndarray = None,
+    ) -> None:
+        self.bboxes_lbrt = bboxes_lbrt
+        self.scores = scores
+        self.keypoints = keypoints
+        self.keypoints_visibility = keypoints_visibility
+        if tracking_ids is None:
+            tracking_ids = np.full(len(scores), -1, dtype=np.int64)
+        self.tracking_ids = tracking_ids
+        self._skeletons: List[Skeleton] = None
+
+    @classmethod
+    def empty(cls) -> "PoseResults":
+        """results of an image without anyone."""
+        return cls(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32),
+                   np.zeros((0, 13, 2)), np.zeros((0, 13)))
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __iter__(self):
+        return iter(self.skeletons)
+
+    def __getitem__(self, index: int) -> Skeleton:
+        return self.skeletons[index]
+
+    @property
+    def skeletons(self) -> List[Skeleton]:
+        """the Skeleton objects, built on the first access."""
+        if self._skeletons is None:
+            self._skeletons = [Skeleton(bbox_lbrt=bbox.tolist(),
+                                        score=score.item(),
+                                        keypoints=keypoints.tolist(),
+                                        keypoints_visibility=visibility.tolist(),
+                                        tracking_id=None if tracking_id == -1 else tracking_id.item())
+                               for bbox, score, keypoints, visibility, tracking_id
+                               in zip(self.bboxes_lbrt, self.scores, self.keypoints,
+                                      self.keypoints_visibility, self.tracking_ids)]
+
+        return self._skeletons
+
+    def set_tracking_ids(self, tracking_ids: np.ndarray):
+        """set the tracking ids, -1 for the untracked skeletons, of the
+        arrays and of the Skeleton objects if they were built."""
+        self.tracking_ids = tracking_ids
+        if self._skeletons is not None:
+            for skeleton, tracking_id in zip(self._skeletons, tracking_ids.tolist()):
+                skeleton.tracking_id = None if tracking_id == -1 else tracking_id
+
+    def to_json(self) -> List[Dict]:
+        """Serialise the skeletons to JSON, like a list of Skeleton,
+        without building the Skeleton objects."""
+        if self._skeletons is not None:
+            return [skeleton.to_json() for skeleton in self._skeletons]
+
+        return [{"bbox_lbrt": bbox,
+                 "score": score,
+                 "keypoints": keypoints,
+                 "keypoints_visibility": visibility,
+                 "tracking_id": None if tracking_id == -1 else tracking_id}
+                for bbox, score, keypoints, visibility, tracking_id
+                in zip(self.bboxes_lbrt.tolist(), self.scores.tolist(), self.keypoints.tolist(),
+                       self.keypoints_visibility.tolist(), self.tracking_ids.tolist())]
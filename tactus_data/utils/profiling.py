@@ -0,0 +1,153 @@
+"""
+Lightweight instrumentation of the extraction hot path: the time spent
+in each stage, a few counters and the peak memory. A measure costs a
+couple of clock reads and a dict lookup, so it is always on.
+"""
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from time import perf_counter
+from typing import ContextManager, Dict, Generator
+import json
+import sys
+import threading
+
+import torch
+
+from tactus_data.utils.files import atomic_write
+from tactus_data.utils.pipeline import StageStats
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+# number of frames between two memory samples
+MEMORY_SAMPLE_PERIOD = 32
+
+
+class Profile:
+    """
+    per-stage timers, counters and peak memory of an extraction.
+
+    The stages are created on their first measure, and are shared by
+    the threads of a pipelined extraction.
+    """
+    def __init__(self) -> None:
+        self.stages: Dict[str, StageStats] = {}
+        self.counters: Dict[str, int] = {}
+        self.peak_rss_mb = 0.
+        self.peak_cuda_mb = 0.
+        self.wall_time = 0.
+        self._lock = threading.Lock()
+
+    def stage(self, name: str) -> StageStats:
+        """return the stats of a stage, creating them if needed."""
+        stage_stats = self.stages.get(name)
+        if stage_stats is None:
+            with self._lock:
+                stage_stats = self.stages.setdefault(name, StageStats(name))
+
+        return stage_stats
+
+    @contextmanager
+    def measure(self, name: str, n_items: int = 1) -> Generator[None, None, None]:
+        """measure the time spent in a stage processing `n_items`
+        items."""
+        start = perf_counter()
+        yield
+        self.stage(name).add(n_items, perf_counter() - start)
+
+    def count(self, name: str, n: int = 1):
+        """add `n` to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def sample_memory(self):
+        """update the peak memory with the current resident memory of
+        the process and the memory allocated by torch on the gpu."""
+        rss_mb = _current_rss_mb()
+        if rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            self.peak_cuda_mb = max(self.peak_cuda_mb, torch.cuda.max_memory_allocated() / 2 ** 20)
+
+    def merge(self, other: "Profile"):
+        """add the measures of another run, the wall times of the runs
+        being added as if they ran one after the other."""
+        for name, stage_stats in other.stages.items():
+            self.stage(name).merge(stage_stats)
+        for name, value in other.counters.items():
+            self.count(name, value)
+        self.peak_rss_mb = max(self.peak_rss_mb, other.peak_rss_mb)
+        self.peak_cuda_mb = max(self.peak_cuda_mb, other.peak_cuda_mb)
+        self.wall_time += other.wall_time
+
+    def to_dict(self) -> Dict:
+        """the measures, to be saved as JSON."""
+        return {"wall_time": self.wall_time,
+                "stages": {name: {"items": stage_stats.items,
+                                  "calls": stage_stats.calls,
+                                  "busy_time": stage_stats.busy_time,
+                                  "max_time": stage_stats.max_time}
+                           for name, stage_stats in self.stages.items()},
+                "counters": dict(self.counters),
+                "peak_rss_mb": self.peak_rss_mb,
+                "peak_cuda_mb": self.peak_cuda_mb}
+
+    def save(self, path: Path, **extra):
+        """write the measures atomically to a JSON file, with the
+        `extra` keys."""
+        with atomic_write(path) as fp:
+            json.dump({**self.to_dict(), **extra}, fp, indent=1)
+
+    def __str__(self) -> str:
+        lines = [f"{'stage':<12} {'calls':>7} {'items':>7} {'total':>9} {'share':>6} {'mean':>9} {'max':>9}"]
+        for name, stage_stats in self.stages.items():
+            share = stage_stats.busy_time / self.wall_time if self.wall_time > 0 else 0.
+            mean = stage_stats.busy_time / max(1, stage_stats.calls)
+            lines.append(f"{name:<12} {stage_stats.calls:>7} {stage_stats.items:>7} "
+                         f"{stage_stats.busy_time:>8.2f}s {share:>6.0%} "
+                         f"{mean * 1000:>7.1f}ms {stage_stats.max_time * 1000:>7.1f}ms")
+
+        counters = ", ".join(f"{name}: {value}" for name, value in self.counters.items())
+        lines.append(f"wall time {self.wall_time:.2f}s, peak memory {self.peak_rss_mb:.0f}MB"
+                     + (f", peak gpu memory {self.peak_cuda_mb:.0f}MB" if self.peak_cuda_mb else "")
+                     + (f", {counters}" if counters else ""))
+
+        return "\n".join(lines)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def measure(profile: Profile, name: str, n_items: int = 1) -> ContextManager:
+    """`profile.measure(name, n_items)`, or nothing if `profile` is
+    None."""
+    if profile is None:
+        return nullcontext()
+
+    return profile.measure(name, n_items)
+
+
+def _current_rss_mb() -> float:
+    """the resident memory of the process, or its peak when the current
+    one is not available, in MB."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fp:
+            resident_pages = int(fp.read().split()[1])
+        return resident_pages * resource.getpagesize() / 2 ** 20
+    except (OSError, AttributeError):
+        pass
+
+    if resource is None:
+        return None
+
+    # kilobytes on linux, bytes on macos
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2 ** (20 if sys.platform == "darwin" else 10)
@@ -1,9 +1,10 @@
-from typing import List, Tuple
+from typing import List, Tuple, Union
 import numpy as np
 from deep_sort_realtime.deepsort_tracker import DeepSort
 from deep_sort_realtime.deep_sort.track import Track
 
 from tactus_data.utils.skeleton import Skeleton
+from tactus_data.utils.pose_results import PoseResults
 
 
 def deepsort_reid(
@@ -54,10 +55,13 @@ def cap_bbox(frame: np.ndarray, bbox_ltrb: Tuple[float, float, float, float]):
     return left, top, right, bottom
 
 
-def stupid_reid(skeletons: List[Skeleton]) -> List[Skeleton]:
+def stupid_reid(skeletons: Union[List[Skeleton], PoseResults]) -> Union[List[Skeleton], PoseResults]:
     """compare the x center of the bounding box to identify the
     skeleton which is the most on the left, and the one which is the
     most on the right."""
+    if isinstance(skeletons, PoseResults):
+        return _stupid_reid_arrays(skeletons)
+
     if len(skeletons) == 0:
         return []
 
@@ -73,3 +77,21 @@ def stupid_reid(skeletons: List[Skeleton]) -> List[Skeleton]:
         skeletons[index_max].tracking_id = 2
 
     return skeletons
+
+
+def _stupid_reid_arrays(results: PoseResults) -> PoseResults:
+    """`stupid_reid` on the bounding boxes array of a PoseResults."""
+    if len(results) == 0:
+        return results
+
+    x_pos_skeletons = (results.bboxes_lbrt[:, 0] + results.bboxes_lbrt[:, 2]) / 2
+
+    tracking_ids = results.tracking_ids.copy()
+    if len(results) == 1:
+        tracking_ids[0] = 1
+    else:
+        tracking_ids[np.argmin(x_pos_skeletons)] = 1
+        tracking_ids[np.argmax(x_pos_skeletons)] = 2
+    results.set_tracking_ids(tracking_ids)
+
+    return results
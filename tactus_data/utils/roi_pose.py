@@ -0,0 +1,212 @@
+"""
+Pose estimation on the regions of interest of a video: the full frame
+is only inferred periodically, and in between the pose model only runs
+on crops around the people found in the previous frame. A small person
+fills a larger part of its crop than of the letterboxed frame, and a
+scene with a few people costs a few small crops instead of a full
+frame.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from tactus_data.utils.skeleton import Skeleton
+from tactus_data.utils.yolov8 import PosePredictionYolov8
+
+
+class RoiPoseEstimator:
+    """
+    estimate the poses of the successive frames of a video, running
+    the model on crops around the tracked people between two full-frame
+    inferences.
+
+    A full frame is inferred every `full_frame_period` frames, when no
+    one or more than `max_crops` people were found in the previous
+    frame, and when a person is lost in its crop. New people entering
+    the scene are therefore only found at the next full-frame
+    inference.
+
+    Parameters
+    ----------
+    model : PosePredictionYolov8
+        the pose model.
+    full_frame_period : int, optional
+        number of frames between two full-frame inferences, by default
+        10.
+    padding : float, optional
+        margin added around the previous bounding box of a person on
+        each side, as a fraction of its width and height, by default
+        0.25.
+    crop_size : int, optional
+        size of the longest side of the model input for the crops, by
+        default 320. It must be a multiple of the model stride.
+    min_iou : float, optional
+        minimum intersection over union between the previous bounding
+        box of a person and a detection in its crop for the person to
+        be considered found, by default 0.3.
+    max_crops : int, optional
+        maximum number of crops inferred instead of the full frame, by
+        default 8. Above it, the crops cost more than the full frame.
+    """
+    def __init__(
+        self,
+        model: PosePredictionYolov8,
+        full_frame_period: int = 10,
+        padding: float = 0.25,
+        crop_size: int = 320,
+        min_iou: float = 0.3,
+        max_crops: int = 8,
+    ) -> None:
+        self.model = model
+        self.full_frame_period = full_frame_period
+        self.padding = padding
+        self.crop_size = crop_size
+        self.min_iou = min_iou
+        self.max_crops = max_crops
+
+        self._tracks: List[Tuple[float, float, float, float]] = []
+        self._nbr_since_full_frame = 0
+        self.nbr_full_frames = 0
+        self.nbr_crop_frames = 0
+        self.nbr_fallbacks = 0
+
+    def params(self) -> Dict:
+        """the parameters of the estimator, which change the
+        extraction output."""
+        return {"full_frame_period": self.full_frame_period,
+                "padding": self.padding,
+                "crop_size": self.crop_size,
+                "min_iou": self.min_iou,
+                "max_crops": self.max_crops}
+
+    def predict(self, frame: np.ndarray) -> List[Skeleton]:
+        """
+        extract the skeletons of the next frame of the video.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            the frame.
+
+        Returns
+        -------
+        List[Skeleton]
+            skeletons in the frame coordinates.
+        """
+        if (len(self._tracks) == 0
+                or len(self._tracks) > self.max_crops
+                or self._nbr_since_full_frame + 1 >= self.full_frame_period):
+            return self._predict_full_frame(frame)
+
+        skeletons = self._predict_crops(frame)
+        if skeletons is None:
+            self.nbr_fallbacks += 1
+            return self._predict_full_frame(frame)
+
+        self.nbr_crop_frames += 1
+        self._nbr_since_full_frame += 1
+        self._tracks = [skeleton.bbox_ltrb for skeleton in skeletons]
+
+        return skeletons
+
+    def _predict_full_frame(self, frame: np.ndarray) -> List[Skeleton]:
+        skeletons = self.model.predict_batch([frame])[0]
+
+        self.nbr_full_frames += 1
+        self._nbr_since_full_frame = 0
+        self._tracks = [skeleton.bbox_ltrb for skeleton in skeletons]
+
+        return skeletons
+
+    def _predict_crops(self, frame: np.ndarray) -> List[Skeleton]:
+        """infer the crops around the tracks in a single batch. Return
+        None if a track is lost."""
+        img_height, img_width = frame.shape[:2]
+        crops, origins = [], []
+        for track in self._tracks:
+            left, top, right, bottom = pad_bbox(track, self.padding, img_width, img_height)
+            crops.append(frame[top:bottom, left:right])
+            origins.append((left, top))
+
+        skeletons = []
+        for track, origin, crop_skeletons in zip(self._tracks, origins,
+                                                 self.model.predict_batch(crops, self.crop_size)):
+            crop_skeletons = [offset_skeleton(skeleton, *origin) for skeleton in crop_skeletons]
+            ious = [bbox_iou(track, skeleton.bbox_ltrb) for skeleton in crop_skeletons]
+            if len(ious) == 0 or max(ious) < self.min_iou:
+                return None
+
+            skeleton = crop_skeletons[int(np.argmax(ious))]
+            # neighbouring crops can overlap and find the same person
+            if all(bbox_iou(skeleton.bbox_ltrb, other.bbox_ltrb) < 1 - self.min_iou for other in skeletons):
+                skeletons.append(skeleton)
+
+        return skeletons
+
+
+def pad_bbox(
+    bbox_ltrb: Sequence[float],
+    padding: float,
+    img_width: int,
+    img_height: int,
+) -> Tuple[int, int, int, int]:
+    """
+    enlarge a bounding box by a fraction of its size on each side and
+    clip it to the image.
+
+    Parameters
+    ----------
+    bbox_ltrb : Sequence[float]
+        x_left, y_top, x_right, y_bottom
+    padding : float
+        margin added on each side, as a fraction of the bounding box
+        width and height.
+    img_width : int
+        width of the image.
+    img_height : int
+        height of the image.
+
+    Returns
+    -------
+    Tuple[int, int, int, int]
+        the integer x_left, y_top, x_right, y_bottom pixel coordinates
+        of the padded bounding box.
+    """
+    left, top, right, bottom = bbox_ltrb
+    margin_x = (right - left) * padding
+    margin_y = (bottom - top) * padding
+
+    left = int(max(0, np.floor(left - margin_x)))
+    top = int(max(0, np.floor(top - margin_y)))
+    right = int(min(img_width, np.ceil(right + margin_x)))
+    bottom = int(min(img_height, np.ceil(bottom + margin_y)))
+
+    return left, top, max(right, left + 1), max(bottom, top + 1)
+
+
+def offset_skeleton(skeleton: Skeleton, x_offset: float, y_offset: float) -> Skeleton:
+    """return a copy of a skeleton translated by (x_offset, y_offset),
+    typically to go from the coordinates of a crop to the coordinates
+    of the image."""
+    left, bottom, right, top = skeleton.bbox_lbrt
+
+    return Skeleton(bbox_lbrt=(left + x_offset, bottom + y_offset, right + x_offset, top + y_offset),
+                    score=skeleton.score,
+                    keypoints=[[x + x_offset, y + y_offset] for x, y in skeleton.keypoints],
+                    keypoints_visibility=skeleton.keypoints_visibility,
+                    tracking_id=skeleton.tracking_id)
+
+
+def bbox_iou(bbox_a: Sequence[float], bbox_b: Sequence[float]) -> float:
+    """intersection over union of two x_left, y_top, x_right, y_bottom
+    bounding boxes."""
+    inter_width = min(bbox_a[2], bbox_b[2]) - max(bbox_a[0], bbox_b[0])
+    inter_height = min(bbox_a[3], bbox_b[3]) - max(bbox_a[1], bbox_b[1])
+    if inter_width <= 0 or inter_height <= 0:
+        return 0.
+
+    intersection = inter_width * inter_height
+    area_a = (bbox_a[2] - bbox_a[0]) * (bbox_a[3] - bbox_a[1])
+    area_b = (bbox_b[2] - bbox_b[0]) * (bbox_b[3] - bbox_b[1])
+
+    return intersection / (area_a + area_b - intersection)
@@ -76,13 +76,16 @@ MEDIUM_ANGLES_LIST = [
 
 
 class Skeleton:
-    def __init__(self, bbox_lbrt: Sequence = (), score: float = None, keypoints: Sequence = None, keypoints_visibility: Sequence = None, tracking_id: int = None) -> None:
+    def __init__(self, bbox_lbrt: Sequence = (), score: float = None, keypoints: Sequence = None, keypoints_visibility: Sequence = None, tracking_id: int = None, interpolated: bool = False) -> None:
         self._boundbing_box_lbrt: Tuple[float, float, float, float] = None
         self._score: float = score
         self._keypoints: Tuple[float] = None
         self._keypoints_visibility: Tuple[bool] = None
         self._height: float = None
         self.tracking_id = tracking_id
+        # set when the skeleton was interpolated from the neighbouring
+        # frames instead of being inferred
+        self.interpolated = interpolated
 
         self.bbox = bbox_lbrt
         self.keypoints = keypoints
@@ -294,7 +297,7 @@ class Skeleton:
             bbox[2:] = [width, height]
 
         if direction.endswith('rb'):
-            bbox[:2] = [x_right, y_bottom]
+            bbox[2:] = [x_right, y_bottom]
 
         if direction.startswith('lt'):
             bbox[:2] = [x_left, y_top]
@@ -382,13 +385,18 @@ class Skeleton:
         return keypoints
 
     def to_json(self):
-        """Serialise a skeleton to JSON."""
-        return {"bbox_lbrt": self.bbox_lbrt,
-                "score": self._score,
-                "keypoints": self.keypoints,
-                "keypoints_visibility": self.keypoints_visibility,
-                "tracking_id": self.tracking_id,
-                }
+        """Serialise a skeleton to JSON. `interpolated` is only written
+        for the interpolated skeletons."""
+        skeleton_json = {"bbox_lbrt": self.bbox_lbrt,
+                         "score": self._score,
+                         "keypoints": self.keypoints,
+                         "keypoints_visibility": self.keypoints_visibility,
+                         "tracking_id": self.tracking_id,
+                         }
+        if self.interpolated:
+            skeleton_json["interpolated"] = True
+
+        return skeleton_json
 
 
 def check_keypoints(keypoints: List[List[float]]) -> bool:
@@ -0,0 +1,373 @@
+"""
+Columnar binary storage of the skeletons of a video. Instead of nested
+JSON dictionnaries, every field is stored as one contiguous numpy array
+for the whole video, in a directory:
+
+    yolov8.store
+    ├── metadata.json               resolution, skeleton counts, version
+    ├── frame_ids.npy               (F,) int64
+    ├── frame_offsets.npy           (F + 1,) int64
+    ├── keypoints.npy               (S, 13, 2) float32
+    ├── keypoints_visibility.npy    (S, 13) float32, NaN if unknown
+    ├── bboxes_lbrt.npy             (S, 4) float32, NaN if unknown
+    ├── scores.npy                  (S,) float32, NaN if unknown
+    ├── tracking_ids.npy            (S,) int64, -1 if untracked
+    ├── interpolated.npy            (S,) bool
+    ├── track_order.npy             (S,) int64
+    ├── track_ids.npy               (T,) int64
+    └── track_offsets.npy           (T + 1,) int64
+
+The skeletons of the i-th frame are the rows
+`frame_offsets[i]:frame_offsets[i + 1]` of the skeleton arrays.
+`track_order` lists the rows sorted by tracking id then frame: the rows
+of the track `track_ids[j]` are `track_order[track_offsets[j]:
+track_offsets[j + 1]]`.
+
+`interpolated` flags the skeletons filled in by the motion gating of
+the extraction. Stores written before it was added have no such file,
+and none of their skeletons is interpolated.
+
+The arrays are memory-mapped when read: opening a store is instant
+and only the pages that are accessed are read from the disk.
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Union
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from tactus_data.utils.skeleton import Skeleton
+from tactus_data.utils.pose_results import PoseResults
+from tactus_data.utils.ndjson import iter_ndjson_frames, read_ndjson_metadata
+
+FORMAT_VERSION = 1
+NBR_KEYPOINTS = 13
+UNTRACKED = -1
+
+
+class SkeletonStoreWriter:
+    """
+    accumulate the skeletons of a video and write them as a columnar
+    store. The store is written to a temporary directory and only moved
+    to `path` by `close`.
+
+    Parameters
+    ----------
+    path : Path
+        path of the store directory.
+    """
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.resolution = None
+        self._frame_ids: List[int] = []
+        self._frame_sizes: List[int] = []
+        self._keypoints: List[np.ndarray] = []
+        self._visibility: List[np.ndarray] = []
+        self._bboxes: List[np.ndarray] = []
+        self._scores: List[float] = []
+        self._tracking_ids: List[int] = []
+        self._interpolated: List[bool] = []
+        self._closed = False
+
+    def add_frame(
+        self,
+        frame_id: int,
+        skeletons: Union[List[Union[Skeleton, Dict]], PoseResults],
+        resolution: Tuple[int, int],
+    ):
+        """add the skeletons of a frame. Skeletons can be Skeleton
+        objects, their JSON dictionnaries, or the PoseResults arrays.
+        The resolution of the first frame is the resolution of the
+        video."""
+        if self.resolution is None:
+            self.resolution = resolution
+
+        self._frame_ids.append(frame_id)
+        self._frame_sizes.append(len(skeletons))
+
+        if isinstance(skeletons, PoseResults):
+            self._add_arrays(skeletons)
+            return
+
+        for skeleton in skeletons:
+            if isinstance(skeleton, Skeleton):
+                skeleton = skeleton.to_json()
+
+            self._keypoints.append(np.asarray(skeleton["keypoints"], dtype=np.float32).reshape(NBR_KEYPOINTS, 2))
+            self._visibility.append(_as_float_array(skeleton.get("keypoints_visibility"), NBR_KEYPOINTS))
+            self._bboxes.append(_as_float_array(skeleton.get("bbox_lbrt"), 4))
+            score = skeleton.get("score")
+            self._scores.append(np.nan if score is None else score)
+            tracking_id = skeleton.get("tracking_id")
+            self._tracking_ids.append(UNTRACKED if tracking_id is None else tracking_id)
+            self._interpolated.append(skeleton.get("interpolated", False))
+
+    def _add_arrays(self, results: PoseResults):
+        """add the skeletons of a frame without building Skeleton
+        objects."""
+        self._keypoints.extend(results.keypoints.astype(np.float32))
+        self._visibility.extend(results.keypoints_visibility.astype(np.float32))
+        self._bboxes.extend(results.bboxes_lbrt.astype(np.float32))
+        self._scores.extend(results.scores.tolist())
+        self._tracking_ids.extend(results.tracking_ids.tolist())
+        self._interpolated.extend([False] * len(results))
+
+    def close(self):
+        """write the arrays and move the store to its destination."""
+        if self._closed:
+            return
+        self._closed = True
+
+        nbr_skeletons = len(self._keypoints)
+        tracking_ids = np.array(self._tracking_ids, dtype=np.int64)
+        # a stable sort keeps the frame order inside each track
+        track_order = np.argsort(tracking_ids, kind="stable")
+        track_ids, track_sizes = np.unique(tracking_ids, return_counts=True)
+        arrays = {
+            "frame_ids": np.array(self._frame_ids, dtype=np.int64),
+            "frame_offsets": np.concatenate(([0], np.cumsum(self._frame_sizes, dtype=np.int64))),
+            "keypoints": _stack(self._keypoints, (nbr_skeletons, NBR_KEYPOINTS, 2)),
+            "keypoints_visibility": _stack(self._visibility, (nbr_skeletons, NBR_KEYPOINTS)),
+            "bboxes_lbrt": _stack(self._bboxes, (nbr_skeletons, 4)),
+            "scores": np.array(self._scores, dtype=np.float32),
+            "tracking_ids": tracking_ids,
+            "interpolated": np.array(self._interpolated, dtype=bool),
+            "track_order": track_order,
+            "track_ids": track_ids,
+            "track_offsets": np.concatenate(([0], np.cumsum(track_sizes, dtype=np.int64))),
+        }
+        metadata = {"version": FORMAT_VERSION,
+                    "resolution": self.resolution,
+                    "max_nbr_skeletons": max(self._frame_sizes, default=None),
+                    "min_nbr_skeletons": min(self._frame_sizes, default=None)}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp"))
+        try:
+            for name, array in arrays.items():
+                np.save(tmp_dir / f"{name}.npy", array)
+            with (tmp_dir / "metadata.json").open("w", encoding="utf-8") as fp:
+                json.dump(metadata, fp)
+            _replace_dir(tmp_dir, self.path)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def __enter__(self) -> "SkeletonStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+def _as_float_array(values, length: int) -> np.ndarray:
+    if values is None:
+        return np.full(length, np.nan, dtype=np.float32)
+
+    return np.asarray(values, dtype=np.float32)
+
+
+def _stack(arrays: List[np.ndarray], shape: Tuple) -> np.ndarray:
+    if len(arrays) == 0:
+        return np.zeros(shape, dtype=np.float32)
+
+    return np.stack(arrays)
+
+
+def _replace_dir(src: Path, dst: Path):
+    """move the directory src to dst, replacing dst if it exists."""
+    if not dst.exists():
+        os.replace(src, dst)
+        return
+
+    old_dir = Path(tempfile.mkdtemp(dir=dst.parent, prefix=f".{dst.name}.", suffix=".old"))
+    os.replace(dst, old_dir / dst.name)
+    os.replace(src, dst)
+    shutil.rmtree(old_dir)
+
+
+class SkeletonStore:
+    """
+    read a columnar skeleton store. The arrays are memory-mapped and
+    the frame slices are views on them: nothing is read from the disk
+    until the values are used.
+
+    Parameters
+    ----------
+    path : Path
+        path of the store directory.
+    """
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+        with (path / "metadata.json").open(encoding="utf-8") as fp:
+            self.metadata: Dict = json.load(fp)
+        if self.metadata["version"] != FORMAT_VERSION:
+            raise ValueError(f"unsupported skeleton store version {self.metadata['version']}.")
+
+        self.frame_ids = self._load("frame_ids")
+        self.frame_offsets = self._load("frame_offsets")
+        self.keypoints = self._load("keypoints")
+        self.keypoints_visibility = self._load("keypoints_visibility")
+        self.bboxes_lbrt = self._load("bboxes_lbrt")
+        self.scores = self._load("scores")
+        self.tracking_ids = self._load("tracking_ids")
+        if (path / "interpolated.npy").is_file():
+            self.interpolated = self._load("interpolated")
+        else:
+            self.interpolated = np.zeros(len(self.tracking_ids), dtype=bool)
+        self.track_order = self._load("track_order")
+        self.track_ids = self._load("track_ids")
+        self.track_offsets = self._load("track_offsets")
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(self.path / f"{name}.npy", mmap_mode="r")
+
+    @property
+    def resolution(self) -> Tuple[int, int]:
+        """(height, width) of the video."""
+        return self.metadata["resolution"]
+
+    def __len__(self) -> int:
+        return len(self.frame_ids)
+
+    def frame_rows(self, index: int) -> slice:
+        """return the slice of the skeleton rows of the `index`-th
+        frame."""
+        return slice(int(self.frame_offsets[index]), int(self.frame_offsets[index + 1]))
+
+    def frame_index(self, frame_id: int) -> int:
+        """return the index of a frame from its id."""
+        index = int(np.searchsorted(self.frame_ids, frame_id))
+        if index == len(self.frame_ids) or self.frame_ids[index] != frame_id:
+            raise KeyError(f"there is no frame {frame_id} in {self.path}.")
+
+        return index
+
+    def frame(self, index: int) -> Dict[str, np.ndarray]:
+        """
+        return the skeletons of the `index`-th frame as views on the
+        store arrays.
+
+        Parameters
+        ----------
+        index : int
+            index of the frame, between 0 and len(store). Use
+            `frame_index` to get it from a frame id.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            `keypoints` (N, 13, 2), `keypoints_visibility` (N, 13),
+            `bboxes_lbrt` (N, 4), `scores` (N,), `tracking_ids` (N,)
+            and `interpolated` (N,) of the N skeletons of the frame.
+        """
+        rows = self.frame_rows(index)
+
+        return {"keypoints": self.keypoints[rows],
+                "keypoints_visibility": self.keypoints_visibility[rows],
+                "bboxes_lbrt": self.bboxes_lbrt[rows],
+                "scores": self.scores[rows],
+                "tracking_ids": self.tracking_ids[rows],
+                "interpolated": self.interpolated[rows]}
+
+    def track_rows(self, tracking_id: int) -> np.ndarray:
+        """return the skeleton rows of a track, in the frame order, as
+        a view on `track_order`."""
+        track_index = int(np.searchsorted(self.track_ids, tracking_id))
+        if track_index == len(self.track_ids) or self.track_ids[track_index] != tracking_id:
+            raise KeyError(f"there is no track {tracking_id} in {self.path}.")
+
+        return self.track_order[self.track_offsets[track_index]:self.track_offsets[track_index + 1]]
+
+    def track(self, tracking_id: int) -> Dict[str, np.ndarray]:
+        """
+        return every skeleton of a track, in the frame order.
+
+        The rows of a track are not contiguous in the frame-major
+        arrays: only the rows of the track are read and copied.
+
+        Parameters
+        ----------
+        tracking_id : int
+            the tracking id.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            `frame_indexes` (T,), `keypoints` (T, 13, 2),
+            `keypoints_visibility` (T, 13), `bboxes_lbrt` (T, 4),
+            `scores` (T,) and `interpolated` (T,) of the T skeletons of
+            the track.
+        """
+        rows = self.track_rows(tracking_id)
+        frame_indexes = np.searchsorted(self.frame_offsets, rows, side="right") - 1
+
+        return {"frame_indexes": frame_indexes,
+                "keypoints": self.keypoints[rows],
+                "keypoints_visibility": self.keypoints_visibility[rows],
+                "bboxes_lbrt": self.bboxes_lbrt[rows],
+                "scores": self.scores[rows],
+                "interpolated": self.interpolated[rows]}
+
+    def skeletons(self, index: int) -> List[Skeleton]:
+        """return the skeletons of the `index`-th frame as Skeleton
+        objects."""
+        skeletons = []
+        for row in range(*self.frame_rows(index).indices(len(self.keypoints))):
+            bbox = self.bboxes_lbrt[row]
+            score = self.scores[row]
+            visibility = self.keypoints_visibility[row]
+            tracking_id = int(self.tracking_ids[row])
+            skeletons.append(Skeleton(
+                bbox_lbrt=() if np.isnan(bbox).any() else bbox.tolist(),
+                score=None if np.isnan(score) else float(score),
+                keypoints=self.keypoints[row].tolist(),
+                keypoints_visibility=None if np.isnan(visibility).any() else visibility.tolist(),
+                tracking_id=None if tracking_id == UNTRACKED else tracking_id,
+                interpolated=bool(self.interpolated[row]),
+            ))
+
+        return skeletons
+
+
+def json_to_store(json_path: Path, store_path: Path = None) -> Path:
+    """
+    convert a JSON or NDJSON skeleton file to a columnar store.
+
+    Parameters
+    ----------
+    json_path : Path
+        path of the `.json` or `.ndjson` file.
+    store_path : Path, optional
+        path of the store directory. By default, `json_path` with the
+        `.store` suffix.
+
+    Returns
+    -------
+    Path
+        the path of the store.
+    """
+    if store_path is None:
+        store_path = json_path.with_suffix(".store")
+
+    if json_path.suffix == ".ndjson":
+        resolution = read_ndjson_metadata(json_path)["resolution"]
+        frames: Iterable[Dict] = iter_ndjson_frames(json_path)
+    else:
+        with json_path.open(encoding="utf-8") as fp:
+            video_dict = json.load(fp)
+        if video_dict is None:
+            resolution, frames = None, []
+        else:
+            resolution, frames = video_dict["resolution"], video_dict["frames"]
+
+    with SkeletonStoreWriter(store_path) as writer:
+        for frame in frames:
+            writer.add_frame(frame["frame_id"], frame["skeletons"], resolution)
+
+    return store_path
@@ -3,8 +3,9 @@ A videoCapture API extension that allows for subsampling and threading
 """
 from collections import deque
 from pathlib import Path
-from typing import Union, Literal, Tuple
-from time import time
+from typing import Any, AsyncIterator, Iterator, List, Union, Literal, Tuple
+from time import monotonic, time
+import asyncio
 import threading
 import warnings
 import tqdm
@@ -12,6 +13,23 @@ import tqdm
 import numpy as np
 import cv2
 
+from tactus_data.utils.capture_metrics import CaptureMetrics
+from tactus_data.utils.ffmpeg_reader import FFmpegReader
+from tactus_data.utils.frame_ring import FrameRing
+
+# time to wait before reading a stream again after a failed read, in
+# seconds
+STREAM_RETRY_DELAY = 0.01
+
+# default stride from which the frames of a video file are skipped by
+# seeking. Seeking decodes from the previous keyframe, which is slower
+# than grabbing the skipped frames for smaller strides.
+SEEK_MIN_STRIDE = 30
+
+# number of frames the frame rate of a capture is estimated on, when the
+# capture does not provide it
+FPS_ESTIMATION_FRAMES = 30
+
 
 class VideoCapture:
     """
@@ -31,19 +49,73 @@ class VideoCapture:
         out, it is going to take one frame over two giving an effective
         frame rate of 32fps.
         If None, will extract every frame of the capture.
+    stride : int, optional
+        read one frame over `stride`, instead of `target_fps`. The
+        skipped frames are grabbed but not retrieved as images.
     buffer_size : int, optional
         the size of the reading buffer.
     capture_fps : float, optional
-        the input frame rate. Can be specified to avoid the frame rate
-        estimation part as it can be imprecise or couldn't work if the
-        stream does not emit any frame for now.
+        the input frame rate. Can be specified when the capture does not
+        provide it, to avoid its estimation: the first frames are then
+        read without subsampling, until the frame rate is estimated from
+        their timestamps and the stride of `target_fps` computed.
     drop_warning_enable : bool, optional
-        whether or not to show a warning if a frame had to be dropped.
-        When the buffer is full and a new frame is coming in, a frame
-        has to be dropped in order to make space in the buffer.
+        whether or not to show a warning when the first frame is
+        dropped. The dropped frames are counted in `metrics`.
         By default True.
+    drop_policy : Literal["oldest", "latest", "cadence"], optional
+        the frames a threaded stream drops when its consumer is too slow,
+        by default "oldest":
+
+        - "oldest": when the buffer is full, the oldest frame is dropped
+          to make space for the new one.
+        - "latest": only the latest frame is kept, the consumer always
+          gets the most recent frame.
+        - "cadence": while the buffer is at least half full, one frame
+          over `drop_every` is dropped as it arrives, so that the frames
+          delivered keep a regular cadence. The oldest frame is dropped
+          if the buffer is still full.
+
+        A threaded video never drops frames: its reading thread waits
+        for space in the buffer instead.
+    drop_every : int, optional
+        with the "cadence" policy, one frame over `drop_every` is
+        dropped, by default 2.
     tqdm_progressbar : tqdm.tqdm, optional
         progress bar to display
+    seek_stride : int, optional
+        stride from which the skipped frames of a video file are
+        skipped by seeking to the next frame to read instead of grabbing
+        them, by default `SEEK_MIN_STRIDE`. None never seeks.
+    frame_slots : int, optional
+        with threading, decode the frames into a `FrameRing` of
+        `frame_slots` preallocated frames instead of new arrays, by
+        default None. It must hold the `buffer_size` buffered frames,
+        the frame being decoded and the frames borrowed by the
+        consumers: the frames returned by `read` are borrowed until
+        they are given back with `release_frame`.
+    shared_memory : bool, optional
+        allocate the `frame_slots` frames in shared memory, by default
+        False. Another process can read them through the
+        `frame_ring.descriptor`.
+    backend : Literal["opencv", "ffmpeg"], optional
+        the decoder of the video files and stream urls, by default
+        "opencv". "ffmpeg" decodes in an ffmpeg process which subsamples
+        and downscales the frames itself, see `FFmpegReader`. The frame
+        indices are the same with both backends.
+    max_size : int, optional
+        with the ffmpeg backend, downscale the frames so that their
+        longest side is at most `max_size`, by default None. The frames,
+        and so the coordinates of the skeletons found in them, are at
+        the downscaled size.
+    decode_threads : int, optional
+        with the ffmpeg backend, number of decoding threads, by default
+        0 which lets ffmpeg choose.
+    fps_timeout : float, optional
+        when the frame rate is estimated, maximum time in seconds from
+        the first frame to estimate it, by default 5. It is estimated on
+        `FPS_ESTIMATION_FRAMES` frames, or on the frames read before the
+        timeout for slow captures.
     """
     def __init__(self,
                  filename: Union[Path, str, int],
@@ -55,22 +127,97 @@ class VideoCapture:
                  capture_fps: float = None,
                  drop_warning_enable: bool = True,
                  tqdm_progressbar: tqdm.tqdm = None,
+                 drop_policy: Literal["oldest", "latest", "cadence"] = "oldest",
+                 drop_every: int = 2,
+                 seek_stride: int = SEEK_MIN_STRIDE,
+                 frame_slots: int = None,
+                 shared_memory: bool = False,
+                 backend: Literal["opencv", "ffmpeg"] = "opencv",
+                 max_size: int = None,
+                 decode_threads: int = 0,
+                 fps_timeout: float = 5.,
                  ) -> None:
+        # the arguments are checked before the capture is opened, so
+        # that nothing is left to release when they are invalid
+        if backend == "ffmpeg":
+            if isinstance(filename, int):
+                raise ValueError("the ffmpeg backend cannot open capturing devices, use the opencv backend")
+        elif backend == "opencv":
+            if max_size is not None:
+                raise ValueError("`max_size` requires the ffmpeg backend")
+        else:
+            raise ValueError(f"unknown backend {backend}, expected 'opencv' or 'ffmpeg'")
+        if drop_policy not in ("oldest", "latest", "cadence"):
+            raise ValueError(f"unknown drop policy {drop_policy}, expected 'oldest', 'latest' or 'cadence'")
+        if drop_every < 2:
+            raise ValueError(f"`drop_every` must be at least 2, got {drop_every}")
+        if frame_slots is not None:
+            if not use_threading:
+                raise ValueError("`frame_slots` requires `use_threading`, pass the `image` to decode "
+                                 "into to `read` instead")
+            if frame_slots < buffer_size + 2:
+                raise ValueError(f"{frame_slots} frame slots cannot hold the {buffer_size} buffered frames, "
+                                 "the frame being decoded and a borrowed frame")
+        elif shared_memory:
+            raise ValueError("`shared_memory` requires `frame_slots`")
+
         _filename = filename
         if isinstance(filename, Path):
             _filename = str(filename)
-        self._cap = cv2.VideoCapture(_filename)
+
+        if backend == "ffmpeg":
+            self._cap = FFmpegReader(_filename, max_size=max_size, threads=decode_threads)
+        else:
+            self._cap = cv2.VideoCapture(_filename)
+        self.backend = backend
         self.cap_name = filename
         self.mode = self.get_cap_mode(filename)
 
         self.frame_count = 0
         self._capture_fps = self.get_capture_fps(capture_fps)
-        self.stride = self.get_stride(target_fps, stride)
-        self._out_fps = self._capture_fps / self.stride
+        self._fps_estimator: FpsEstimator = None
+        # the frame rate the stride is computed from, once it is known
+        self._target_fps = target_fps if stride is None else None
+        if self._capture_fps is None:
+            # estimated from the timestamps of the first frames, without
+            # delaying them
+            self._fps_estimator = FpsEstimator(timeout=fps_timeout)
+        if self._capture_fps is None and stride is None:
+            self.stride = 1
+        else:
+            try:
+                self.stride = self.get_stride(target_fps, stride)
+            except ValueError:
+                self._cap.release()
+                raise
+        # the frame rate is estimated on consecutive frames
+        self._seek = (self.mode == "video" and seek_stride is not None and self.stride >= seek_stride
+                      and self._cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0 and self._fps_estimator is None)
+        # the ffmpeg backend only decodes the subsampled frames
+        self._decoder_subsampling = backend == "ffmpeg" and self._fps_estimator is None
+        if backend == "ffmpeg":
+            self._cap.start(self.stride if self._decoder_subsampling else 1)
+
+        self.drop_policy = drop_policy
+        self.drop_every = drop_every
+        self.drop_warning_enable = drop_warning_enable
+        self._drop_warned = False
+
+        # time.time() at which the last frame read was captured
+        self.last_capture_time: float = None
+        self.metrics = CaptureMetrics(buffer_size)
 
         self.use_threading = use_threading
+        self.frame_ring: FrameRing = None
+        if frame_slots is not None:
+            shape = (int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+            if 0 in shape:
+                self._cap.release()
+                raise ValueError(f"the frame size of {filename} is unknown, the frames cannot be preallocated")
+            self.frame_ring = FrameRing(frame_slots, shape, shared=shared_memory)
+
         if use_threading:
-            self._imgs_queue = Queue(maxlen=buffer_size)
+            self._imgs_queue = FrameBuffer(maxlen=buffer_size)
             self._stop_event = threading.Event()
             self._thread = threading.Thread(target=self._thread_read)
             self._thread.start()
@@ -80,7 +227,11 @@ class VideoCapture:
             self.tqdm = tqdm_progressbar
             self.tqdm.total = int(int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT) + 1) / self.stride)
 
-        self.drop_warning_enable = drop_warning_enable
+    @property
+    def capture_fps(self) -> float:
+        """the frame rate of the input capture, None while it is being
+        estimated."""
+        return self._capture_fps
 
     @property
     def current_frame_index(self) -> int:
@@ -90,8 +241,8 @@ class VideoCapture:
 
     def get_capture_fps(self, value: Union[None, float]) -> float:
         """
-        return the input capture frame rate, either from its property
-        or via an estimation, or the user input if provided.
+        return the input capture frame rate, from its property or the
+        user input if provided.
 
         Parameters
         ----------
@@ -101,37 +252,41 @@ class VideoCapture:
         Returns
         -------
         float
-            the capture frame rate.
+            the capture frame rate, or None if the capture does not
+            provide it.
         """
-        if value is None:
-            # cv2.CAP_PROP_FPS returns 0 if the property doesn't exist
-            capture_fps = self._cap.get(cv2.CAP_PROP_FPS)
-            if capture_fps == 0:
-                capture_fps = self.estimate_capture_fps()
-        else:
-            capture_fps = value
+        if value is not None:
+            return value
+
+        # cv2.CAP_PROP_FPS returns 0 if the property doesn't exist
+        capture_fps = self._cap.get(cv2.CAP_PROP_FPS)
+        if capture_fps == 0:
+            return None
 
         return capture_fps
 
-    def estimate_capture_fps(self, evaluation_period: int = 5):
-        """evaluate the frame rate over a period of 5 seconds"""
-        frame_count = 0
-        while self.isOpened():
+    def estimate_capture_fps(self, evaluation_period: float = 5) -> float:
+        """
+        evaluate the frame rate by reading frames for at most
+        `evaluation_period` seconds. The frames read are not delivered:
+        when the capture does not provide its frame rate, it is already
+        estimated from the first frames delivered.
+        """
+        estimator = FpsEstimator(timeout=evaluation_period)
+        deadline = monotonic() + evaluation_period
+        capture_fps = None
+        while capture_fps is None and self.isOpened() and monotonic() < deadline:
             ret, _ = self._cap.read()
             if ret is True:
-                if frame_count == 0:
-                    start = time()
+                capture_fps = estimator.add(self._cap.get(cv2.CAP_PROP_POS_MSEC))
 
-                frame_count += 1
-
-                if time() - start > evaluation_period:
-                    break
-
-        if frame_count == 0:
+        if capture_fps is None:
+            capture_fps = estimator.estimate()
+        if capture_fps is None:
             raise FileNotFoundError("Could not estimate the input capture fps. You can specify "
                                     "the input frame rate using the `capture_fps` argument")
 
-        return round(frame_count / (time() - start), 2)
+        return capture_fps
 
     def get_stride(self, target_fps, stride):
         """compute the stride of the reading process"""
@@ -143,6 +298,9 @@ class VideoCapture:
             return 1
 
         if target_fps is not None:
+            if self._capture_fps is None:
+                raise ValueError("the capture does not provide its frame rate yet, specify `capture_fps` "
+                                 "to use `target_fps`")
             stride = round(self._capture_fps / target_fps)
 
             if stride == 0:
@@ -178,91 +336,469 @@ class VideoCapture:
 
     def release(self):
         """Closes video file or capturing device."""
+        if self.use_threading:
+            self._stop_event.set()
+            # wakes up the reading thread if it waits for space
+            self._imgs_queue.close()
+            if self.frame_ring is not None:
+                self.frame_ring.close()
+            if self._thread is not threading.current_thread():
+                self._thread.join()
+                if self.frame_ring is not None:
+                    self.frame_ring.unlink()
         self._cap.release()
         if self.tqdm is not None:
             self.tqdm.close()
-        if self.use_threading:
-            self._stop_event.set()
-            self._thread.join()
 
-    def read(self) -> Tuple[bool, np.ndarray]:
+    def read(self, timeout: float = None, image: np.ndarray = None) -> Tuple[int, np.ndarray]:
         """
         Grabs, decodes and returns the next subsampled video frame.
-        If there is no image in the queue, wait for one to arrive.
-        """
-        if self.mode == "stream" and self.use_threading:
-            while self._imgs_queue.is_empty():
-                if self._stop_event.is_set():
-                    return None
+        If there is no image in the buffer, wait for one to arrive.
 
-                continue
+        Parameters
+        ----------
+        timeout : float, optional
+            with threading, maximum time to wait for a frame in seconds,
+            by default None which waits until a frame arrives or the
+            capture ends.
+        image : np.ndarray, optional
+            array to return the frame in, by default None which returns
+            a new array, or a borrowed frame of the `frame_ring`.
+            Without threading, the frame is decoded directly into it if
+            it has the size of the frame.
 
+        Returns
+        -------
+        Tuple[int, np.ndarray]
+            the index of the frame and the frame, or None if the capture
+            ended, was released or no frame arrived before `timeout`.
+        """
+        if self.use_threading:
+            item = self._imgs_queue.get(timeout)
+            if item is None:
+                return None
+
+            frame_count, frame = self._deliver(item)
+            if image is not None:
+                np.copyto(image, frame)
+                self.release_frame(frame)
+                frame = image
+            return frame_count, frame
+
+        item = self._read_next(image)
+        if item is None:
+            return None
+
+        self.last_capture_time = time()
+        self.metrics.captured += 1
+        self.metrics.delivered += 1
+        if self.tqdm is not None:
             self.tqdm.update()
-            return self._imgs_queue.popleft()
-        else:
-            _, frame = self._cap.read()
+        return item
+
+    def _deliver(self, item: Tuple[int, np.ndarray, float]) -> Tuple[int, np.ndarray]:
+        """record the delivery of a buffered (frame index, frame, capture
+        time), and return the frame index and frame."""
+        frame_count, frame, capture_time = item
+        self.last_capture_time = capture_time
+        self.metrics.delivered += 1
+        self.metrics.latency.add(time() - capture_time)
+        if self.tqdm is not None:
+            self.tqdm.update()
+        return frame_count, frame
+
+    def release_frame(self, frame: np.ndarray):
+        """give back a frame borrowed from the `frame_ring`, so that its
+        slot is reused for a next frame. Does nothing for the other
+        frames."""
+        if self.frame_ring is None:
+            return
+
+        slot = self.frame_ring.slot_of(frame)
+        if slot is not None:
+            self.frame_ring.release(slot)
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """iterate over the (frame index, frame) of the subsampled
+        frames until the capture ends or is released. A borrowed frame
+        is released when the next one is requested."""
+        while (item := self.read()) is not None:
+            try:
+                yield item
+            finally:
+                self.release_frame(item[1])
+
+    async def __aiter__(self) -> AsyncIterator[Tuple[int, np.ndarray]]:
+        """
+        iterate over the (frame index, frame) of the subsampled frames
+        from a coroutine, until the capture ends or is released.
+
+        With threading, the coroutine sleeps on the buffer until the
+        reading thread puts a frame in it: many captures can be consumed
+        by one event loop without a thread per consumer. Without
+        threading, each frame is read in the default executor of the
+        event loop. A borrowed frame is released when the next one is
+        requested.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.use_threading:
+                item = await self._imgs_queue.get_async()
+                if item is not None:
+                    item = self._deliver(item)
+            else:
+                item = await loop.run_in_executor(None, self.read)
+
+            if item is None:
+                return
+            try:
+                yield item
+            finally:
+                self.release_frame(item[1])
+
+    def _read_next(self, image: np.ndarray = None) -> Tuple[int, np.ndarray]:
+        """
+        skip the frames before the next subsampled frame, then read and
+        decode it. Return None if a frame could not be read, the frames
+        already skipped staying skipped.
+        """
+        if self._decoder_subsampling:
+            ret, frame = self._cap.read(image)
+            if ret is False:
+                return None
 
+            self.frame_count += self.stride
+            return self.frame_count, frame
+
+        nbr_skipped = self.stride - 1 - self.frame_count % self.stride
+        if self._seek and nbr_skipped > 0:
+            target = self.frame_count + nbr_skipped
+            if (self._cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                    and self._cap.get(cv2.CAP_PROP_POS_FRAMES) == target):
+                self.frame_count = target
+                nbr_skipped = 0
+            else:
+                # the position is unknown, grab from now on
+                self._seek = False
+
+        for _ in range(nbr_skipped):
+            if not self._cap.grab():
+                return None
             self.frame_count += 1
-            if self.frame_count % self.stride != 0:
-                return self.read()
+            if self._fps_estimator is not None:
+                self._add_fps_sample()
 
-            self.tqdm.update()
-            return self.frame_count, frame
+        if image is None:
+            ret, frame = self._cap.read()
+        else:
+            ret, frame = self._cap.read(image)
+        if ret is False:
+            return None
+
+        self.frame_count += 1
+        if self._fps_estimator is not None:
+            self._add_fps_sample()
+        return self.frame_count, frame
+
+    def _add_fps_sample(self):
+        """record the timestamp of the frame just read and, once the
+        frame rate is estimated, subsample the next frames."""
+        capture_fps = self._fps_estimator.add(self._cap.get(cv2.CAP_PROP_POS_MSEC))
+        if capture_fps is None:
+            return
+
+        self._fps_estimator = None
+        self._capture_fps = capture_fps
+        if self._target_fps is not None:
+            stride = round(capture_fps / self._target_fps)
+            if stride == 0:
+                warnings.warn(f"{self.cap_name}: the target fps {self._target_fps} is higher than the "
+                              f"estimated capture fps {capture_fps}, every frame is read")
+            self.stride = max(1, stride)
 
     def _thread_read(self):
         """
         read frame from a input capture and put them in a buffer.
         """
         self.frame_count = 0
-        while not self._stop_event.is_set():
-            ret, frame = self._cap.read()
+        try:
+            while not self._stop_event.is_set():
+                slot = None
+                if self.frame_ring is not None:
+                    slot = self.frame_ring.acquire()
+                    if slot is None:
+                        return
+
+                item = self._read_next(None if slot is None else self.frame_ring.frames[slot])
+                if slot is not None and (item is None or self.frame_ring.slot_of(item[1]) != slot):
+                    # nothing read, or the frame size changed and the
+                    # frame was decoded into a new array
+                    self.frame_ring.release(slot)
+
+                if item is None:
+                    if self.mode == "video" or not self._cap.isOpened():
+                        return
+                    # a stream can miss a frame, wait a bit before trying
+                    # again instead of spinning on a broken stream
+                    self._stop_event.wait(STREAM_RETRY_DELAY)
+                    continue
 
-            if ret is False:
-                continue
+                item = (*item, time())
+                self.metrics.captured += 1
+                if self.mode == "stream":
+                    self._put_stream_frame(item)
+                    continue
 
-            self.frame_count += 1
-            if self.frame_count % self.stride != 0:
-                continue
-
-            if self.mode == "stream":
-                # this avoid the queue shrinking before the result of
-                # full() can be used.
-                with self._imgs_queue.lock:
-                    if self._imgs_queue.maxlen <= len(self._imgs_queue):
-                        self._imgs_queue.popleft()
-
-                        if self.drop_warning_enable:
-                            warnings.warn("frame dropped")
-            if self.mode == "video":
-                # when dealing with a video, we can wait for the queue
+                # when dealing with a video, we can wait for the buffer
                 # being not full
-                while self._imgs_queue.is_full():
-                    if self._stop_event.is_set():
-                        return None
-                    continue
+                if not self._imgs_queue.put(item):
+                    self.release_frame(item[1])
+                    return
+                self.metrics.queue_depth.add(len(self._imgs_queue))
+        finally:
+            # the frames left in the buffer can still be read
+            self._imgs_queue.close()
+
+    def _put_stream_frame(self, item: Tuple[int, np.ndarray, float]):
+        """put a frame of a stream in the buffer, dropping frames
+        according to the drop policy."""
+        buffer = self._imgs_queue
+        if (self.drop_policy == "cadence" and len(buffer) >= (buffer.maxlen + 1) // 2
+                and (item[0] // self.stride) % self.drop_every == 0):
+            dropped = [item]
+        else:
+            dropped = buffer.put_drop_oldest(item, 1 if self.drop_policy == "latest" else None)
+        self.metrics.queue_depth.add(len(buffer))
 
-            # we don't need the lock as this is the only thread that
-            # can put things in the queue
-            self._imgs_queue.append((self.frame_count, frame))
+        if dropped:
+            self.metrics.dropped += len(dropped)
+            for dropped_item in dropped:
+                self.release_frame(dropped_item[1])
+
+            if self.drop_warning_enable and not self._drop_warned:
+                self._drop_warned = True
+                warnings.warn(f"{self.cap_name}: the consumer is slower than the stream, frames are dropped. "
+                              "See `metrics` for the number of dropped frames.")
 
     def __del__(self):
-        if self.isOpened():
+        # the capture is not opened when the arguments are invalid
+        if hasattr(self, "_cap") and self.isOpened():
             self.release()
 
 
-class Queue(deque):
-    """the queue.Queue often used for threading was too high level
-    and did not allow enough control over the lock. as a result,
-    "private" methods were too often used so this class is a lighter
-    queue.Queue implementation better suited for our use case."""
-    def __init__(self, maxlen: int):
-        self.lock = threading.Lock()
-        super().__init__(maxlen=maxlen)
+class FpsEstimator:
+    """
+    estimate the frame rate of a capture from the timestamps of its
+    frames given by the capture, or their arrival times when the capture
+    does not give valid timestamps.
+
+    Parameters
+    ----------
+    nbr_frames : int, optional
+        number of frames the frame rate is estimated on, by default
+        `FPS_ESTIMATION_FRAMES`.
+    timeout : float, optional
+        time in seconds from the first frame after which the frame rate
+        is estimated on the frames recorded so far, by default 5.
+    """
+    def __init__(self, nbr_frames: int = FPS_ESTIMATION_FRAMES, timeout: float = 5.) -> None:
+        self.nbr_frames = nbr_frames
+        self.timeout = timeout
+        self._capture_times: List[float] = []
+        self._arrival_times: List[float] = []
+
+    def add(self, capture_time_ms: float) -> float:
+        """
+        record a frame.
+
+        Parameters
+        ----------
+        capture_time_ms : float
+            the timestamp of the frame given by the capture
+            (`CAP_PROP_POS_MSEC`) in milliseconds, 0 if unknown.
+
+        Returns
+        -------
+        float
+            the estimated frame rate once `nbr_frames` frames were
+            recorded or the timeout reached, None before.
+        """
+        self._capture_times.append(capture_time_ms / 1000)
+        self._arrival_times.append(monotonic())
+
+        nbr_frames = len(self._arrival_times)
+        if nbr_frames < self.nbr_frames and self._arrival_times[-1] - self._arrival_times[0] < self.timeout:
+            return None
+
+        return self.estimate()
+
+    def estimate(self) -> float:
+        """the frame rate of the frames recorded, None with less than
+        two frames."""
+        times = self._capture_times
+        if any(next_time <= time for time, next_time in zip(times, times[1:])):
+            # missing or non monotonic timestamps
+            times = self._arrival_times
+
+        if len(times) < 2 or times[-1] <= times[0]:
+            return None
+
+        return round((len(times) - 1) / (times[-1] - times[0]), 2)
+
+
+class FrameBuffer:
+    """
+    bounded FIFO buffer between the reading thread of a capture and its
+    consumer. Both sides sleep on a condition variable instead of polling
+    the buffer, and are woken up when the buffer is closed.
+
+    Parameters
+    ----------
+    maxlen : int
+        maximum number of items in the buffer.
+    """
+    def __init__(self, maxlen: int) -> None:
+        if maxlen < 1:
+            raise ValueError(f"the buffer size must be at least 1, got {maxlen}")
+
+        self.maxlen = maxlen
+        self._items = deque()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        # futures of the coroutines waiting in `get_async`, with their
+        # event loop
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def put(self, item: Any, timeout: float = None) -> bool:
+        """
+        append an item, waiting for space in the buffer if it is full.
+
+        Parameters
+        ----------
+        item : Any
+            the item.
+        timeout : float, optional
+            maximum time to wait for space in seconds, by default None
+            which waits until there is space or the buffer is closed.
+
+        Returns
+        -------
+        bool
+            whether the item was appended. It is not when the buffer is
+            closed or still full after `timeout`.
+        """
+        with self._not_full:
+            if not self._not_full.wait_for(lambda: self._closed or len(self._items) < self.maxlen, timeout):
+                return False
+            if self._closed:
+                return False
+
+            self._items.append(item)
+            self._not_empty.notify()
+            self._wake_async_waiters()
+            return True
+
+    def put_drop_oldest(self, item: Any, maxlen: int = None) -> List[Any]:
+        """append an item without waiting, dropping the oldest items so
+        that at most `maxlen` items, by default the size of the buffer,
+        are left. Return the dropped items."""
+        if maxlen is None:
+            maxlen = self.maxlen
+        with self._lock:
+            if self._closed:
+                return []
+
+            dropped = []
+            while self._items and len(self._items) >= maxlen:
+                dropped.append(self._items.popleft())
+            self._items.append(item)
+            self._not_empty.notify()
+            self._wake_async_waiters()
+            return dropped
+
+    def get(self, timeout: float = None) -> Any:
+        """
+        pop the oldest item, waiting for one if the buffer is empty.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum time to wait for an item in seconds, by default None
+            which waits until an item arrives or the buffer is closed.
+
+        Returns
+        -------
+        Any
+            the oldest item, or None if the buffer is empty and closed or
+            no item arrived before `timeout`.
+        """
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: self._closed or self._items, timeout):
+                return None
+            if not self._items:
+                return None
+
+            item = self._items.popleft()
+            self._not_full.notify()
+            return item
+
+    async def get_async(self) -> Any:
+        """
+        pop the oldest item, waiting for one without blocking the event
+        loop if the buffer is empty.
+
+        Returns
+        -------
+        Any
+            the oldest item, or None if the buffer is empty and closed.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._items:
+                    item = self._items.popleft()
+                    self._not_full.notify()
+                    return item
+                if self._closed:
+                    return None
+
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+
+            await future
+
+    def _wake_async_waiters(self):
+        """wake up the coroutines waiting in `get_async`, the lock being
+        held."""
+        for loop, future in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_set_future_result, future)
+            except RuntimeError:
+                # the event loop was closed, nothing waits anymore
+                pass
+        self._async_waiters.clear()
+
+    def close(self):
+        """stop accepting items and wake up every waiting thread. The
+        items left can still be popped."""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+            self._wake_async_waiters()
+
+    @property
+    def closed(self) -> bool:
+        """whether the buffer was closed."""
+        return self._closed
+
+    def __len__(self) -> int:
+        return len(self._items)
 
-    def is_empty(self):
-        """check if the queue is empty"""
-        return len(self) == 0
 
-    def is_full(self):
-        """check if the queue is full"""
-        return len(self) == self.maxlen
+def _set_future_result(future: asyncio.Future):
+    # the waiting coroutine may have been cancelled meanwhile
+    if not future.done():
+        future.set_result(None)
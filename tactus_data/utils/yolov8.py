@@ -1,5 +1,8 @@
-from typing import Union, Tuple, List
+from typing import Union, Tuple, List, Sequence
+from collections import OrderedDict
 from pathlib import Path
+import threading
+import weakref
 
 import numpy as np
 import torch
@@ -14,11 +17,31 @@ from ultralytics.yolo.utils.ops import non_max_suppression, scale_boxes, scale_c
 from ultralytics.yolo.data.augment import LetterBox
 
 from tactus_data.utils.skeleton import Skeleton
+from tactus_data.utils.pose_results import PoseResults
+from tactus_data.utils.model_registry import MODEL_REGISTRY
+from tactus_data.utils.profiling import Profile, measure
+
+
+# inference backends: the pytorch weights, their ONNX export and its
+# dynamic int8 quantization. The ONNX backends need the `onnx` extra.
+BACKENDS = ("pt", "onnx", "onnx-int8")
+
+# size of the longest side of the model input
+DEFAULT_IMGSIZE = 640
 
 
 class Yolov8:
     """custom interface to the yolov8 models"""
-    def __init__(self, model_dir: Path, model_name: str, device: str, half: bool = False) -> None:
+    def __init__(
+        self,
+        model_dir: Path,
+        model_name: str,
+        device: str,
+        half: bool = False,
+        backend: str = "pt",
+        shared: bool = True,
+        imgsize: int = DEFAULT_IMGSIZE,
+    ) -> None:
         """
         instanciate the model.
 
@@ -35,12 +58,78 @@ class Yolov8:
             the device name to run the model on.
         half : bool, optional
             use half precision (float16) forthe model, by default False
+        backend : str, optional
+            one of "pt", "onnx" or "onnx-int8", by default "pt". The
+            ONNX weights must first be exported with `export_onnx`.
+        shared : bool, optional
+            share the loaded and warmed up backend with the other
+            models of the process with the same weights, device and
+            precision through `MODEL_REGISTRY`, by default True. The
+            backend is released by `close` or when the model is garbage
+            collected.
+        imgsize : int, optional
+            size of the longest side of the model input, by default
+            640. It must be a multiple of the model stride. The p6
+            models were trained on 1280 images, see `native_imgsize`.
         """
+        if backend not in BACKENDS:
+            raise ValueError("invalid backend. Must be in ", ", ".join(BACKENDS))
+        if half and backend != "pt":
+            raise ValueError("half precision is only available with the pt backend.")
+
+        weights_path = model_dir / backend_weights_name(model_name, backend)
+        if not weights_path.is_file() and backend != "pt":
+            raise FileNotFoundError(f"{weights_path} does not exist. Export it with "
+                                    f"Yolov8.export_onnx(model_dir, {model_name!r}, "
+                                    f"quantize={backend == 'onnx-int8'}).")
+
         self.device = select_device(device)
         self.half = half
         self.model_name = model_name
-        self.model = AutoBackend(model_dir / model_name, device=self.device, fp16=half)
-        self.model.eval()
+        self.backend = backend
+        if shared:
+            self.model = MODEL_REGISTRY.acquire(weights_path, self.device, half)
+            self._finalizer = weakref.finalize(self, MODEL_REGISTRY.release, weights_path, self.device, half)
+        else:
+            self.model = AutoBackend(weights_path, device=self.device, fp16=half)
+            self.model.eval()
+            self._finalizer = None
+
+        self.imgsize = imgsize
+        # preprocessing buffers, per thread as the batch tensor is
+        # reused by the next call
+        self._buffers = threading.local()
+        # if set, the time spent in the preprocessing, the forward
+        # pass, the non maximum suppression and the postprocessing is
+        # added to it. On a gpu, the forward pass is asynchronous and
+        # part of its time shows in the non maximum suppression.
+        self.profile: Profile = None
+
+    @property
+    def imgsize(self) -> int:
+        """size of the longest side of the model input used by default
+        by the predictions."""
+        return self._imgsize
+
+    @imgsize.setter
+    def imgsize(self, imgsize: int):
+        stride = int(self.model.stride)
+        if imgsize <= 0 or imgsize % stride != 0:
+            raise ValueError(f"invalid imgsize {imgsize}. Must be a positive multiple of the model stride {stride}.")
+        self._imgsize = imgsize
+
+    def close(self):
+        """release the shared backend of the model. The model can not
+        be used anymore."""
+        if self._finalizer is not None:
+            self._finalizer()
+        self.model = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     @classmethod
     def download_weights(cls, model_dir: Path, model_name: str):
@@ -60,6 +149,50 @@ class Yolov8:
         url = model_name_to_url[model_name]
         downloads.safe_download(url, dir=model_dir)
 
+    @classmethod
+    def export_onnx(cls, model_dir: Path, model_name: str, quantize: bool = False, imgsize: int = 640) -> Path:
+        """
+        export the weights of a model to ONNX, next to the pytorch
+        weights, with dynamic batch and image sizes. It requires the
+        `onnx` extra dependencies.
+
+        Parameters
+        ----------
+        model_dir : Path
+            directory of the model weights.
+        model_name : str
+            name of the pytorch model weights, e.g. "yolov8n-pose.pt".
+        quantize : bool, optional
+            also quantize the weights of the ONNX model to int8, for
+            the "onnx-int8" backend, by default False.
+        imgsize : int, optional
+            size of the longest side of the sample input used for the
+            export, by default 640.
+
+        Returns
+        -------
+        Path
+            path to the exported weights, of the "onnx-int8" backend if
+            `quantize` is True, of the "onnx" backend otherwise.
+        """
+        onnx_path = model_dir / backend_weights_name(model_name, "onnx")
+        if not onnx_path.is_file():
+            exported = YOLO(model_dir / model_name).export(format="onnx", imgsz=imgsize, dynamic=True)
+            if not exported:
+                raise RuntimeError(f"the ONNX export of {model_name} failed.")
+
+        if not quantize:
+            return onnx_path
+
+        # the ONNX models are float32 only, a dynamic quantization does
+        # not need any calibration data
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = model_dir / backend_weights_name(model_name, "onnx-int8")
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+
+        return int8_path
+
     def _preprocess_img(self, img: Union[Path, np.ndarray]) -> Tuple[torch.Tensor, Tuple, Tuple]:
         """
         pad and transform an image to a tensor. Also compute the origin
@@ -79,13 +212,106 @@ class Yolov8:
                 (new image height, new image width),
             )
         """
-        img = load_image(img)
-        img0_size = img.shape[:2]
-        img = correct_img_size(img, self.model.stride)
-        img_size = img.shape[1:]
-        imgs = img_to_tensor(img, self.device, self.half)
+        imgs, img0_sizes, img_size = self._preprocess_imgs([img])
+
+        return imgs, img0_sizes[0], img_size
+
+    def preprocess(self, img: Union[Path, np.ndarray]) -> Tuple[torch.Tensor, Tuple, Tuple]:
+        """
+        pad and transform an image to the tensor expected by the model.
+        It does not use the model, so it can run in other threads while
+        the model is busy, and the returned tensor is not reused by the
+        next calls.
+
+        Parameters
+        ----------
+        img : Union[Path, np.ndarray]
+            image Path or numpy array reprenting the image.
+
+        Returns
+        -------
+        Tuple[torch.Tensor, Tuple, Tuple]
+            (
+                tensor of shape [1, 3, img_height, img_width],
+                (original image height, original image width),
+                (new image height, new image width),
+            )
+        """
+        imgs, img0_size, img_size = self._preprocess_img(img)
 
-        return imgs, img0_size, img_size
+        return imgs.clone(), img0_size, img_size
+
+    def _preprocess_imgs(
+        self,
+        imgs: Sequence[Union[Path, np.ndarray]],
+        imgsize: int = None,
+    ) -> Tuple[torch.Tensor, List[Tuple], Tuple]:
+        """
+        pad and transform several images to a single batch tensor. Also
+        compute the origin size of each image and the new common size.
+
+        Parameters
+        ----------
+        imgs : Sequence[Union[Path, np.ndarray]]
+            image Paths or numpy arrays reprenting the images.
+        imgsize : int, optional
+            size of the longest side of the model input, by default
+            the `imgsize` of the model.
+
+        Returns
+        -------
+        Tuple[torch.Tensor, List[Tuple], Tuple]
+            (
+                tensor of shape [n_samples, 3, img_height, img_width],
+                [(original image height, original image width), ...],
+                (new image height, new image width),
+            )
+            The tensor is reused by the next call from the same thread.
+        """
+        imgsize = imgsize or self.imgsize
+        with measure(self.profile, "preprocess", len(imgs)):
+            imgs = [load_image(img) for img in imgs]
+            img0_sizes = [img.shape[:2] for img in imgs]
+
+            # padding to the minimum rectangle only gives a common
+            # shape when all the images have the same size
+            auto = len(set(img0_sizes)) == 1
+            preprocessors = [self._get_preprocessor(img.shape, imgsize, auto) for img in imgs]
+            img_size = preprocessors[0].img_size
+
+            batch = self._get_batch_buffer(len(imgs), img_size)
+            for img, preprocessor, out in zip(imgs, preprocessors, batch):
+                preprocessor(img, out)
+            batch.div_(255.0)  # 0 - 255 to 0.0 - 1.0
+
+        return batch, img0_sizes, img_size
+
+    def _get_preprocessor(self, img0_shape: Tuple, imgsize: int, auto: bool) -> "LetterBoxPreprocessor":
+        """return the cached preprocessor of an image shape, creating it
+        if needed."""
+        preprocessors = _thread_cache(self._buffers, "preprocessors")
+        key = (img0_shape, imgsize, auto)
+        if key not in preprocessors:
+            preprocessors[key] = LetterBoxPreprocessor(img0_shape, self.model.stride, imgsize, auto, self.device)
+            if len(preprocessors) > PREPROCESSING_CACHE_SIZE:
+                preprocessors.popitem(last=False)
+        preprocessors.move_to_end(key)
+
+        return preprocessors[key]
+
+    def _get_batch_buffer(self, batch_size: int, img_size: Tuple) -> torch.Tensor:
+        """return the cached batch tensor of a batch shape, creating it
+        if needed."""
+        batches = _thread_cache(self._buffers, "batches")
+        key = (batch_size, *img_size)
+        if key not in batches:
+            dtype = torch.half if self.half else torch.float
+            batches[key] = torch.empty((batch_size, 3, *img_size), dtype=dtype, device=self.device)
+            if len(batches) > PREPROCESSING_CACHE_SIZE:
+                batches.popitem(last=False)
+        batches.move_to_end(key)
+
+        return batches[key]
 
     def predict(self, images: torch.Tensor) -> List[torch.Tensor]:
         """
@@ -107,6 +333,9 @@ class Yolov8:
 
 class BboxPredictionYolov8(Yolov8):
     """yolov8 interface to extract human bboxes from an image"""
+    conf_thres = 0.25
+    iou_thres = 0.45
+
     def __call__(self, img: Union[Path, np.ndarray]) -> List[Skeleton]:
         return self.predict(img)
 
@@ -132,7 +361,7 @@ class BboxPredictionYolov8(Yolov8):
 
         _img, img0_size, img_size = self._preprocess_img(img)
         preds = super().predict(_img)
-        preds = non_max_suppression(preds, conf_thres=0.25, iou_thres=0.45, classes=[0], max_det=300, max_time_img=5)
+        preds = non_max_suppression(preds, conf_thres=self.conf_thres, iou_thres=self.iou_thres, classes=[0], max_det=300, max_time_img=5)
 
         results_skeleton = []
         for pred in preds:
@@ -149,6 +378,9 @@ class BboxPredictionYolov8(Yolov8):
 
 class PosePredictionYolov8(Yolov8):
     """yolov8 interface to extract pose from an image"""
+    conf_thres = 0.25
+    iou_thres = 0.7
+
     def __call__(self, img: Union[Path, np.ndarray]) -> List[Skeleton]:
         return self.predict(img)
 
@@ -169,34 +401,264 @@ class PosePredictionYolov8(Yolov8):
             - `scores` list the score for each bounding box.
             - `keypoints` list containing (x1, y1, is_visible) coordinates.
         """
+        return self.predict_batch([img])[0]
+
+    def predict_batch(
+        self,
+        imgs: Sequence[Union[Path, np.ndarray]],
+        imgsize: int = None,
+        as_arrays: bool = False,
+    ) -> Union[List[List[Skeleton]], List[PoseResults]]:
+        """
+        extract the skeletons from several images with a single forward
+        pass and a single non maximum suppression.
+
+        Parameters
+        ----------
+        imgs : Sequence[Union[Path, np.ndarray]]
+            paths to images, or numpy arrays representing the images.
+        imgsize : int, optional
+            size of the longest side of the model input, by default
+            the `imgsize` of the model.
+        as_arrays : bool, optional
+            return a `PoseResults` per image, whose Skeleton objects are
+            only built when they are accessed, by default False.
+
+        Returns
+        -------
+        Union[List[List[Skeleton]], List[PoseResults]]
+            the list of skeletons of each image, in the input order.
+        """
+        _imgs, img0_sizes, img_size = self._preprocess_imgs(imgs, imgsize)
+
+        return self.predict_tensor(_imgs, img0_sizes, img_size, as_arrays)
+
+    def predict_tensor(
+        self,
+        imgs: torch.Tensor,
+        img0_sizes: Sequence[Tuple],
+        img_size: Tuple,
+        as_arrays: bool = False,
+    ) -> Union[List[List[Skeleton]], List[PoseResults]]:
+        """
+        extract the skeletons from a batch of images already
+        transformed by `preprocess`.
+
+        Parameters
+        ----------
+        imgs : torch.Tensor
+            tensor of shape [n_samples, 3, img_height, img_width]
+        img0_sizes : Sequence[Tuple]
+            (original image height, original image width) of each
+            image.
+        img_size : Tuple
+            (image height, image width) of the tensor.
+        as_arrays : bool, optional
+            return a `PoseResults` per image, whose Skeleton objects are
+            only built when they are accessed, by default False.
+
+        Returns
+        -------
+        Union[List[List[Skeleton]], List[PoseResults]]
+            the list of skeletons of each image, in the input order.
+        """
         if "pose" not in self.model_name:
             raise ValueError("wrong model selected. You can't predict poses"
                              "without a pose-prediction model.")
 
-        _img, img0_size, img_size = self._preprocess_img(img)
+        with measure(self.profile, "forward", len(imgs)):
+            preds = super().predict(imgs)
+        with measure(self.profile, "nms", len(imgs)):
+            preds = non_max_suppression(preds, conf_thres=self.conf_thres, iou_thres=self.iou_thres, classes=None, max_det=300, nc=1, max_time_img=5)
 
-        preds = super().predict(_img)
-        preds = non_max_suppression(preds, conf_thres=0.25, iou_thres=0.7, classes=None, max_det=300, nc=1, max_time_img=5)
+        with measure(self.profile, "postprocess", len(imgs)):
+            results = [self._pred_to_results(pred, img_size, img0_size)
+                       for pred, img0_size in zip(preds, img0_sizes)]
+        if as_arrays:
+            return results
 
-        results_skeleton = []
-        for pred in preds:
-            if pred == []:
-                continue
-            # scale the prediction back to the input image size
-            pred[:, :4] = scale_boxes(img_size, pred[:, :4], img0_size).round()
-            pred_kpts = pred[:, 6:].view(len(pred), *(17, 3))
-            pred_kpts = scale_coords(img_size, pred_kpts, img0_size).round()
+        return [pose_results.skeletons for pose_results in results]
 
-            for i, det in enumerate(pred):
-                skeleton = Skeleton(bbox_lbrt=det[:4].tolist(),
-                                    score=det[4].tolist(),
-                                    keypoints=pred_kpts[i].tolist())
-                results_skeleton.append(skeleton)
+    def _pred_to_results(self, pred: torch.Tensor, img_size: Tuple, img0_size: Tuple) -> PoseResults:
+        """
+        convert the predictions of a single image to arrays, without
+        any loop over the detections.
 
-        return results_skeleton
+        Parameters
+        ----------
+        pred : torch.Tensor
+            tensor of shape [n_detections, 6 + 17 * 3] after the non
+            maximum suppression.
+        img_size : Tuple
+            (image height, image width) of the model input.
+        img0_size : Tuple
+            (image height, image width) of the original image.
+
+        Returns
+        -------
+        PoseResults
+            the skeletons in the original image coordinates.
+        """
+        if len(pred) == 0:
+            return PoseResults.empty()
+
+        # scale the prediction back to the input image size
+        pred[:, :4] = scale_boxes(img_size, pred[:, :4], img0_size).round()
+        pred_kpts = pred[:, 6:].view(len(pred), *(17, 3))
+        pred_kpts = scale_coords(img_size, pred_kpts, img0_size).round()
+
+        # the neck replaces the head, like `king_of_france`. It is
+        # computed in double precision like the python floats of the
+        # Skeleton keypoints.
+        pred_kpts = pred_kpts.double()
+        neck = (pred_kpts[:, 3] + pred_kpts[:, 4]) / 2
+        pred_kpts = torch.cat((neck[:, None], pred_kpts[:, 5:]), dim=1).cpu().numpy()
+
+        x_left, y_top, x_right, y_bottom = pred[:, :4].cpu().numpy().T
+
+        return PoseResults(bboxes_lbrt=np.stack((x_left, y_bottom, x_right, y_top), axis=1),
+                           scores=pred[:, 4].cpu().numpy(),
+                           keypoints=pred_kpts[..., :2],
+                           keypoints_visibility=pred_kpts[..., 2])
+
+
+def native_imgsize(model_name: str) -> int:
+    """
+    the input size a model was trained on: 1280 for the p6 models, 640
+    for the others.
+
+    Parameters
+    ----------
+    model_name : str
+        name of the model weights, e.g. "yolov8x-pose-p6.pt".
+
+    Returns
+    -------
+    int
+        size of the longest side of the training images.
+    """
+    if Path(model_name).stem.endswith("-p6"):
+        return 1280
+
+    return DEFAULT_IMGSIZE
+
+
+def backend_weights_name(model_name: str, backend: str) -> str:
+    """
+    name of the weights file of a model for a given backend.
+
+    Parameters
+    ----------
+    model_name : str
+        name of the pytorch model weights, e.g. "yolov8n-pose.pt".
+    backend : str
+        one of "pt", "onnx" or "onnx-int8".
+
+    Returns
+    -------
+    str
+        e.g. "yolov8n-pose.pt", "yolov8n-pose.onnx" or
+        "yolov8n-pose-int8.onnx".
+    """
+    stem = Path(model_name).stem
+    names = {"pt": model_name, "onnx": f"{stem}.onnx", "onnx-int8": f"{stem}-int8.onnx"}
+
+    return names[backend]
+
+
+# number of image shapes whose preprocessing buffers are kept. Crops
+# all have different shapes, while a video only has one.
+PREPROCESSING_CACHE_SIZE = 16
+
+
+def _thread_cache(buffers: threading.local, name: str) -> OrderedDict:
+    if not hasattr(buffers, name):
+        setattr(buffers, name, OrderedDict())
+
+    return getattr(buffers, name)
+
+
+class LetterBoxPreprocessor:
+    """
+    letterbox the images of a given shape like `correct_img_size`, and
+    write them to a tensor like `img_to_tensor`. The letterbox geometry
+    is computed once, and the images are resized into a reused padded
+    buffer, so that no array is allocated per image.
+
+    Parameters
+    ----------
+    img0_shape : Tuple
+        shape of the original images, (height, width, 3).
+    stride : int
+        stride of the model.
+    imgsize : int, optional
+        size of the longest side of the padded image, by default 640.
+    auto : bool, optional
+        pad to the minimum rectangle that is a multiple of stride
+        instead of a square of side imgsize, by default True.
+    device : torch.device, optional
+        the device of the output tensors, by default the cpu.
+    """
+    def __init__(
+        self,
+        img0_shape: Tuple,
+        stride: int,
+        imgsize: int = 640,
+        auto: bool = True,
+        device: torch.device = torch.device("cpu"),
+    ) -> None:
+        # same geometry as ultralytics LetterBox
+        height0, width0 = img0_shape[:2]
+        ratio = min(imgsize / height0, imgsize / width0)
+        self.new_unpad = int(round(width0 * ratio)), int(round(height0 * ratio))
+        pad_width, pad_height = imgsize - self.new_unpad[0], imgsize - self.new_unpad[1]
+        if auto:
+            pad_width, pad_height = np.mod(pad_width, stride), np.mod(pad_height, stride)
+        pad_width /= 2
+        pad_height /= 2
+        top, bottom = int(round(pad_height - 0.1)), int(round(pad_height + 0.1))
+        left, right = int(round(pad_width - 0.1)), int(round(pad_width + 0.1))
+
+        self.img_size = (self.new_unpad[1] + top + bottom, self.new_unpad[0] + left + right)
+        self.needs_resize = (width0, height0) != self.new_unpad
+
+        self._padded = np.full((*self.img_size, 3), 114, dtype=np.uint8)
+        self._resized = self._padded[top:top + self.new_unpad[1], left:left + self.new_unpad[0]]
+        # shares the memory of the padded buffer
+        self._host_tensor = torch.from_numpy(self._padded)
+        self._device_tensor = None
+        if device.type != "cpu":
+            self._device_tensor = torch.empty(self._padded.shape, dtype=torch.uint8, device=device)
+
+    def __call__(self, img: np.ndarray, out: torch.Tensor):
+        """
+        letterbox an image into `out`.
+
+        Parameters
+        ----------
+        img : np.ndarray
+            BGR image of the preprocessor shape.
+        out : torch.Tensor
+            tensor of shape [3, img_height, img_width] receiving the
+            RGB image, with values between 0 and 255.
+        """
+        if self.needs_resize:
+            cv2.resize(img, self.new_unpad, dst=self._resized, interpolation=cv2.INTER_LINEAR)
+        else:
+            np.copyto(self._resized, img)
+
+        padded = self._host_tensor
+        if self._device_tensor is not None:
+            # a single uint8 transfer, converted on the device
+            padded = self._device_tensor
+            padded.copy_(self._host_tensor)
+
+        # HWC BGR to CHW RGB
+        for channel in range(3):
+            out[channel].copy_(padded[:, :, 2 - channel])
 
 
-def correct_img_size(img: np.ndarray, stride: int, imgsize: int = 640) -> np.ndarray:
+def correct_img_size(img: np.ndarray, stride: int, imgsize: int = 640, auto: bool = True) -> np.ndarray:
     """
     pad the image if it does not have the correct size.
 
@@ -206,13 +668,18 @@ def correct_img_size(img: np.ndarray, stride: int, imgsize: int = 640) -> np.nda
         numpy array representing the image.
     stride : int
         stride to apply.
+    imgsize : int, optional
+        size of the longest side of the padded image, by default 640.
+    auto : bool, optional
+        pad to the minimum rectangle that is a multiple of stride
+        instead of a square of side imgsize, by default True.
 
     Returns
     -------
     np.ndarray
         new resized image.
     """
-    img = LetterBox(imgsize, auto=True, stride=stride)(image=img)
+    img = LetterBox(imgsize, auto=auto, stride=stride)(image=img)
     img = img.transpose((2, 0, 1))[::-1]
     img = np.ascontiguousarray(img)
 
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from tactus_data.utils.adaptive_imgsize import AdaptiveImgsize
+from tactus_data.utils.pose_results import PoseResults
+
+
+def people(*heights):
+    """people of the given heights in a 480x640 frame."""
+    n = len(heights)
+    bboxes_lbrt = np.array([[0, height, 10, 0] for height in heights], dtype=np.float32).reshape(n, 4)
+    return PoseResults(bboxes_lbrt, np.ones(n), np.zeros((n, 13, 2)), np.ones((n, 13)))
+
+
+def make_controller(**kwargs):
+    model = SimpleNamespace(imgsize=640, model=SimpleNamespace(stride=32))
+    return AdaptiveImgsize(model, window=2, **kwargs)
+
+
+def test_adaptive_imgsize_people_size():
+    controller = make_controller()
+
+    # 320px high people are still 160px high at 320
+    controller.update(people(320), (480, 640), 0.1)
+    assert controller.update(people(320), (480, 640), 0.1) == 320
+
+    # 40px high people need 1024 to be 64px high
+    controller.update(people(40), (480, 640), 0.05)
+    assert controller.update(people(40, 320), (480, 640), 0.05) == 1280
+
+    # no one found, the size is kept
+    controller.update(people(), (480, 640), 0.1)
+    assert controller.update(people(), (480, 640), 0.1) == 1280
+    assert [imgsize for _, imgsize in controller.history] == [640, 320, 1280]
+
+
+def test_adaptive_imgsize_bounds():
+    # 1280 would take 0.4s, 960 0.225s
+    controller = make_controller(max_latency=0.3)
+    controller.update(people(40), (480, 640), 0.1)
+    assert controller.update(people(40), (480, 640), 0.1) == 960
+
+    controller = make_controller()
+    controller.update(people(320, 320), (480, 640), 0.1)
+    assert controller.update(people(320, 320), (480, 640), 0.1) == 320
+
+    # half of the people are lost at 320: back to 640 for good
+    controller.update(people(320), (480, 640), 0.1)
+    assert controller.update(people(320), (480, 640), 0.1) == 640
+    controller.update(people(320, 320), (480, 640), 0.1)
+    assert controller.update(people(320, 320), (480, 640), 0.1) == 640
+
+
+def test_adaptive_imgsize_latency_below_floor():
+    controller = make_controller(max_latency=0.3)
+    controller.window = 1
+
+    assert controller.update(people(320), (480, 640), 0.1) == 320
+    # everyone is lost at 320: back to 640 for good
+    assert controller.update(people(), (480, 640), 0.05) == 640
+    # 640 became too slow, the latency bound wins over the floor
+    assert controller.update(people(320), (480, 640), 2.0) == 448
+    assert controller.update(people(320), (480, 640), 0.1) == 448
+    # 768 is estimated at 0.29s from the 0.1s of 448
+    assert controller.update(people(40), (480, 640), 0.1) == 768
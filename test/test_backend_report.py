@@ -0,0 +1,26 @@
+import numpy as np
+
+from tactus_data.utils.backend_report import match_skeletons
+from tactus_data.utils.pose_results import PoseResults
+from tactus_data.utils.yolov8 import backend_weights_name
+
+
+def make_results(bboxes_ltrb):
+    bboxes_ltrb = np.array(bboxes_ltrb, dtype=np.float32)
+    bboxes_lbrt = bboxes_ltrb[:, [0, 3, 2, 1]]
+    n = len(bboxes_ltrb)
+    return PoseResults(bboxes_lbrt, np.ones(n), np.zeros((n, 13, 2)), np.ones((n, 13)))
+
+
+def test_match_skeletons():
+    reference = make_results([[0, 0, 10, 10], [20, 0, 30, 10], [50, 50, 60, 60]])
+    results = make_results([[21, 0, 31, 10], [0, 1, 10, 11], [100, 100, 110, 110]])
+
+    assert sorted(match_skeletons(results, reference)) == [(0, 1), (1, 0)]
+    assert match_skeletons(results, make_results(np.zeros((0, 4)))) == []
+
+
+def test_backend_weights_name():
+    assert backend_weights_name("yolov8n-pose.pt", "pt") == "yolov8n-pose.pt"
+    assert backend_weights_name("yolov8n-pose.pt", "onnx") == "yolov8n-pose.onnx"
+    assert backend_weights_name("yolov8n-pose.pt", "onnx-int8") == "yolov8n-pose-int8.onnx"
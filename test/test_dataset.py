@@ -0,0 +1,135 @@
+import json
+import pickle
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from tactus_data.datasets import dataset
+from tactus_data.datasets.dataset import _batched_frames, _extract_video_to_files, _FrameRouter, _VideoSkeletons
+from tactus_data.utils.pose_results import PoseResults
+from tactus_data.utils.thread_videocapture import VideoCapture
+
+
+@pytest.fixture(scope="module")
+def video_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("videos") / "video.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for i in range(24):
+        writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+class StubModel:
+    """a pose model finding one person whose box depends on the
+    brightness of the frame."""
+    conf_thres = 0.25
+    iou_thres = 0.7
+
+    def __init__(self, *args, imgsize=640, **kwargs):
+        self.imgsize = imgsize
+        self.profile = None
+
+    def predict_batch(self, imgs, imgsize=None, as_arrays=False):
+        results = []
+        for img in imgs:
+            value = float(img.mean())
+            bboxes = np.array([[value, value + 10, value + 5, value]], dtype=np.float32)
+            keypoints = np.full((1, 13, 2), value, dtype=np.float32)
+            results.append(PoseResults(bboxes, np.ones(1), keypoints, np.ones((1, 13))))
+        return results
+
+
+def test_batched_frames(video_path):
+    cap = VideoCapture(video_path, stride=3)
+    batches = list(_batched_frames(cap, 3))
+    # the last batch is partial
+    assert [frame_ids for frame_ids, _ in batches] == [[3, 6, 9], [12, 15, 18], [21, 24]]
+    assert all(len(frames) == len(frame_ids) for frame_ids, frames in batches)
+
+    # the capture ended, nothing is left to batch
+    assert list(_batched_frames(cap, 3)) == []
+    cap.release()
+
+    cap = VideoCapture(video_path, stride=3)
+    batches = list(_batched_frames(cap, 3, lambda frame_id: frame_id % 6 == 0))
+    assert [frame_ids for frame_ids, _ in batches] == [[6, 12, 18], [24]]
+    cap.release()
+
+
+@pytest.mark.parametrize("strides", [(3, 6), (4, 6)])
+def test_frame_router(strides):
+    writers = {stride: _VideoSkeletons() for stride in strides}
+    router = _FrameRouter(list(writers.items()))
+    assert router.stride == np.gcd(*strides)
+
+    for frame_id in range(router.stride, 25, router.stride):
+        if router.is_needed(frame_id):
+            router.add_frame(frame_id, [], (48, 64))
+
+    assert not router.is_needed(2) and not router.is_needed(5)
+    for stride, writer in writers.items():
+        assert [frame["frame_id"] for frame in writer.frames] == list(range(stride, 25, stride))
+
+
+def test_extract_several_fps(video_path, tmp_path):
+    # 10 and 5 fps of a 30 fps video are read with a stride of 3
+    outputs = [(fps, tmp_path / "multi" / f"{fps}.ndjson") for fps in (10, 5)]
+    _extract_video_to_files(StubModel(), video_path, outputs, {})
+
+    for fps, output_path in outputs:
+        single_path = tmp_path / "single" / f"{fps}.ndjson"
+        _extract_video_to_files(StubModel(), video_path, [(fps, single_path)], {})
+        assert output_path.read_bytes() == single_path.read_bytes()
+
+
+def test_extract_video_worker(video_path, tmp_path, monkeypatch):
+    # the task and the options of extract_skeletons, the result goes
+    # back to the parent process through a pipe
+    monkeypatch.setattr(dataset, "PosePredictionYolov8", StubModel)
+    monkeypatch.setattr(dataset, "_worker_model", None)
+    dataset._init_worker(tmp_path, "stub.pt", "cpu", torch.get_num_threads(), 1280)
+    assert dataset._worker_model.imgsize == 1280
+
+    outputs = [(10, tmp_path / "10fps" / "yolov8.json"), (5, tmp_path / "5fps" / "yolov8.ndjson")]
+    options = {"batch_size": 2, "pipelined": False, "motion_gate": {"threshold": 100.}, "roi_crops": None}
+
+    result = pickle.loads(pickle.dumps(dataset._extract_video_worker((video_path, outputs, options))))
+    result_path, result_outputs, fingerprint, stage_stats, gate_stats, profile = result
+
+    assert result_path == video_path and result_outputs == outputs
+    assert fingerprint["size"] == video_path.stat().st_size
+    assert stage_stats == {}
+    assert gate_stats.nbr_frames == 8 and gate_stats.nbr_skipped > 0
+    assert profile.counters["frames"] == 8
+    assert profile.stage("decode").items == 8
+    with profile.measure("close"):
+        pass
+
+    assert len(json.loads(outputs[0][1].read_text())["frames"]) == 8
+    assert outputs[1][1].is_file()
+
+
+def test_extract_skeletons(video_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset, "PosePredictionYolov8", StubModel)
+    monkeypatch.setattr(dataset, "RAW_DIR", tmp_path / "raw")
+    monkeypatch.setattr(dataset, "PROCESSED_DIR", tmp_path / "processed")
+    input_dir = tmp_path / "raw" / "ut_interaction"
+    input_dir.mkdir(parents=True)
+    (input_dir / "0_1_4.avi").write_bytes(video_path.read_bytes())
+
+    dataset.extract_skeletons(dataset.NAMES.ut_interaction, [10, 5], "avi", "cpu", imgsize=1280)
+    output_dir = tmp_path / "processed" / "ut_interaction"
+    output_path = output_dir / "0_1_4" / "5fps" / "yolov8.json"
+    assert len(json.loads(output_path.read_text())["frames"]) == 4
+    assert (output_dir / "0_1_4" / "10fps" / "yolov8.stats.json").is_file()
+    assert (output_dir / dataset.RUN_STATS_NAME).is_file()
+
+    # the outputs are current for the same input size only
+    mtime = output_path.stat().st_mtime_ns
+    dataset.extract_skeletons(dataset.NAMES.ut_interaction, 5, "avi", "cpu", imgsize=1280)
+    assert output_path.stat().st_mtime_ns == mtime
+    dataset.extract_skeletons(dataset.NAMES.ut_interaction, 5, "avi", "cpu")
+    assert output_path.stat().st_mtime_ns != mtime
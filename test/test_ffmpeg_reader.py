@@ -0,0 +1,60 @@
+import shutil
+
+import cv2
+import numpy as np
+import pytest
+
+from tactus_data.utils import ffmpeg_reader
+from tactus_data.utils.ffmpeg_reader import FFmpegReader, scaled_size
+from tactus_data.utils.thread_videocapture import VideoCapture
+from tactus_data.utils.yolov8 import LetterBoxPreprocessor
+
+
+@pytest.mark.parametrize("size", [(1920, 1080), (480, 640), (333, 201)])
+def test_scaled_size_letterbox(size):
+    # the downscaled frames are not resized again by the letterbox
+    width, height = scaled_size(size, 320)
+    assert not LetterBoxPreprocessor((height, width, 3), 32, 320).needs_resize
+    assert scaled_size(size) == size
+
+
+def test_ffmpeg_command(tmp_path, monkeypatch):
+    # the command is built without running ffmpeg
+    monkeypatch.setattr(ffmpeg_reader.shutil, "which", lambda name: f"/usr/bin/{name}")
+    path = tmp_path / "video.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, (128, 96))
+    writer.write(np.zeros((96, 128, 3), dtype=np.uint8))
+    writer.release()
+
+    reader = FFmpegReader(path, max_size=64, threads=2)
+    command = reader.command(stride=3)
+    assert command[0] == "/usr/bin/ffmpeg"
+    assert command[command.index("-threads") + 1] == "2"
+    assert command[command.index("-i") + 1] == str(path)
+    # the frames 3, 6, 9... counted from 1 are kept, then downscaled
+    assert command[command.index("-vf") + 1] == "select='not(mod(n+1\\,3))',scale=64:48:flags=bilinear"
+    assert command[-7:] == ["-vsync", "0", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+
+    # every frame at the source size needs no filter
+    assert "-vf" not in FFmpegReader(path).command()
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_ffmpeg_backend(tmp_path):
+    path = tmp_path / "video.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, (128, 96))
+    for i in range(20):
+        writer.write(np.full((96, 128, 3), i * 10, dtype=np.uint8))
+    writer.release()
+
+    expected = list(VideoCapture(path, stride=3))
+    items = list(VideoCapture(path, stride=3, backend="ffmpeg"))
+    assert [index for index, _ in items] == [index for index, _ in expected] == [3, 6, 9, 12, 15, 18]
+    for (_, frame), (_, expected_frame) in zip(items, expected):
+        np.testing.assert_array_equal(frame, expected_frame)
+
+    cap = VideoCapture(path, backend="ffmpeg", max_size=64, use_threading=True, frame_slots=7)
+    index, frame = cap.read()
+    assert index == 1 and frame.shape == (48, 64, 3)
+    cap.release_frame(frame)
+    cap.release()
@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+
+def test_lazy_import():
+    code = ("import sys\n"
+            "from tactus_data import Skeleton, SkeletonRollingWindow\n"
+            "heavy = ['cv2', 'torch', 'ultralytics', 'requests', 'sklearn', 'deep_sort_realtime']\n"
+            "print(','.join(module for module in heavy if module in sys.modules))\n")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert output.stdout.strip() == ""
+
+
+def test_lazy_attributes():
+    import tactus_data
+    from tactus_data.utils.yolov8 import PosePredictionYolov8
+
+    assert tactus_data.PosePredictionYolov8 is PosePredictionYolov8
+    assert "VideoCapture" in dir(tactus_data)
@@ -0,0 +1,60 @@
+import os
+import json
+
+import pytest
+
+from tactus_data.datasets.manifest import Manifest, source_fingerprint
+from tactus_data.utils.files import atomic_write
+
+PARAMS = {"model_name": "yolov8x-pose-p6.pt", "fps": 10, "conf_thres": 0.25, "iou_thres": 0.7}
+
+
+def extract(manifest, video_path, output_path, params=PARAMS):
+    fingerprint = source_fingerprint(video_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text("{}")
+    manifest.update(video_path, output_path, params, fingerprint)
+
+
+def test_manifest_skips_current_outputs(tmp_path):
+    input_dir, output_dir = tmp_path / "raw", tmp_path / "processed"
+    input_dir.mkdir()
+    video_path = input_dir / "0_1_4.avi"
+    video_path.write_bytes(b"video content")
+    output_path = output_dir / "0_1_4" / "10fps" / "yolov8.json"
+
+    manifest = Manifest(input_dir, output_dir)
+    assert not manifest.is_current(video_path, output_path, PARAMS)
+
+    extract(manifest, video_path, output_path)
+
+    # the manifest is reloaded from the disk as when resuming a run
+    manifest = Manifest(input_dir, output_dir)
+    assert manifest.is_current(video_path, output_path, PARAMS)
+    assert not manifest.is_current(video_path, output_path, {**PARAMS, "fps": 30})
+
+    # touching the file without changing its content keeps it current
+    stat = video_path.stat()
+    os.utime(video_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert manifest.is_current(video_path, output_path, PARAMS)
+
+    video_path.write_bytes(b"other content")
+    assert not manifest.is_current(video_path, output_path, PARAMS)
+
+    extract(manifest, video_path, output_path)
+    output_path.unlink()
+    assert not manifest.is_current(video_path, output_path, PARAMS)
+
+
+def test_atomic_write_keeps_previous_file_on_error(tmp_path):
+    path = tmp_path / "yolov8.json"
+    with atomic_write(path) as fp:
+        json.dump({"frames": [1, 2]}, fp)
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as fp:
+            fp.write('{"frames": [')
+            raise RuntimeError()
+
+    assert json.loads(path.read_text()) == {"frames": [1, 2]}
+    assert list(tmp_path.iterdir()) == [path]
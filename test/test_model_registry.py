@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import pytest
+import torch
+
+from tactus_data.utils.model_registry import ModelRegistry
+
+
+class CountingRegistry(ModelRegistry):
+    def __init__(self):
+        super().__init__()
+        self.nbr_loads = 0
+
+    def _load(self, weights_path, device, half):
+        self.nbr_loads += 1
+        if "missing" in str(weights_path):
+            raise FileNotFoundError(weights_path)
+        return object()
+
+
+def test_model_registry():
+    registry = CountingRegistry()
+    cpu = torch.device("cpu")
+
+    backend = registry.acquire(Path("model.pt"), cpu)
+    assert registry.acquire(Path("./model.pt"), cpu) is backend
+    assert registry.acquire(Path("model.pt"), cpu, half=True) is not backend
+    assert registry.nbr_loads == 2
+
+    registry.release(Path("model.pt"), cpu)
+    assert registry.evict() == 0
+    registry.release(Path("model.pt"), cpu)
+    assert registry.evict(Path("other.pt")) == 0
+    assert registry.evict(Path("model.pt")) == 1
+
+    assert [entry["half"] for entry in registry.stats()] == [True]
+    assert registry.acquire(Path("model.pt"), cpu) is not backend
+
+    with pytest.raises(FileNotFoundError):
+        registry.acquire(Path("missing.pt"), cpu)
+    assert registry.key(Path("missing.pt"), cpu) not in registry
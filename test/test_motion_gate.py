@@ -0,0 +1,57 @@
+import numpy as np
+
+from tactus_data import Skeleton
+from tactus_data.utils.motion_gate import MotionGate, SkeletonInterpolator
+
+
+class FramesList:
+    def __init__(self):
+        self.frames = []
+
+    def add_frame(self, frame_id, skeletons, resolution):
+        self.frames.append((frame_id, skeletons))
+
+
+def keypoints(offset):
+    return [(offset + i, offset + 2 * i) for i in range(13)]
+
+
+def test_motion_gate():
+    gate = MotionGate(threshold=2, max_skip=2)
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    moved = frame.copy()
+    moved[:, :32] = 255
+
+    assert not gate.is_static(frame)
+    assert gate.is_static(frame)
+    assert gate.is_static(frame)
+    # max_skip reached
+    assert not gate.is_static(frame)
+    assert not gate.is_static(moved)
+
+
+def test_interpolator():
+    writer = FramesList()
+    interpolator = SkeletonInterpolator(writer)
+
+    interpolator.add_frame(2, [Skeleton(keypoints=keypoints(0), tracking_id=1),
+                               Skeleton(keypoints=keypoints(50), tracking_id=2)], (48, 64))
+    interpolator.add_skipped(4, (48, 64))
+    interpolator.add_skipped(6, (48, 64))
+    assert [frame_id for frame_id, _ in writer.frames] == [2]
+
+    interpolator.add_frame(8, [Skeleton(keypoints=keypoints(30), tracking_id=1)], (48, 64))
+    interpolator.add_skipped(10, (48, 64))
+    interpolator.flush()
+
+    assert [frame_id for frame_id, _ in writer.frames] == [2, 4, 6, 8, 10]
+    _, skeletons = writer.frames[1]
+    assert all(skeleton.interpolated for skeleton in skeletons)
+    assert skeletons[0].keypoints == tuple(map(list, keypoints(10)))
+    # the skeleton missing from the next inferred frame is carried forward
+    assert skeletons[1].keypoints == tuple(map(list, keypoints(50)))
+    assert skeletons[0].to_json()["interpolated"] is True
+
+    _, skeletons = writer.frames[4]
+    assert skeletons[0].keypoints == tuple(map(list, keypoints(30)))
+    assert "interpolated" not in writer.frames[3][1][0].to_json()
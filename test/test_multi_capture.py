@@ -0,0 +1,70 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from tactus_data.utils.multi_capture import MultiStreamCapture
+from tactus_data.utils.thread_videocapture import VideoCapture
+
+
+def make_video(path, nbr_frames):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, (32, 24))
+    for _ in range(nbr_frames):
+        writer.write(np.zeros((24, 32, 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_multi_capture_videos(tmp_path):
+    sources = {"short": make_video(tmp_path / "short.avi", 5), "long": make_video(tmp_path / "long.avi", 12)}
+    indices = {"short": [], "long": []}
+    with MultiStreamCapture(sources, n_readers=1, stride=2) as streams:
+        while (frames := streams.read()) is not None:
+            for name, (index, _) in frames.items():
+                indices[name].append(index)
+        stats = {stream["name"]: stream for stream in streams.stats()}
+
+    # the frames of video files are never dropped
+    assert indices == {"short": [2, 4], "long": [2, 4, 6, 8, 10, 12]}
+    assert stats["long"]["dropped"] == 0 and stats["long"]["finished"]
+
+
+class PacedCamera:
+    """a camera emitting the frames of a video every 5ms."""
+    def __init__(self, cap):
+        self.cap = cap
+
+    def read(self):
+        time.sleep(0.005)
+        return self.cap.read()
+
+    def grab(self):
+        time.sleep(0.005)
+        return self.cap.grab()
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+
+def test_multi_capture_drops_stream_frames(tmp_path):
+    cap = VideoCapture(make_video(tmp_path / "video.avi", 300))
+    cap.mode = "stream"
+    cap._cap = PacedCamera(cap._cap)
+    with MultiStreamCapture([cap]) as streams:
+        indices = []
+        for _ in range(3):
+            # slow consumer
+            time.sleep(0.05)
+            indices.append(streams.read(timeout=1)[0][0])
+
+        assert indices == sorted(indices)
+        assert streams.stats()[0]["dropped"] > 0
+    assert streams.read() is None
+
+
+def test_multi_capture_threaded_source(tmp_path):
+    cap = VideoCapture(make_video(tmp_path / "video.avi", 2), use_threading=True)
+    with pytest.raises(ValueError):
+        MultiStreamCapture([cap])
+    cap.release()
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from tactus_data import Skeleton
+from tactus_data.utils.ndjson import NDJSONSkeletonWriter, iter_ndjson_frames, read_ndjson_metadata, load_ndjson
+
+KEYPOINTS = [(0, 1), (1, 0), (0, 0), (0, 0), (0, 0), (0, 0), (0, 0), (0, 0), (0, 0), (0, 0), (0, 0), (0, 0), (0, 0)]
+
+
+def test_ndjson_round_trip(tmp_path):
+    path = tmp_path / "yolov8.ndjson"
+    frames = [
+        (3, [Skeleton(bbox_lbrt=(0, 10, 5, 0), score=0.9, keypoints=KEYPOINTS, tracking_id=1)]),
+        (6, []),
+        (9, [Skeleton(keypoints=KEYPOINTS, tracking_id=1), Skeleton(keypoints=KEYPOINTS, tracking_id=2)]),
+    ]
+
+    with NDJSONSkeletonWriter(path) as writer:
+        for frame_id, skeletons in frames:
+            writer.add_frame(frame_id, skeletons, (240, 320))
+
+    expected_frames = json.loads(json.dumps([{"frame_id": frame_id, "skeletons": skeletons}
+                                             for frame_id, skeletons in frames]))
+    assert list(iter_ndjson_frames(path)) == expected_frames
+
+    metadata = read_ndjson_metadata(path)
+    assert metadata["resolution"] == [240, 320]
+    assert metadata["nbr_frames"] == 3
+    assert metadata["max_nbr_skeletons"] == 2
+    assert metadata["min_nbr_skeletons"] == 0
+
+    assert load_ndjson(path) == {"frames": expected_frames,
+                                 "resolution": [240, 320],
+                                 "max_nbr_skeletons": 2,
+                                 "min_nbr_skeletons": 0}
+
+
+def test_ndjson_interrupted_writing(tmp_path):
+    path = tmp_path / "yolov8.ndjson"
+
+    with pytest.raises(KeyboardInterrupt):
+        with NDJSONSkeletonWriter(path) as writer:
+            writer.add_frame(3, [], (240, 320))
+            raise KeyboardInterrupt()
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,73 @@
+import queue
+import threading
+
+import pytest
+
+from tactus_data.utils.pipeline import END_OF_STREAM, StageThread, iter_queue, put_until_stopped
+
+
+def test_stages_end_of_stream():
+    stop_event = threading.Event()
+    numbers, squares = queue.Queue(maxsize=2), queue.Queue(maxsize=2)
+
+    def produce():
+        for number in range(10):
+            put_until_stopped(numbers, number, stop_event)
+
+    def square():
+        for number in iter_queue(numbers):
+            put_until_stopped(squares, number ** 2, stop_event)
+
+    stages = [StageThread(produce, numbers, stop_event), StageThread(square, squares, stop_event)]
+    for stage in stages:
+        stage.start()
+
+    assert list(iter_queue(squares)) == [number ** 2 for number in range(10)]
+    for stage in stages:
+        stage.join_and_raise()
+    assert not stop_event.is_set()
+
+
+def test_put_until_stopped_full_queue():
+    stop_event = threading.Event()
+    full_queue = queue.Queue(maxsize=1)
+    full_queue.put("item")
+
+    threading.Timer(0.05, stop_event.set).start()
+    assert not put_until_stopped(full_queue, "other", stop_event)
+
+    # once stopped, the end of the stream takes the place of an item
+    assert put_until_stopped(full_queue, END_OF_STREAM, stop_event, force=True)
+    assert full_queue.get_nowait() is END_OF_STREAM
+
+
+def test_stage_exception():
+    stop_event = threading.Event()
+    decoded, inferred = queue.Queue(maxsize=1), queue.Queue(maxsize=1)
+    upstream_stopped = threading.Event()
+
+    def decode():
+        # blocked on a full queue until the failure stops the pipeline
+        number = 0
+        while put_until_stopped(decoded, number, stop_event):
+            number += 1
+        upstream_stopped.set()
+
+    def infer():
+        next(iter_queue(decoded))
+        # the queue the failing stage writes to is full, nobody reads it
+        inferred.put("partial result")
+        raise RuntimeError("inference failed")
+
+    decoder = StageThread(decode, decoded, stop_event)
+    inference = StageThread(infer, inferred, stop_event)
+    decoder.start()
+    inference.start()
+
+    with pytest.raises(RuntimeError, match="inference failed"):
+        inference.join_and_raise()
+    decoder.join_and_raise()
+
+    assert stop_event.is_set() and upstream_stopped.is_set()
+    assert decoded.get_nowait() is END_OF_STREAM
+    assert inferred.get_nowait() is END_OF_STREAM
@@ -0,0 +1,34 @@
+import json
+
+import numpy as np
+
+from tactus_data.utils.pose_results import PoseResults
+from tactus_data.utils.retracker import stupid_reid
+
+
+def make_results():
+    rng = np.random.default_rng(0)
+    left = rng.integers(0, 300, 3).astype(np.float32)
+    top = rng.integers(0, 200, 3).astype(np.float32)
+    bboxes_lbrt = np.stack((left, top + 50, left + 20, top), axis=1)
+    keypoints = rng.integers(0, 300, (3, 13, 2)).astype(np.float64)
+    return PoseResults(bboxes_lbrt, rng.random(3, dtype=np.float32), keypoints, rng.random((3, 13)))
+
+
+def test_pose_results_skeletons():
+    results = make_results()
+    assert results._skeletons is None
+
+    as_json = json.dumps(results)
+    assert results._skeletons is None
+    assert len(results) == 3
+    assert json.dumps(list(results)) == as_json
+    assert results[1].bbox_lbrt == tuple(results.bboxes_lbrt[1].tolist())
+
+
+def test_stupid_reid_arrays():
+    results = stupid_reid(make_results())
+    skeletons = stupid_reid(list(make_results()))
+
+    assert json.dumps(results) == json.dumps(skeletons)
+    assert [skeleton.tracking_id for skeleton in results] == [skeleton.tracking_id for skeleton in skeletons]
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+import torch
+
+from tactus_data.utils.yolov8 import LetterBoxPreprocessor, correct_img_size, img_to_tensor
+
+
+@pytest.mark.parametrize("shape", [(240, 320, 3), (1080, 1920, 3), (300, 100, 3), (640, 640, 3)])
+@pytest.mark.parametrize("auto", [True, False])
+def test_letterbox_preprocessor(shape, auto):
+    rng = np.random.default_rng(0)
+    preprocessor = LetterBoxPreprocessor(shape, stride=32, imgsize=640, auto=auto)
+
+    for _ in range(2):
+        img = rng.integers(0, 255, shape, dtype=np.uint8)
+        expected = img_to_tensor(correct_img_size(img, 32, 640, auto), torch.device("cpu"), False)[0]
+
+        out = torch.empty((3, *preprocessor.img_size))
+        preprocessor(img, out)
+        out /= 255.0
+
+        assert torch.equal(out, expected)
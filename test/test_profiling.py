@@ -0,0 +1,34 @@
+import json
+import pickle
+
+from tactus_data.utils.profiling import Profile, measure
+
+
+def test_profile(tmp_path):
+    profile = Profile()
+    with profile.measure("forward", 4):
+        pass
+    with measure(profile, "forward", 2):
+        pass
+    with measure(None, "nms"):
+        pass
+    profile.count("frames", 6)
+    profile.sample_memory()
+    profile.wall_time = 1.
+
+    other = pickle.loads(pickle.dumps(profile))
+    other.count("skipped")
+    profile.merge(other)
+
+    assert profile.stages["forward"].calls == 4
+    assert profile.stages["forward"].items == 12
+    assert "nms" not in profile.stages
+    assert profile.counters == {"frames": 12, "skipped": 1}
+    assert profile.wall_time == 2.
+    assert profile.peak_rss_mb > 0
+
+    profile.save(tmp_path / "stats.json", source="video.avi")
+    saved = json.loads((tmp_path / "stats.json").read_text())
+    assert saved["source"] == "video.avi"
+    assert saved["stages"]["forward"]["items"] == 12
+    assert "forward" in str(profile)
@@ -0,0 +1,55 @@
+import numpy as np
+
+from tactus_data import Skeleton
+from tactus_data.utils.roi_pose import RoiPoseEstimator, bbox_iou, pad_bbox
+
+
+class WhiteBoxModel:
+    """detects the bounding box of the white pixels of each image."""
+    def __init__(self):
+        self.calls = []
+
+    def predict_batch(self, imgs, imgsize=640):
+        self.calls.append([img.shape[:2] for img in imgs])
+        results = []
+        for img in imgs:
+            ys, xs = np.nonzero(img[..., 0])
+            if len(xs) == 0:
+                results.append([])
+                continue
+            left, top, right, bottom = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+            keypoints = [[left + i, top + i] for i in range(13)]
+            results.append([Skeleton(bbox_lbrt=(left, bottom, right, top), score=1., keypoints=keypoints)])
+        return results
+
+
+def frame_with_box(left, top, size=20):
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    frame[top:top + size, left:left + size] = 255
+    return frame
+
+
+def test_roi_pose_estimator():
+    model = WhiteBoxModel()
+    estimator = RoiPoseEstimator(model, full_frame_period=3)
+
+    for i in range(4):
+        skeletons = estimator.predict(frame_with_box(100 + 2 * i, 200))
+        assert skeletons[0].bbox_ltrb == [100 + 2 * i, 200, 120 + 2 * i, 220]
+        assert skeletons[0].keypoints[0] == [100 + 2 * i, 200]
+
+    # full frame, 2 crops, full frame, crop
+    assert [shapes[0] for shapes in model.calls] == [(480, 640), (30, 30), (30, 30), (480, 640)]
+    assert estimator.nbr_full_frames == 2
+    assert estimator.nbr_crop_frames == 2
+
+    # the person jumped out of its crop
+    estimator.predict(frame_with_box(400, 50))
+    assert estimator.nbr_fallbacks == 1
+    assert model.calls[-1] == [(480, 640)]
+
+
+def test_bbox_helpers():
+    assert pad_bbox((10, 10, 30, 50), 0.5, 35, 100) == (0, 0, 35, 70)
+    assert bbox_iou((0, 0, 10, 10), (5, 0, 15, 10)) == 1 / 3
+    assert bbox_iou((0, 0, 10, 10), (20, 20, 30, 30)) == 0
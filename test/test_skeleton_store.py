@@ -0,0 +1,45 @@
+import json
+
+import numpy as np
+
+from tactus_data import Skeleton
+from tactus_data.utils.skeleton_store import SkeletonStore, json_to_store
+
+
+def keypoints(offset):
+    return [(offset + i, offset - i) for i in range(13)]
+
+
+def test_json_to_store(tmp_path):
+    frames = [
+        {"frame_id": 3, "skeletons": [Skeleton(bbox_lbrt=(0, 10, 5, 0), score=0.5, keypoints=keypoints(0),
+                                               keypoints_visibility=[1] * 13, tracking_id=1)]},
+        {"frame_id": 6, "skeletons": []},
+        {"frame_id": 9, "skeletons": [Skeleton(keypoints=keypoints(2), tracking_id=2),
+                                      Skeleton(keypoints=keypoints(1), tracking_id=1),
+                                      Skeleton(keypoints=keypoints(5), interpolated=True)]},
+    ]
+    json_path = tmp_path / "yolov8.json"
+    with json_path.open("w") as fp:
+        json.dump({"frames": frames, "resolution": (240, 320),
+                   "max_nbr_skeletons": 3, "min_nbr_skeletons": 0}, fp)
+
+    store = SkeletonStore(json_to_store(json_path))
+
+    assert len(store) == 3
+    assert store.resolution == [240, 320]
+    assert isinstance(store.keypoints, np.memmap)
+
+    frame = store.frame(store.frame_index(9))
+    assert np.shares_memory(frame["keypoints"], store.keypoints)
+    assert frame["keypoints"].shape == (3, 13, 2)
+    assert frame["tracking_ids"].tolist() == [2, 1, -1]
+    assert frame["interpolated"].tolist() == [False, False, True]
+    assert store.frame(1)["keypoints"].shape == (0, 13, 2)
+
+    track = store.track(1)
+    assert track["frame_indexes"].tolist() == [0, 2]
+    np.testing.assert_array_equal(track["keypoints"], [keypoints(0), keypoints(1)])
+
+    skeletons = store.skeletons(0)
+    assert json.loads(json.dumps(skeletons)) == json.loads(json.dumps(frames[0]["skeletons"]))
@@ -0,0 +1,255 @@
+import asyncio
+import gc
+import io
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+import tqdm
+
+from tactus_data.utils.capture_metrics import Histogram
+from tactus_data.utils.frame_ring import FrameRing
+from tactus_data.utils.thread_videocapture import FPS_ESTIMATION_FRAMES, FrameBuffer, VideoCapture
+
+
+@pytest.fixture(scope="module")
+def video_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("videos") / "video.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for i in range(20):
+        writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_frame_buffer():
+    buffer = FrameBuffer(maxlen=2)
+    assert buffer.put(1) and buffer.put(2)
+    assert not buffer.put(3, timeout=0.01)
+    assert buffer.put_drop_oldest(3) == [1]
+    assert buffer.get() == 2
+
+    # a consumer waiting on an empty buffer is woken up by close
+    assert buffer.get() == 3
+    assert buffer.get(timeout=0.01) is None
+    threading.Timer(0.05, buffer.close).start()
+    assert buffer.get() is None
+    assert not buffer.put(4)
+
+
+def read_all(cap):
+    items = []
+    while (item := cap.read()) is not None:
+        items.append(item)
+    cap.release()
+    return items
+
+
+@pytest.mark.parametrize("use_threading", [False, True])
+@pytest.mark.parametrize("seek_stride", [None, 2])
+def test_videocapture_stride(video_path, use_threading, seek_stride):
+    every_frame = read_all(VideoCapture(video_path))
+    items = read_all(VideoCapture(video_path, use_threading=use_threading, stride=3,
+                                  buffer_size=2, seek_stride=seek_stride))
+
+    assert [index for index, _ in items] == [3, 6, 9, 12, 15, 18]
+    for index, frame in items:
+        np.testing.assert_array_equal(frame, every_frame[index - 1][1])
+
+
+def test_videocapture_large_stride(tmp_path):
+    # more skipped frames than the recursion limit, the frames used to
+    # be skipped recursively
+    path = tmp_path / "long.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, (16, 16))
+    for _ in range(1100):
+        writer.write(np.zeros((16, 16, 3), dtype=np.uint8))
+    writer.release()
+
+    cap = VideoCapture(path, stride=1050, seek_stride=None)
+    assert [index for index, _ in read_all(cap)] == [1050]
+
+
+@pytest.mark.parametrize("with_progressbar", [False, True])
+def test_videocapture_end_of_file(video_path, with_progressbar):
+    progressbar = tqdm.tqdm(file=io.StringIO()) if with_progressbar else None
+    cap = VideoCapture(video_path, stride=5, tqdm_progressbar=progressbar)
+    assert [index for index, _ in read_all(cap)] == [5, 10, 15, 20]
+    # the end of the video is not an error and stays the end
+    assert cap.read() is None
+    if with_progressbar:
+        assert progressbar.n == 4
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+@pytest.mark.parametrize("kwargs", [{"drop_policy": "bogus"}, {"drop_every": 1}, {"frame_slots": 3},
+                                    {"shared_memory": True}, {"max_size": 320}, {"backend": "bogus"},
+                                    {"target_fps": 60}])
+def test_videocapture_invalid_arguments(video_path, kwargs):
+    with pytest.raises(ValueError):
+        VideoCapture(video_path, **kwargs)
+    # nothing is left half-initialised for the finalizer to release
+    gc.collect()
+
+
+def test_videocapture_release_while_full(video_path):
+    cap = VideoCapture(video_path, use_threading=True, buffer_size=1)
+    assert cap.read()[0] == 1
+    cap.release()
+    assert not cap._thread.is_alive()
+
+
+@pytest.mark.parametrize("use_threading", [False, True])
+def test_videocapture_iterators(video_path, use_threading):
+    expected = [index for index, _ in VideoCapture(video_path, stride=2)]
+
+    async def consume(cap):
+        indices = [index async for index, _ in cap]
+        cap.release()
+        return indices
+
+    async def consume_all():
+        caps = [VideoCapture(video_path, use_threading=use_threading, stride=2, buffer_size=2)
+                for _ in range(3)]
+        return await asyncio.gather(*[consume(cap) for cap in caps])
+
+    assert asyncio.run(consume_all()) == [expected] * 3
+
+
+def test_frame_buffer_get_async():
+    buffer = FrameBuffer(maxlen=2)
+
+    async def wait_then_close():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(buffer.get_async(), 0.01)
+        threading.Timer(0.02, buffer.put, (1,)).start()
+        assert await buffer.get_async() == 1
+        threading.Timer(0.02, buffer.close).start()
+        assert await buffer.get_async() is None
+
+    asyncio.run(wait_then_close())
+
+
+@pytest.mark.parametrize("shared_memory", [False, True])
+def test_videocapture_frame_ring(video_path, shared_memory):
+    expected = [(index, frame.copy()) for index, frame in VideoCapture(video_path, stride=2)]
+
+    cap = VideoCapture(video_path, use_threading=True, stride=2, buffer_size=2, frame_slots=4,
+                       shared_memory=shared_memory)
+    ring = cap.frame_ring
+    if shared_memory:
+        ring = FrameRing.attach(cap.frame_ring.descriptor)
+
+    items = []
+    while (item := cap.read()) is not None:
+        index, frame = item
+        # the frames are decoded into the slots of the ring
+        slot = cap.frame_ring.slot_of(frame)
+        assert slot is not None
+        np.testing.assert_array_equal(ring.frames[slot], frame)
+        items.append((index, frame.copy()))
+        cap.release_frame(frame)
+
+    if shared_memory:
+        ring.unlink()
+    cap.release()
+
+    assert [index for index, _ in items] == [index for index, _ in expected]
+    for (_, frame), (_, expected_frame) in zip(items, expected):
+        np.testing.assert_array_equal(frame, expected_frame)
+
+
+def test_videocapture_read_into_image(video_path):
+    image = np.empty((48, 64, 3), dtype=np.uint8)
+    for use_threading in (False, True):
+        cap = VideoCapture(video_path, use_threading=use_threading, frame_slots=7 if use_threading else None)
+        index, frame = cap.read(image=image)
+        assert index == 1 and frame is image
+        cap.release()
+
+
+class StreamCapture(VideoCapture):
+    """a video read like a stream, dropping frames."""
+    def get_cap_mode(self, filename):
+        return "stream"
+
+
+@pytest.mark.parametrize("drop_policy, expected", [
+    ("oldest", [17, 18, 19, 20]),
+    ("latest", [20]),
+    ("cadence", [13, 15, 17, 19]),
+])
+def test_videocapture_drop_policies(video_path, drop_policy, expected):
+    cap = StreamCapture(video_path, use_threading=True, buffer_size=4, drop_policy=drop_policy,
+                        drop_warning_enable=False)
+    # a consumer slower than the stream
+    while cap.metrics.queue_depth.count < 20:
+        time.sleep(0.001)
+
+    indices = [cap.read()[0] for _ in expected]
+    assert indices == expected
+    assert cap.last_capture_time <= time.time()
+    cap.release()
+
+    assert cap.metrics.dropped == 20 - len(expected)
+    assert cap.metrics.delivered == len(expected)
+    assert cap.metrics.latency.count == len(expected)
+    assert cap.metrics.queue_depth.max == len(expected)
+
+
+def test_histogram():
+    histogram = Histogram([0.01, 0.1, 1.])
+    for value in (0.005, 0.05, 0.05, 0.5, 3.):
+        histogram.add(value)
+
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(1.) == 3.
+    assert histogram.mean == pytest.approx(0.721)
+
+
+class CameraWithoutFps:
+    """a 30fps camera giving the timestamps of its frames, but not its
+    frame rate."""
+    def __init__(self, filename):
+        self.nbr_frames = 0
+
+    def read(self, image=None):
+        self.nbr_frames += 1
+        return True, np.zeros((4, 4, 3), dtype=np.uint8)
+
+    def grab(self):
+        return self.read()[0]
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return (self.nbr_frames - 1) * 1000 / 30
+        return 0.
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+def test_videocapture_fps_estimation(monkeypatch):
+    monkeypatch.setattr(cv2, "VideoCapture", CameraWithoutFps)
+
+    start = time.perf_counter()
+    cap = StreamCapture(0, target_fps=10)
+    assert time.perf_counter() - start < 1
+    assert cap.capture_fps is None
+
+    # every frame is read until the frame rate is estimated
+    indices = [cap.read()[0] for _ in range(FPS_ESTIMATION_FRAMES + 3)]
+    assert indices[:FPS_ESTIMATION_FRAMES] == list(range(1, FPS_ESTIMATION_FRAMES + 1))
+    assert indices[FPS_ESTIMATION_FRAMES:] == [33, 36, 39]
+    assert cap.capture_fps == 30
+    cap.release()
+
+    cap = StreamCapture(0, stride=2)
+    assert [cap.read()[0] for _ in range(FPS_ESTIMATION_FRAMES)][-1] == 2 * FPS_ESTIMATION_FRAMES
+    assert cap.capture_fps == 30
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import torch
+
+from tactus_data.utils.yolov8 import PosePredictionYolov8
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+    # an untrained model built from the ultralytics config, the
+    # pretrained weights are not shipped with the repository
+    from ultralytics.nn.tasks import PoseModel
+
+    torch.manual_seed(0)
+    model_dir = tmp_path_factory.mktemp("models")
+    torch.save({"model": PoseModel("yolov8n-pose.yaml", verbose=False)}, model_dir / "yolov8n-pose.pt")
+    return PosePredictionYolov8(model_dir, "yolov8n-pose.pt", "cpu", shared=False, imgsize=128)
+
+
+def test_predict_batch(model, monkeypatch):
+    # an untrained model is not confident about anything
+    monkeypatch.setattr(PosePredictionYolov8, "conf_thres", 0.)
+    rng = np.random.default_rng(0)
+    imgs = [rng.integers(0, 255, (96, 128, 3), dtype=np.uint8) for _ in range(3)]
+
+    batch_results = model.predict_batch(imgs, as_arrays=True)
+    assert len(batch_results) == len(imgs)
+    for img, batch_result in zip(imgs, batch_results):
+        result = model.predict_batch([img], as_arrays=True)[0]
+        assert len(result) == len(batch_result) > 0
+        np.testing.assert_allclose(batch_result.bboxes_lbrt, result.bboxes_lbrt, atol=1e-3)
+        np.testing.assert_allclose(batch_result.keypoints, result.keypoints, atol=1e-3)
+
+    # the skeletons of predict are the ones of predict_batch
+    assert len(model.predict(imgs[0])) == len(batch_results[0])